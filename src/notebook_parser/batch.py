@@ -0,0 +1,459 @@
+"""
+Batch processing for directories of notebook images.
+
+Image optimization is CPU bound and runs in a process pool, extraction
+is network bound and runs in a thread pool, and rendering happens
+in-process. The number of pages in flight is capped so large backlogs
+keep a bounded memory footprint.
+
+run_batch_async does the same on one event loop with the async
+backends, which keeps hundreds of requests in flight without threads.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .cache import ExtractionCache
+from .llm.clients import close_async_clients
+from .llm.streaming import StreamInterrupted, TextStream
+from .llm.usage import TokenUsage
+from .extractors import Extractor
+from .image_optimizer import ImageChoice, read_image_choice
+from .pipeline import (
+    ParseOptions, NoteWriter, prepare_image, extract_page, extract_page_async, open_extractor, write_note
+)
+from .telemetry import MetricsStore, span, trace
+from .template_engine import TemplateEngine
+from .formatters import format_for_template
+from .sidecar import NoteRecord, note_path, read_sidecar, sidecar_path, write_sidecar
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+
+@dataclass
+class PageResult:
+    """Outcome of processing a single page."""
+
+    image_path: Path
+    output_path: Path
+    title: Optional[str] = None
+    error: Optional[str] = None
+    ttft: Optional[float] = None  # Seconds to first streamed token
+    image: Optional[ImageChoice] = None  # Parameters picked under an image budget
+    skipped: Optional[str] = None  # Why no note was written, e.g. "blank page"
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def find_images(input_dir: Path, recursive: bool = False) -> list[Path]:
+    """
+    Find image files in a directory.
+
+    Args:
+        input_dir: Directory to search
+        recursive: Whether to descend into subdirectories
+
+    Returns:
+        Sorted list of image paths
+    """
+    pattern = "**/*" if recursive else "*"
+    return sorted(
+        path for path in input_dir.glob(pattern)
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def plan_outputs(images: list[Path], input_dir: Path, output_dir: Path) -> list[tuple[Path, Path]]:
+    """
+    Map each image to its markdown output path, mirroring subdirectories.
+
+    Args:
+        images: Image paths inside input_dir
+        input_dir: Root directory of the images
+        output_dir: Root directory for markdown notes
+
+    Returns:
+        List of (image_path, output_path) pairs
+    """
+    return [
+        (image, output_dir / image.relative_to(input_dir).with_suffix(".md"))
+        for image in images
+    ]
+
+
+def process_page(
+    image_path: Path,
+    output_path: Path,
+    *,
+    engine: TemplateEngine,
+    options: ParseOptions,
+    payload: Optional[Future] = None,
+    source: Optional[str] = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: bool = False,
+    extractor: Optional[Extractor] = None,
+    metrics: Optional[MetricsStore] = None
+) -> PageResult:
+    """
+    Extract and render one page, capturing errors in the result.
+
+    Shared by run_batch and the folder watcher.
+
+    Args:
+        image_path: Path to notebook image
+        output_path: Where to write the markdown note
+        engine: Template every note is rendered with
+        options: Extraction settings
+        payload: Optional future resolving to the optimized image bytes
+        source: Optional custom source description
+        cache: Optional extraction cache for the LLM backends
+        usage: Optional accumulator for Claude token counts
+        stream: Update the note as text arrives
+        extractor: Open backend to use (default: open one for this page)
+        metrics: Optional store for the page's stage timings and token counts
+
+    Returns:
+        The page's result; failures are reported in result.error
+    """
+    if metrics is not None:
+        with trace() as page_trace:
+            result = process_page(
+                image_path, output_path, engine=engine, options=options, payload=payload, source=source,
+                cache=cache, usage=usage, stream=stream, extractor=extractor
+            )
+        metrics.record(page_trace, options, image_path, result.error)
+        return result
+
+    text_stream = None
+    try:
+        # Time spent waiting for the optimization process pool
+        with span("optimize"):
+            image_bytes = payload.result() if payload is not None else None
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if stream:
+            text_stream = TextStream(NoteWriter(engine, image_path, output_path, source))
+        start = time.perf_counter()
+        extracted_text, generated_tags = extract_page(
+            image_path, engine.template_content, options,
+            image_bytes=image_bytes, cache=cache, usage=usage, stream=text_stream, extractor=extractor
+        )
+        timings = {"extract": round(time.perf_counter() - start, 3)}
+        template_vars = write_note(
+            engine, image_path, output_path, extracted_text, generated_tags, source, options, timings
+        )
+        ttft = text_stream.ttft if text_stream is not None else None
+        budgeted = image_bytes is not None and options.image_budget is not None
+        image = read_image_choice(image_bytes) if budgeted else None
+        return PageResult(image_path, output_path, title=template_vars["title"], ttft=ttft, image=image)
+    except StreamInterrupted as e:
+        # Keep the text that arrived before the failure
+        write_note(engine, image_path, output_path, e.text, source=source)
+        return PageResult(image_path, output_path, error=f"{e} (partial note kept)", ttft=text_stream.ttft)
+    except Exception as e:
+        return PageResult(image_path, output_path, error=str(e))
+
+
+def run_batch(
+    pages: list[tuple[Path, Path]],
+    template_path: Path,
+    options: ParseOptions,
+    source: Optional[str] = None,
+    workers: int = 4,
+    optimize_workers: Optional[int] = None,
+    max_in_flight: int = 8,
+    on_result: Optional[Callable[[PageResult], None]] = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: bool = False,
+    metrics: Optional[MetricsStore] = None
+) -> list[PageResult]:
+    """
+    Process many pages with overlapping optimization and extraction.
+
+    The backend is opened once and stays warm for the whole batch.
+
+    Args:
+        pages: List of (image_path, output_path) pairs
+        template_path: Template used for every page
+        options: Extraction settings
+        source: Optional custom source description for every page
+        workers: Concurrent extraction calls (capped by the backend's max_concurrency)
+        optimize_workers: Processes for image optimization (default: CPU count)
+        max_in_flight: Maximum pages optimized but not yet written
+        on_result: Optional callback invoked as each page finishes
+        cache: Optional extraction cache for the LLM backends
+        usage: Optional accumulator for Claude token counts
+        stream: Stream responses and rewrite each note as its text arrives
+        metrics: Optional store for each page's stage timings and token counts
+
+    Returns:
+        Page results in input order
+
+    Raises:
+        ValueError: If the model is unknown
+    """
+    if workers < 1 or max_in_flight < 1:
+        raise ValueError("workers and max_in_flight must be at least 1")
+
+    engine = TemplateEngine(template_path)
+    slots = threading.BoundedSemaphore(max_in_flight)
+
+    with ExitStack() as stack:
+        extractor = stack.enter_context(open_extractor(options))
+        if extractor.max_concurrency is not None:
+            workers = min(workers, extractor.max_concurrency)
+        needs_optimize = options.optimize and extractor.optimize_settings is not None
+
+        extract_pool = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+        optimize_pool = None
+        if needs_optimize:
+            optimize_pool = stack.enter_context(ProcessPoolExecutor(max_workers=optimize_workers))
+
+        futures = []
+        for image_path, output_path in pages:
+            # Block until a page finishes so decoded payloads stay bounded
+            slots.acquire()
+
+            payload = None
+            if optimize_pool is not None:
+                payload = optimize_pool.submit(prepare_image, image_path, options)
+
+            future = extract_pool.submit(
+                process_page, image_path, output_path, engine=engine, options=options, payload=payload,
+                source=source, cache=cache, usage=usage, stream=stream, extractor=extractor, metrics=metrics
+            )
+            future.add_done_callback(lambda _: slots.release())
+            if on_result is not None:
+                future.add_done_callback(lambda f: on_result(f.result()))
+            futures.append(future)
+
+        return [future.result() for future in futures]
+
+
+async def _process_page_async(
+    image_path: Path,
+    output_path: Path,
+    engine: TemplateEngine,
+    options: ParseOptions,
+    source: Optional[str],
+    cache: Optional[ExtractionCache],
+    usage: Optional[TokenUsage],
+    extractor: Optional[Extractor] = None,
+    metrics: Optional[MetricsStore] = None
+) -> PageResult:
+    """Async counterpart of process_page."""
+    if metrics is not None:
+        with trace() as page_trace:
+            result = await _process_page_async(
+                image_path, output_path, engine, options, source, cache, usage, extractor
+            )
+        metrics.record(page_trace, options, image_path, result.error)
+        return result
+
+    try:
+        image_bytes = None
+        if options.image_budget is not None:
+            # Optimize up front so the page can report the chosen parameters
+            image_bytes = await asyncio.to_thread(prepare_image, image_path, options)
+        start = time.perf_counter()
+        extracted_text, generated_tags = await extract_page_async(
+            image_path, engine.template_content, options,
+            image_bytes=image_bytes, cache=cache, usage=usage, extractor=extractor
+        )
+        timings = {"extract": round(time.perf_counter() - start, 3)}
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        template_vars = write_note(
+            engine, image_path, output_path, extracted_text, generated_tags, source, options, timings
+        )
+        image = read_image_choice(image_bytes) if image_bytes is not None else None
+        return PageResult(image_path, output_path, title=template_vars["title"], image=image)
+    except Exception as e:
+        return PageResult(image_path, output_path, error=str(e))
+
+
+async def run_batch_async(
+    pages: list[tuple[Path, Path]],
+    template_path: Path,
+    options: ParseOptions,
+    source: Optional[str] = None,
+    concurrency: int = 16,
+    on_result: Optional[Callable[[PageResult], None]] = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    metrics: Optional[MetricsStore] = None
+) -> list[PageResult]:
+    """
+    Process many pages concurrently on the current event loop.
+
+    A semaphore caps the pages in flight. In two-step tags mode each page
+    runs its tags and content requests back to back, so while one page
+    waits for content another is already generating tags.
+
+    Args:
+        pages: List of (image_path, output_path) pairs
+        template_path: Template used for every page
+        options: Extraction settings
+        source: Optional custom source description for every page
+        concurrency: Maximum pages in flight (capped by the backend's max_concurrency)
+        on_result: Optional callback invoked as each page finishes
+        cache: Optional extraction cache for the LLM backends
+        usage: Optional accumulator for Claude token counts
+        metrics: Optional store for each page's stage timings and token counts
+
+    Returns:
+        Page results in input order
+
+    Raises:
+        ValueError: If the model is unknown
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    engine = TemplateEngine(template_path)
+
+    try:
+        with open_extractor(options) as extractor:
+            if extractor.max_concurrency is not None:
+                concurrency = min(concurrency, extractor.max_concurrency)
+            slots = asyncio.Semaphore(concurrency)
+
+            async def run(image_path: Path, output_path: Path) -> PageResult:
+                async with slots:
+                    result = await _process_page_async(
+                        image_path, output_path, engine, options, source, cache, usage, extractor, metrics
+                    )
+                if on_result is not None:
+                    on_result(result)
+                return result
+
+            return await asyncio.gather(*(run(image_path, output_path) for image_path, output_path in pages))
+    finally:
+        await close_async_clients()
+
+
+def _rerender_note(sidecar: Path, engine: TemplateEngine) -> PageResult:
+    """Render one note from its sidecar, capturing errors in the result."""
+    output_path = note_path(sidecar)
+    try:
+        record = read_sidecar(sidecar)
+        image_path = Path(record.image)
+        template_vars = format_for_template(
+            record.extracted_text, image_path, record.generated_tags, record.source, record.date
+        )
+        output_path.write_text(engine.render(**template_vars))
+        return PageResult(image_path, output_path, title=template_vars["title"])
+    except Exception as e:
+        return PageResult(sidecar, output_path, error=str(e))
+
+
+def rerender_notes(
+    sidecars: list[Path],
+    template_path: Path,
+    workers: int = 8,
+    on_result: Optional[Callable[[PageResult], None]] = None
+) -> list[PageResult]:
+    """
+    Rebuild notes from their sidecars without calling a backend.
+
+    Each note is rendered from the saved extraction with the current
+    template and formatting, keeping its original date. Work is file I/O
+    and string replacement, so a thread pool is enough.
+
+    Args:
+        sidecars: Sidecar files; each note is written next to its sidecar
+        template_path: Template to render with
+        workers: Notes rendered at once
+        on_result: Optional callback invoked as each note is written
+
+    Returns:
+        Results in input order
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    engine = TemplateEngine(template_path)
+
+    def run(sidecar: Path) -> PageResult:
+        result = _rerender_note(sidecar, engine)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, sidecars))
+
+
+def _alias_note(
+    image_path: Path,
+    output_path: Path,
+    original: Path,
+    engine: TemplateEngine,
+    source: Optional[str]
+) -> PageResult:
+    """Write a duplicate page's note from the extraction of the page it repeats."""
+    try:
+        record = read_sidecar(sidecar_path(original))
+    except FileNotFoundError:
+        return PageResult(image_path, output_path, skipped=f"duplicate of {original} (no extraction to reuse)")
+    except Exception as e:
+        return PageResult(image_path, output_path, error=str(e))
+
+    try:
+        template_vars = format_for_template(record.extracted_text, image_path, record.generated_tags, source)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(engine.render(**template_vars))
+        write_sidecar(output_path, NoteRecord(
+            image=str(image_path.resolve()),
+            extracted_text=record.extracted_text,
+            generated_tags=record.generated_tags,
+            source=source,
+            date=template_vars["date"],
+            backend=record.backend,
+            model=record.model,
+            prompt=record.prompt,
+            template=str(engine.template_path.resolve()),
+        ))
+        return PageResult(image_path, output_path, title=template_vars["title"])
+    except Exception as e:
+        return PageResult(image_path, output_path, error=str(e))
+
+
+def alias_notes(
+    duplicates: list[tuple[Path, Path, Path]],
+    template_path: Path,
+    source: Optional[str] = None,
+    on_result: Optional[Callable[[PageResult], None]] = None
+) -> list[PageResult]:
+    """
+    Write notes for duplicate pages without extracting them.
+
+    Each duplicate reuses the extraction saved in the sidecar of the
+    page it repeats, rendered with its own filename and date. Pages
+    whose original has no sidecar are skipped.
+
+    Args:
+        duplicates: (image_path, output_path, original note) triples
+        template_path: Template to render with
+        source: Optional custom source description for every page
+        on_result: Optional callback invoked as each note is written
+
+    Returns:
+        Results in input order
+    """
+    engine = TemplateEngine(template_path)
+    results = []
+    for image_path, output_path, original in duplicates:
+        result = _alias_note(image_path, output_path, original, engine, source)
+        if on_result is not None:
+            on_result(result)
+        results.append(result)
+    return results
@@ -0,0 +1,321 @@
+"""
+Message Batches API mode for large offline backlogs.
+
+Every page becomes one Messages request in a batch that Anthropic
+processes asynchronously at a lower price. A manifest maps each request's
+custom_id to its image and output path, so `collect` can be re-run until
+every note has been written. Manifests are kept in the state directory,
+not the cache, since results can't be collected without them.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from .batch import PageResult
+from .cache import get_cache_dir
+from .llm.claude_vision import (
+    CLAUDE_MODEL, encode_image, load_prompt, parse_note_tool, request_params, resolve_api_key
+)
+from .llm.clients import get_anthropic_client
+from .pipeline import ParseOptions, page_image, write_note
+from .prompt_loader import PromptLoader
+from .template_engine import TemplateEngine
+
+# API limits are 100,000 requests and 256 MB per batch; keep some headroom
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+# Pages rendered between manifest saves while collecting
+SAVE_EVERY = 50
+
+
+def get_state_dir() -> Path:
+    """
+    Get the directory for files that must survive clearing the cache.
+
+    Uses NOTEBOOK_PARSER_STATE_DIR if set, otherwise
+    $XDG_STATE_HOME/notebook-parser (default: ~/.local/state/notebook-parser).
+    """
+    override = os.getenv("NOTEBOOK_PARSER_STATE_DIR")
+    if override:
+        return Path(override)
+
+    base = os.getenv("XDG_STATE_HOME")
+    return (Path(base) if base else Path.home() / ".local" / "state") / "notebook-parser"
+
+
+def get_batch_dir() -> Path:
+    """
+    Directory holding batch manifests (<state dir>/batches).
+
+    Manifests are the only link from a paid-for batch to its pages, so
+    they live in the state directory rather than the cache.
+    """
+    return get_state_dir() / "batches"
+
+
+def _manifest_dirs(manifest_dir: Optional[Path]) -> list[Path]:
+    """Directories to search for manifests, including where older versions saved them."""
+    if manifest_dir is not None:
+        return [manifest_dir]
+    return [get_batch_dir(), get_cache_dir() / "batches"]
+
+
+def find_manifest(batch_id: str, manifest_dir: Optional[Path] = None) -> Optional[Path]:
+    """
+    Find the manifest of a submitted batch.
+
+    Args:
+        batch_id: Batch id returned when the batch was submitted
+        manifest_dir: Directory to search (default: get_batch_dir(), then the
+            cache directory older versions used)
+
+    Returns:
+        Manifest path, or None if no manifest has that id
+    """
+    for directory in _manifest_dirs(manifest_dir):
+        path = directory / f"{batch_id}.json"
+        if path.exists():
+            return path
+    return None
+
+
+def load_manifest(path: Path) -> dict:
+    """Read a batch manifest."""
+    return json.loads(path.read_text())
+
+
+def save_manifest(manifest: dict, path: Path) -> None:
+    """Write a batch manifest atomically so an interrupted collect can resume."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, path)
+
+
+def pending_manifests(manifest_dir: Optional[Path] = None) -> list[Path]:
+    """
+    Find manifests with pages that have not been collected yet.
+
+    Args:
+        manifest_dir: Directory to search (default: get_batch_dir(), then the
+            cache directory older versions used)
+
+    Returns:
+        Manifest paths, oldest first
+    """
+    paths = [path for directory in _manifest_dirs(manifest_dir) for path in directory.glob("*.json")]
+
+    pending = []
+    for path in sorted(paths, key=lambda p: p.stat().st_mtime):
+        pages = load_manifest(path)["pages"].values()
+        if any(page["status"] == "pending" for page in pages):
+            pending.append(path)
+    return pending
+
+
+def build_request(custom_id: str, image_path: Path, template_content: str, options: ParseOptions) -> dict:
+    """
+    Build one batch request for a page.
+
+    With tags enabled the request uses the single structured call, since
+    the two-step flow needs the first response before the second request.
+
+    Args:
+        custom_id: Identifier used to match the result to the page
+        image_path: Path to notebook image
+        template_content: Template to guide extraction
+        options: Extraction settings
+
+    Returns:
+        Batch request with custom_id and params
+    """
+    if options.tags:
+        prompt = PromptLoader.load_prompt("tags-and-bullet-points")
+    else:
+        prompt = load_prompt(options.prompt)
+
+    image_b64 = encode_image(page_image(image_path, options), options.optimize, options.grayscale, None, options.image_budget)
+    return {
+        "custom_id": custom_id,
+        "params": request_params(prompt, template_content, image_b64, structured=options.tags),
+    }
+
+
+def _chunk_requests(requests: Iterable[dict]) -> Iterator[list[dict]]:
+    """Group requests into batches that fit the API size limits, as they are built."""
+    current, current_bytes = [], 0
+    for request in requests:
+        size = len(json.dumps(request))
+        if current and (len(current) >= MAX_BATCH_REQUESTS or current_bytes + size > MAX_BATCH_BYTES):
+            yield current
+            current, current_bytes = [], 0
+        current.append(request)
+        current_bytes += size
+    if current:
+        yield current
+
+
+def submit_batch(
+    pages: list[tuple[Path, Path]],
+    template_path: Path,
+    options: ParseOptions,
+    source: Optional[str] = None,
+    manifest_dir: Optional[Path] = None
+) -> list[Path]:
+    """
+    Submit pages to the Message Batches API and record the manifests.
+
+    Requests are built lazily and each batch is submitted as soon as it
+    is full, so at most one batch of encoded images is held in memory.
+    If a page fails to encode, the batches already submitted keep their
+    manifests and can still be collected.
+
+    Args:
+        pages: List of (image_path, output_path) pairs
+        template_path: Template used for every page
+        options: Extraction settings (Claude only)
+        source: Optional custom source description for every page
+        manifest_dir: Where to store manifests (default: get_batch_dir())
+
+    Returns:
+        One manifest path per submitted batch
+
+    Raises:
+        ValueError: If the API key is missing
+    """
+    manifest_dir = manifest_dir if manifest_dir is not None else get_batch_dir()
+    api_key = resolve_api_key(options.api_key)
+    engine = TemplateEngine(template_path)
+
+    targets = {f"page-{index:05d}": page for index, page in enumerate(pages)}
+    requests = (
+        build_request(custom_id, image_path, engine.template_content, options)
+        for custom_id, (image_path, _) in targets.items()
+    )
+
+    client = get_anthropic_client(api_key)
+    manifests = []
+    for chunk in _chunk_requests(requests):
+        batch = client.messages.batches.create(requests=chunk)
+        manifest = {
+            "batch_id": batch.id,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "model": CLAUDE_MODEL,
+            "template": str(template_path.resolve()),
+            "source": source,
+            "tags": options.tags,
+            "prompt": options.prompt,
+            "sidecar": options.sidecar,
+            "pages": {
+                request["custom_id"]: {
+                    "image": str(targets[request["custom_id"]][0].resolve()),
+                    "output": str(targets[request["custom_id"]][1].resolve()),
+                    "status": "pending",
+                }
+                for request in chunk
+            },
+        }
+        path = manifest_dir / f"{batch.id}.json"
+        save_manifest(manifest, path)
+        manifests.append(path)
+
+    return manifests
+
+
+def _render_result(outcome, page: dict, engine: TemplateEngine, manifest: dict) -> PageResult:
+    """Write the note for one batch result and update the page's manifest entry."""
+    image_path, output_path = Path(page["image"]), Path(page["output"])
+    try:
+        if outcome.type != "succeeded":
+            error = getattr(outcome, "error", None)
+            detail = getattr(getattr(error, "error", None), "message", None)
+            page["status"] = outcome.type
+            raise RuntimeError(f"Request {outcome.type}" + (f": {detail}" if detail else ""))
+
+        if manifest["tags"]:
+            extracted_text, generated_tags = parse_note_tool(outcome.message)
+        else:
+            extracted_text, generated_tags = outcome.message.content[0].text.strip(), None
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Manifests written before sidecars existed have no "sidecar" key
+        options = ParseOptions(
+            model="claude",
+            prompt=manifest.get("prompt"),
+            tags=manifest["tags"],
+            sidecar=manifest.get("sidecar", True),
+        )
+        template_vars = write_note(
+            engine, image_path, output_path, extracted_text, generated_tags, manifest["source"], options
+        )
+    except Exception as e:
+        # Write failures stay pending and are retried on the next collect
+        if not isinstance(e, OSError) and page["status"] == "pending":
+            page["status"] = "failed"
+        page["error"] = str(e)
+        return PageResult(image_path, output_path, error=str(e))
+
+    page["status"] = "done"
+    page.pop("error", None)
+    return PageResult(image_path, output_path, title=template_vars["title"])
+
+
+def collect_batch(
+    manifest_path: Path,
+    api_key: Optional[str] = None,
+    wait: bool = False,
+    poll_interval: float = 60.0,
+    on_result: Optional[Callable[[PageResult], None]] = None
+) -> tuple[str, list[PageResult]]:
+    """
+    Download finished batch results and render them into notes.
+
+    Pages already written are skipped, so collect can be re-run after an
+    interruption. Page statuses are saved to the manifest periodically and
+    when collect stops.
+
+    Args:
+        manifest_path: Manifest written by submit_batch
+        api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+        wait: Poll until the batch has ended instead of returning early
+        poll_interval: Seconds between status checks when waiting
+        on_result: Optional callback invoked as each page is rendered
+
+    Returns:
+        Tuple of (processing_status, page results). Results are empty while
+        the batch is still in progress.
+    """
+    manifest = load_manifest(manifest_path)
+    client = get_anthropic_client(resolve_api_key(api_key))
+
+    batch = client.messages.batches.retrieve(manifest["batch_id"])
+    while wait and batch.processing_status != "ended":
+        time.sleep(poll_interval)
+        batch = client.messages.batches.retrieve(manifest["batch_id"])
+
+    if batch.processing_status != "ended":
+        return batch.processing_status, []
+
+    engine = TemplateEngine(Path(manifest["template"]))
+    results = []
+    try:
+        for response in client.messages.batches.results(manifest["batch_id"]):
+            page = manifest["pages"].get(response.custom_id)
+            if page is None or page["status"] != "pending":
+                continue
+
+            result = _render_result(response.result, page, engine, manifest)
+            results.append(result)
+            if len(results) % SAVE_EVERY == 0:
+                save_manifest(manifest, manifest_path)
+            if on_result is not None:
+                on_result(result)
+    finally:
+        save_manifest(manifest, manifest_path)
+
+    return batch.processing_status, results
@@ -0,0 +1,218 @@
+"""
+Persistent cache for extraction results.
+
+Results are keyed by the image content hash plus every setting that
+affects the model output (backend, model, prompt, template, image
+optimization), so re-running an unchanged page costs no API call.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+# File digests remembered; serve and watch see new paths for as long as they run
+DIGEST_MEMO_SIZE = 4096
+
+_digest_memo = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def get_cache_dir() -> Path:
+    """
+    Get the cache directory.
+
+    Uses NOTEBOOK_PARSER_CACHE_DIR if set, otherwise
+    $XDG_CACHE_HOME/notebook-parser (default: ~/.cache/notebook-parser).
+    """
+    override = os.getenv("NOTEBOOK_PARSER_CACHE_DIR")
+    if override:
+        return Path(override)
+
+    base = os.getenv("XDG_CACHE_HOME")
+    return (Path(base) if base else Path.home() / ".cache") / "notebook-parser"
+
+
+def file_digest(path: Path) -> str:
+    """
+    SHA-256 of a file's content.
+
+    Memoized by (path, size, mtime) so repeated lookups don't re-read the
+    file; the DIGEST_MEMO_SIZE most recently used digests are kept.
+    """
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    with _digest_lock:
+        if memo_key in _digest_memo:
+            _digest_memo.move_to_end(memo_key)
+            return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest.hexdigest()
+        if len(_digest_memo) > DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest.hexdigest()
+
+
+def cache_key(image_path: Path, **settings) -> str:
+    """
+    Build a cache key from the image content and extraction settings.
+
+    Args:
+        image_path: Path to the source image
+        **settings: Everything that affects the extraction output
+
+    Returns:
+        Hex digest identifying this extraction
+    """
+    payload = json.dumps({"image": file_digest(image_path), **settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """SQLite-backed extraction cache with size-based LRU eviction."""
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize the cache. The database is created on first use.
+
+        Args:
+            path: SQLite file (default: <cache dir>/extractions.sqlite3)
+            max_bytes: Total size of cached results before old entries are evicted
+        """
+        self.path = path if path is not None else get_cache_dir() / "extractions.sqlite3"
+        self.max_bytes = max_bytes
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._schema_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            # Once per instance; racing threads both running it is harmless
+            if not self._schema_ready:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS extractions (
+                        key TEXT PRIMARY KEY,
+                        backend TEXT,
+                        model TEXT,
+                        text TEXT NOT NULL,
+                        tags TEXT,
+                        size INTEGER NOT NULL,
+                        created REAL NOT NULL,
+                        accessed REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON extractions (accessed)")
+                conn.commit()
+                self._schema_ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[tuple[str, Optional[str]]]:
+        """
+        Look up a cached extraction.
+
+        Returns:
+            Tuple of (text, tags) or None on a miss
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT text, tags FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE extractions SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0], row[1]
+
+    def put(
+        self,
+        key: str,
+        text: str,
+        tags: Optional[str] = None,
+        backend: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> None:
+        """Store an extraction, evicting least recently used entries if over budget."""
+        size = len(text.encode("utf-8")) + len((tags or "").encode("utf-8"))
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, backend, model, text, tags, size, now, now),
+            )
+            self._evict(conn, self.max_bytes)
+
+    def stats(self) -> dict:
+        """Summarize cache contents."""
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+            backends = dict(conn.execute(
+                "SELECT COALESCE(backend, '?'), COUNT(*) FROM extractions GROUP BY backend"
+            ).fetchall())
+
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "file_bytes": self.path.stat().st_size,
+            "backends": backends,
+        }
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Evict least recently used entries until the cache fits.
+
+        Args:
+            max_bytes: Target size (default: the cache's own max_bytes). 0 clears everything.
+
+        Returns:
+            Number of entries removed
+        """
+        target = self.max_bytes if max_bytes is None else max_bytes
+        with self._connect() as conn:
+            removed = self._evict(conn, target)
+        if removed:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute("VACUUM")
+        return removed
+
+    @staticmethod
+    def _evict(conn: sqlite3.Connection, max_bytes: int) -> int:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM extractions ORDER BY accessed"):
+            if total <= max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        conn.executemany("DELETE FROM extractions WHERE key = ?", evicted)
+        return len(evicted)
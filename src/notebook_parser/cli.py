@@ -2,28 +2,275 @@
 CLI commands for notebook-parser.
 """
 
+import asyncio
+import time
 import typer
 from pathlib import Path
-from typing import Optional
+from typing import Annotated, Optional
 from dotenv import load_dotenv
 
-from .ocr import extract_text_local, preprocess_image
+from .ocr import DEFAULT_MODEL, extract_text_local
+from .preprocess import DEFAULT_PROFILE, PROFILES
 from .template_engine import TemplateEngine
-from .formatters import format_for_template
-from .llm.claude_vision import extract_with_claude, extract_with_claude_tags
-from .llm.ollama_vision import extract_with_ollama
+from .formatters import TEMPLATE_VARIABLES
+from .cache import ExtractionCache
+from .image_optimizer import MIN_SHARPNESS, ImageBudget, get_payload_cache, read_image_choice
+from .llm.usage import MIN_CACHEABLE_TOKENS, TokenUsage
+from .llm.streaming import StreamInterrupted, TextStream
+from .pipeline import (
+    ParseOptions, TAG_MODES, NoteWriter, available_extractors, extract_page, open_extractor, page_image,
+    prepare_image, write_note
+)
+from .page_crop import read_page_crop
+from .batch import PageResult, alias_notes, find_images, plan_outputs, rerender_notes, run_batch, run_batch_async
+from .telemetry import MetricsStore, profiled, trace
+from .dedup import DEDUP_MODES, DEFAULT_MAX_DISTANCE, INDEX_FILENAME, PageIndex, screen_pages
+from .sidecar import find_sidecars
+from .watch import FolderWatcher, WatchState
+from .server import NoteService, make_server
+from .batch_api import submit_batch, collect_batch, pending_manifests, find_manifest, load_manifest
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = typer.Typer(help="Parse physical notebook images to markdown notes")
+cache_app = typer.Typer(help="Inspect and prune the extraction cache")
+app.add_typer(cache_app, name="cache")
+
+
+def _image_budget(
+    max_image_tokens: Optional[int],
+    max_image_kb: Optional[int],
+    min_sharpness: Optional[float]
+) -> Optional[ImageBudget]:
+    """Image budget from the adaptive optimization flags, or None if none was given."""
+    if max_image_tokens is None and max_image_kb is None and min_sharpness is None:
+        return None
+    return ImageBudget(
+        max_tokens=max_image_tokens,
+        max_bytes=max_image_kb * 1024 if max_image_kb is not None else None,
+        min_sharpness=min_sharpness if min_sharpness is not None else MIN_SHARPNESS,
+    )
+
+
+def _echo_usage(usage: TokenUsage) -> None:
+    """Print the token usage of a run, and whether the prompt cache was used."""
+    if not usage.requests:
+        return
+    typer.echo(f"  Tokens: {usage.summary()}", err=True)
+    if usage.cache_unused:
+        typer.echo(
+            f"  Prompt cache: not used; the prompt and template are below Claude's "
+            f"{MIN_CACHEABLE_TOKENS}-token minimum for caching",
+            err=True
+        )
+
+
+def _check_template(template_path: Path) -> None:
+    """Exit if the template is missing; warn about placeholders no note fills."""
+    if not template_path.exists():
+        typer.echo(f"Error: Template '{template_path}' not found.", err=True)
+        raise typer.Exit(1)
+
+    engine = TemplateEngine(template_path, variables=TEMPLATE_VARIABLES)
+    for name in engine.unknown_placeholders:
+        typer.echo(
+            f"Warning: Template placeholder '{{{{{name}}}}}' is not a note variable and will be left as is.",
+            err=True
+        )
+    if engine.unknown_placeholders:
+        typer.echo(f"  Note variables: {', '.join(TEMPLATE_VARIABLES)}", err=True)
+
+
+# Options shared by parse, parse-dir, watch and serve; defaults are given in each signature
+TemplateOption = Annotated[Optional[Path], typer.Option(
+    "--template", "-t", help="Custom template file (default: templates/bullet-points-template.md)"
+)]
+PromptOption = Annotated[Optional[str], typer.Option(
+    "--prompt", "-p", help="Prompt name to use (without .txt extension, e.g., 'bullet-points')"
+)]
+ModelOption = Annotated[str, typer.Option(
+    "--model", help="Model: 'local' (TrOCR), 'claude' (API), or 'ollama' (local LLM)"
+)]
+PreprocessOption = Annotated[bool, typer.Option(
+    "--preprocess/--no-preprocess", help="Apply image optimization (for TrOCR only)"
+)]
+PreprocessProfileOption = Annotated[str, typer.Option(
+    "--preprocess-profile",
+    help="Preprocessing for TrOCR: 'fast', 'balanced', 'smooth', 'quality' or 'full' (slowest)"
+)]
+CvThreadsOption = Annotated[Optional[int], typer.Option(
+    "--cv-threads", min=0, help="Threads OpenCV uses for preprocessing (default: one per core)"
+)]
+TrocrModelOption = Annotated[str, typer.Option(
+    "--trocr-model", help="TrOCR model to use with --model local"
+)]
+DeviceOption = Annotated[Optional[str], typer.Option(
+    "--device", help="Torch device for TrOCR, e.g. 'cpu' or 'cuda' (default: auto)"
+)]
+SegmentOption = Annotated[bool, typer.Option(
+    "--segment/--no-segment", help="Split the page into text lines before TrOCR recognition"
+)]
+BatchSizeOption = Annotated[int, typer.Option(
+    "--batch-size", min=1, help="Text lines per TrOCR inference batch"
+)]
+OptimizeOption = Annotated[bool, typer.Option(
+    "--optimize/--no-optimize", help="Optimize image for LLM vision (resize, compress)"
+)]
+GrayscaleOption = Annotated[bool, typer.Option(
+    "--grayscale", help="Convert to grayscale to save tokens (~3x reduction)"
+)]
+MaxImageTokensOption = Annotated[Optional[int], typer.Option(
+    "--max-image-tokens", min=1, help="Adaptive optimization: cap the estimated image tokens per page"
+)]
+MaxImageKbOption = Annotated[Optional[int], typer.Option(
+    "--max-image-kb", min=1, help="Adaptive optimization: cap the image payload size per page (KB)"
+)]
+MinSharpnessOption = Annotated[Optional[float], typer.Option(
+    "--min-sharpness",
+    min=0.0,
+    max=1.0,
+    help="Adaptive optimization: detail to keep relative to the default size, 0-1 (default: 0.6)"
+)]
+CropPageOption = Annotated[bool, typer.Option(
+    "--crop-page", help="Detect the page, straighten it and crop to the handwriting before extraction"
+)]
+SplitSpreadOption = Annotated[bool, typer.Option(
+    "--split-spread", help="Split two-page spreads at the gutter and extract each page separately"
+)]
+TilesOption = Annotated[int, typer.Option(
+    "--tiles",
+    min=1,
+    help="Cut each page into this many overlapping bands, extracted in parallel and stitched"
+)]
+ApiKeyOption = Annotated[Optional[str], typer.Option(
+    "--api-key", help="Anthropic API key (or set ANTHROPIC_API_KEY env var)"
+)]
+OllamaModelOption = Annotated[str, typer.Option("--ollama-model", help="Ollama model name")]
+OllamaUrlOption = Annotated[str, typer.Option("--ollama-url", help="Ollama API endpoint")]
+OllamaKeepAliveOption = Annotated[str, typer.Option(
+    "--ollama-keep-alive",
+    help="How long Ollama keeps the model loaded between pages (e.g. '10m', '-1' for forever)"
+)]
+TagsOption = Annotated[bool, typer.Option(
+    "--tags", help="Generate tags and use them as context for better extraction (Claude only)"
+)]
+TagsModeOption = Annotated[str, typer.Option(
+    "--tags-mode", help="'single' (tags and content in one request) or 'two-step' (tags first, then content)"
+)]
+SourceOption = Annotated[Optional[str], typer.Option(
+    "--source", "-s", help="Custom source description for every page (default: image filename)"
+)]
+RecursiveOption = Annotated[bool, typer.Option(
+    "--recursive", "-r", help="Include images in subdirectories"
+)]
+SidecarOption = Annotated[bool, typer.Option(
+    "--sidecar/--no-sidecar",
+    help="Save the raw extraction next to each note as JSON, so 'rerender' can rebuild it"
+)]
+CacheOption = Annotated[bool, typer.Option(
+    "--cache/--no-cache", help="Reuse cached Claude/Ollama results for unchanged images"
+)]
+StreamOption = Annotated[bool, typer.Option(
+    "--stream", help="Stream Claude/Ollama output and update the note as text arrives"
+)]
+MetricsOption = Annotated[bool, typer.Option(
+    "--metrics/--no-metrics",
+    help="Record stage timings and token counts for 'notebook-parser stats' (keeps the latest 50,000 pages)"
+)]
+ProfileOption = Annotated[Optional[Path], typer.Option(
+    "--profile", help="Write a cProfile of the run to this file"
+)]
+
+
+def _parse_options(
+    *,
+    template: Optional[Path],
+    model: str,
+    prompt: Optional[str],
+    preprocess: bool,
+    preprocess_profile: str,
+    cv_threads: Optional[int],
+    trocr_model: str,
+    device: Optional[str],
+    segment: bool,
+    batch_size: int,
+    optimize: bool,
+    grayscale: bool,
+    max_image_tokens: Optional[int],
+    max_image_kb: Optional[int],
+    min_sharpness: Optional[float],
+    crop_page: bool,
+    split_spread: bool,
+    tiles: int,
+    api_key: Optional[str],
+    ollama_model: str,
+    ollama_url: str,
+    ollama_keep_alive: str,
+    tags: bool,
+    tags_mode: str,
+    sidecar: bool = True
+) -> tuple[Path, ParseOptions]:
+    """
+    Check the shared extraction options and build the run's settings.
+
+    Exits with an error for a missing template or an unknown model, tags
+    mode or preprocessing profile.
+
+    Returns:
+        Tuple of (template path, extraction settings)
+    """
+    template_path = template if template is not None else TemplateEngine.get_default_template()
+    _check_template(template_path)
+
+    models = available_extractors()
+    if model not in models:
+        typer.echo(f"Error: Unknown model '{model}'.", err=True)
+        typer.echo(f"Valid options: {', '.join(repr(name) for name in models)}", err=True)
+        raise typer.Exit(1)
+
+    if tags_mode not in TAG_MODES:
+        typer.echo(f"Error: Unknown tags mode '{tags_mode}'.", err=True)
+        typer.echo("Valid options: 'single' or 'two-step'", err=True)
+        raise typer.Exit(1)
+
+    if preprocess_profile not in PROFILES:
+        typer.echo(f"Error: Unknown preprocessing profile '{preprocess_profile}'.", err=True)
+        typer.echo(f"Valid options: {', '.join(repr(name) for name in PROFILES)}", err=True)
+        raise typer.Exit(1)
+
+    options = ParseOptions(
+        model=model,
+        prompt=prompt,
+        preprocess=preprocess,
+        preprocess_profile=preprocess_profile,
+        cv_threads=cv_threads,
+        trocr_model=trocr_model,
+        device=device,
+        segment=segment,
+        batch_size=batch_size,
+        optimize=optimize,
+        grayscale=grayscale,
+        api_key=api_key,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        ollama_keep_alive=ollama_keep_alive,
+        tags=tags,
+        tags_mode=tags_mode,
+        image_budget=_image_budget(max_image_tokens, max_image_kb, min_sharpness),
+        crop_page=crop_page,
+        split_spread=split_spread,
+        tiles=tiles,
+        sidecar=sidecar,
+    )
+    return template_path, options
 
 
 @app.command()
 def read(
     image_path: Path = typer.Argument(..., help="Path to handwritten image"),
     model: str = typer.Option(
-        "microsoft/trocr-large-handwritten",
+        DEFAULT_MODEL,
         "--model",
         "-m",
         help="TrOCR model to use"
@@ -33,19 +280,71 @@ def read(
         "--preprocess/--no-preprocess",
         help="Apply image preprocessing"
     ),
+    preprocess_profile: str = typer.Option(
+        DEFAULT_PROFILE,
+        "--preprocess-profile",
+        help="Preprocessing for TrOCR: 'fast', 'balanced', 'smooth', 'quality' or 'full' (slowest)"
+    ),
+    cv_threads: Optional[int] = typer.Option(
+        None,
+        "--cv-threads",
+        min=0,
+        help="Threads OpenCV uses for preprocessing (default: one per core)"
+    ),
+    device: Optional[str] = typer.Option(
+        None,
+        "--device",
+        help="Torch device for TrOCR, e.g. 'cpu' or 'cuda' (default: auto)"
+    ),
+    segment: bool = typer.Option(
+        True,
+        "--segment/--no-segment",
+        help="Split the page into text lines before recognition"
+    ),
+    batch_size: int = typer.Option(
+        8,
+        "--batch-size",
+        help="Text lines per TrOCR inference batch"
+    ),
+    show_timings: bool = typer.Option(
+        False,
+        "--timings",
+        help="Print how long each preprocessing and recognition step took"
+    ),
 ) -> None:
     """Extract handwritten text from image (100% local)."""
     if not image_path.exists():
         typer.echo(f"Error: File '{image_path}' not found.", err=True)
         raise typer.Exit(1)
 
+    if preprocess_profile not in PROFILES:
+        typer.echo(f"Error: Unknown preprocessing profile '{preprocess_profile}'.", err=True)
+        typer.echo(f"Valid options: {', '.join(repr(name) for name in PROFILES)}", err=True)
+        raise typer.Exit(1)
+
     try:
         typer.echo("Loading model...", err=True)
-        text = extract_text_local(image_path, preprocess=preprocess, model_name=model)
+        timings = {}
+        text = extract_text_local(
+            image_path,
+            preprocess=preprocess,
+            model_name=model,
+            device=device,
+            segment=segment,
+            batch_size=batch_size,
+            preprocess_profile=preprocess_profile,
+            cv_threads=cv_threads,
+            timings=timings
+        )
 
         typer.echo("\n--- Extracted Text ---", err=True)
         typer.echo(text)
 
+        if show_timings:
+            typer.echo("\n--- Timings ---", err=True)
+            for step, seconds in timings.items():
+                typer.echo(f"  {step}: {seconds * 1000:.0f} ms", err=True)
+
     except Exception as e:
         typer.echo(f"Error processing image: {e}", err=True)
         raise typer.Exit(1)
@@ -60,64 +359,36 @@ def parse(
         "-o",
         help="Output markdown file (default: results/<input-name>.md)"
     ),
-    template: Optional[Path] = typer.Option(
-        None,
-        "--template",
-        "-t",
-        help="Custom template file (default: templates/note-template.md)"
-    ),
-    prompt: Optional[str] = typer.Option(
-        None,
-        "--prompt",
-        "-p",
-        help="Prompt name to use (without .txt extension, e.g., 'bullet-points')"
-    ),
-    model: str = typer.Option(
-        "local",
-        "--model",
-        help="Model: 'local' (TrOCR), 'claude' (API), or 'ollama' (local LLM)"
-    ),
-    preprocess: bool = typer.Option(
-        True,
-        "--preprocess/--no-preprocess",
-        help="Apply image optimization (for TrOCR only)"
-    ),
-    optimize: bool = typer.Option(
-        True,
-        "--optimize/--no-optimize",
-        help="Optimize image for LLM vision (resize, compress)"
-    ),
-    grayscale: bool = typer.Option(
-        False,
-        "--grayscale",
-        help="Convert to grayscale to save tokens (~3x reduction)"
-    ),
-    api_key: Optional[str] = typer.Option(
-        None,
-        "--api-key",
-        help="Anthropic API key (or set ANTHROPIC_API_KEY env var)"
-    ),
-    ollama_model: str = typer.Option(
-        "llama3.2-vision",
-        "--ollama-model",
-        help="Ollama model name"
-    ),
-    ollama_url: str = typer.Option(
-        "http://localhost:11434",
-        "--ollama-url",
-        help="Ollama API endpoint"
-    ),
-    tags: bool = typer.Option(
-        False,
-        "--tags",
-        help="Generate tags first, then use as context for better extraction (Claude only)"
-    ),
-    source: Optional[str] = typer.Option(
-        None,
-        "--source",
-        "-s",
-        help="Custom source description (default: image filename)"
-    ),
+    template: TemplateOption = None,
+    prompt: PromptOption = None,
+    model: ModelOption = "local",
+    preprocess: PreprocessOption = True,
+    preprocess_profile: PreprocessProfileOption = DEFAULT_PROFILE,
+    cv_threads: CvThreadsOption = None,
+    trocr_model: TrocrModelOption = DEFAULT_MODEL,
+    device: DeviceOption = None,
+    segment: SegmentOption = True,
+    batch_size: BatchSizeOption = 8,
+    optimize: OptimizeOption = True,
+    grayscale: GrayscaleOption = False,
+    max_image_tokens: MaxImageTokensOption = None,
+    max_image_kb: MaxImageKbOption = None,
+    min_sharpness: MinSharpnessOption = None,
+    crop_page: CropPageOption = False,
+    split_spread: SplitSpreadOption = False,
+    tiles: TilesOption = 1,
+    api_key: ApiKeyOption = None,
+    ollama_model: OllamaModelOption = "llama3.2-vision",
+    ollama_url: OllamaUrlOption = "http://localhost:11434",
+    ollama_keep_alive: OllamaKeepAliveOption = "10m",
+    tags: TagsOption = False,
+    tags_mode: TagsModeOption = "single",
+    source: SourceOption = None,
+    sidecar: SidecarOption = True,
+    use_cache: CacheOption = True,
+    stream: StreamOption = False,
+    record_metrics: MetricsOption = True,
+    profile: ProfileOption = None,
 ) -> None:
     """
     Parse notebook image to markdown note.
@@ -138,88 +409,901 @@ def parse(
         results_dir.mkdir(exist_ok=True)
         output = results_dir / f"{input_path.stem}.md"
 
-    # Load template
-    if template is None:
-        template_path = TemplateEngine.get_default_template()
-    else:
-        template_path = template
+    template_path, options = _parse_options(
+        template=template,
+        model=model,
+        prompt=prompt,
+        preprocess=preprocess,
+        preprocess_profile=preprocess_profile,
+        cv_threads=cv_threads,
+        trocr_model=trocr_model,
+        device=device,
+        segment=segment,
+        batch_size=batch_size,
+        optimize=optimize,
+        grayscale=grayscale,
+        max_image_tokens=max_image_tokens,
+        max_image_kb=max_image_kb,
+        min_sharpness=min_sharpness,
+        crop_page=crop_page,
+        split_spread=split_spread,
+        tiles=tiles,
+        api_key=api_key,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        ollama_keep_alive=ollama_keep_alive,
+        tags=tags,
+        tags_mode=tags_mode,
+        sidecar=sidecar,
+    )
 
-    if not template_path.exists():
-        typer.echo(f"Error: Template '{template_path}' not found.", err=True)
+    metrics = MetricsStore() if record_metrics else None
+    error = "failed"
+    with profiled(profile), trace() as page_trace:
+        try:
+            typer.echo(f"Processing {input_path.name}...", err=True)
+
+            # Load template content for LLM context
+            engine = TemplateEngine(template_path)
+
+            with open_extractor(options) as extractor:
+                for line in extractor.describe():
+                    typer.echo(line, err=True)
+
+                # Cropping runs here so what was found can be reported
+                if options.crop_page:
+                    crop = read_page_crop(page_image(input_path, options))
+                    if crop is not None:
+                        typer.echo(f"  Page: {crop.summary()}", err=True)
+
+                # Adaptive optimization runs here so the chosen size can be reported
+                image_bytes = None
+                if options.image_budget is not None:
+                    image_bytes = prepare_image(input_path, options)
+                    choice = read_image_choice(image_bytes) if image_bytes is not None else None
+                    if choice is not None:
+                        typer.echo(f"  Image: {choice.summary()}", err=True)
+
+                # Extract text with the selected backend
+                usage = TokenUsage()
+                text_stream = TextStream(NoteWriter(engine, input_path, output, source)) if stream else None
+                start = time.perf_counter()
+                try:
+                    extracted_text, generated_tags = extract_page(
+                        input_path,
+                        engine.template_content,
+                        options,
+                        image_bytes=image_bytes,
+                        cache=ExtractionCache() if use_cache else None,
+                        usage=usage,
+                        stream=text_stream,
+                        extractor=extractor
+                    )
+                except StreamInterrupted as e:
+                    # Keep the text that arrived before the failure
+                    write_note(engine, input_path, output, e.text, source=source)
+                    typer.echo(f"Error: {e}", err=True)
+                    typer.echo(f"  Partial note kept: {output}", err=True)
+                    raise typer.Exit(1)
+
+                timings = {"extract": round(time.perf_counter() - start, 3)}
+
+            # Render template and write output
+            template_vars = write_note(
+                engine, input_path, output, extracted_text, generated_tags, source, options, timings
+            )
+
+            typer.echo(f"\n✓ Successfully created: {output}", err=True)
+            typer.echo(f"  Title: {template_vars['title']}", err=True)
+            typer.echo(f"  Source: {template_vars['source']}", err=True)
+            _echo_usage(usage)
+            if text_stream is not None and text_stream.ttft is not None:
+                typer.echo(f"  First token: {text_stream.ttft:.2f}s", err=True)
+            error = None
+
+        except typer.Exit:
+            raise
+        except Exception as e:
+            error = str(e)
+            typer.echo(f"Error: {e}", err=True)
+            raise typer.Exit(1)
+        finally:
+            if metrics is not None:
+                metrics.record(page_trace, options, input_path, error)
+
+    if profile is not None:
+        typer.echo(f"  Profile: {profile} (python -m pstats {profile})", err=True)
+
+
+@app.command("parse-dir")
+def parse_dir(
+    input_dir: Path = typer.Argument(..., help="Directory of notebook images"),
+    output_dir: Path = typer.Option(
+        Path("results"),
+        "--output-dir",
+        "-o",
+        help="Directory for markdown notes (default: results/)"
+    ),
+    template: TemplateOption = None,
+    prompt: PromptOption = None,
+    model: ModelOption = "local",
+    preprocess: PreprocessOption = True,
+    preprocess_profile: PreprocessProfileOption = DEFAULT_PROFILE,
+    cv_threads: CvThreadsOption = None,
+    trocr_model: TrocrModelOption = DEFAULT_MODEL,
+    device: DeviceOption = None,
+    segment: SegmentOption = True,
+    batch_size: BatchSizeOption = 8,
+    optimize: OptimizeOption = True,
+    grayscale: GrayscaleOption = False,
+    max_image_tokens: MaxImageTokensOption = None,
+    max_image_kb: MaxImageKbOption = None,
+    min_sharpness: MinSharpnessOption = None,
+    crop_page: CropPageOption = False,
+    split_spread: SplitSpreadOption = False,
+    tiles: TilesOption = 1,
+    api_key: ApiKeyOption = None,
+    ollama_model: OllamaModelOption = "llama3.2-vision",
+    ollama_url: OllamaUrlOption = "http://localhost:11434",
+    ollama_keep_alive: OllamaKeepAliveOption = "10m",
+    tags: TagsOption = False,
+    tags_mode: TagsModeOption = "single",
+    source: SourceOption = None,
+    recursive: RecursiveOption = False,
+    workers: int = typer.Option(
+        4,
+        "--workers",
+        "-w",
+        help="Concurrent extraction requests"
+    ),
+    optimize_workers: Optional[int] = typer.Option(
+        None,
+        "--optimize-workers",
+        help="Processes for image optimization (default: CPU count)"
+    ),
+    max_in_flight: int = typer.Option(
+        8,
+        "--max-in-flight",
+        help="Maximum pages held in memory at once"
+    ),
+    sidecar: SidecarOption = True,
+    use_cache: CacheOption = True,
+    batch_api: bool = typer.Option(
+        False,
+        "--batch-api",
+        help="Submit pages through the Message Batches API (Claude only); fetch notes later with 'collect'"
+    ),
+    use_async: bool = typer.Option(
+        False,
+        "--async",
+        help="Run requests on one event loop with async clients; --workers sets the pages in flight"
+    ),
+    stream: StreamOption = False,
+    dedup: str = typer.Option(
+        "off",
+        "--dedup",
+        help="Before extraction, skip blank pages and 'skip' or 'alias' (reuse the extraction of) repeated shots of a page"
+    ),
+    dedup_distance: int = typer.Option(
+        DEFAULT_MAX_DISTANCE,
+        "--dedup-distance",
+        min=0,
+        max=64,
+        help="Bits of the 64-bit page hash two shots may differ in to be compared as possibly the same page"
+    ),
+    record_metrics: MetricsOption = True,
+    profile: ProfileOption = None,
+) -> None:
+    """
+    Parse every notebook image in a directory to markdown notes.
+
+    Example:
+        notebook-parser parse-dir scans/ --model claude --tags -o notes/
+        notebook-parser parse-dir scans/ --model claude --batch-api  # then: notebook-parser collect
+    """
+    if not input_dir.is_dir():
+        typer.echo(f"Error: Input directory '{input_dir}' not found.", err=True)
+        raise typer.Exit(1)
+
+    template_path, options = _parse_options(
+        template=template,
+        model=model,
+        prompt=prompt,
+        preprocess=preprocess,
+        preprocess_profile=preprocess_profile,
+        cv_threads=cv_threads,
+        trocr_model=trocr_model,
+        device=device,
+        segment=segment,
+        batch_size=batch_size,
+        optimize=optimize,
+        grayscale=grayscale,
+        max_image_tokens=max_image_tokens,
+        max_image_kb=max_image_kb,
+        min_sharpness=min_sharpness,
+        crop_page=crop_page,
+        split_spread=split_spread,
+        tiles=tiles,
+        api_key=api_key,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        ollama_keep_alive=ollama_keep_alive,
+        tags=tags,
+        tags_mode=tags_mode,
+        sidecar=sidecar,
+    )
+
+    if batch_api and model != "claude":
+        typer.echo("Error: --batch-api requires --model claude.", err=True)
+        raise typer.Exit(1)
+
+    if stream and (batch_api or use_async):
+        typer.echo("Error: --stream can't be combined with --batch-api or --async.", err=True)
+        raise typer.Exit(1)
+
+    if batch_api and (split_spread or tiles > 1):
+        typer.echo("Error: --split-spread and --tiles can't be combined with --batch-api.", err=True)
         raise typer.Exit(1)
 
+    if dedup not in DEDUP_MODES:
+        typer.echo(f"Error: Unknown dedup mode '{dedup}'.", err=True)
+        typer.echo(f"Valid options: {', '.join(repr(name) for name in DEDUP_MODES)}", err=True)
+        raise typer.Exit(1)
+
+    if batch_api and dedup != "off":
+        typer.echo("Error: --dedup can't be combined with --batch-api.", err=True)
+        raise typer.Exit(1)
+
+    images = find_images(input_dir, recursive=recursive)
+    if not images:
+        typer.echo(f"No images found in '{input_dir}'.", err=True)
+        return
+
+    if batch_api:
+        if tags and tags_mode == "two-step":
+            typer.echo("  Note: batches use single-request tags (--tags-mode single).", err=True)
+        typer.echo(f"Submitting {len(images)} images to the Message Batches API...", err=True)
+        try:
+            manifests = submit_batch(
+                plan_outputs(images, input_dir, output_dir), template_path, options, source=source
+            )
+        except Exception as e:
+            typer.echo(f"Error: {e}", err=True)
+            if pending_manifests():
+                typer.echo("Batches submitted before the error can still be collected with 'notebook-parser collect'.", err=True)
+            raise typer.Exit(1)
+
+        for manifest_path in manifests:
+            typer.echo(f"  ✓ Batch {manifest_path.stem} ({manifest_path})", err=True)
+        typer.echo("\nResults are usually ready within an hour. Run 'notebook-parser collect' to write the notes.", err=True)
+        return
+
+    def report(result):
+        timing = f" (first token {result.ttft:.2f}s)" if result.ttft is not None else ""
+        if result.skipped:
+            typer.echo(f"  - {result.image_path.name}: skipped ({result.skipped})", err=True)
+        elif result.ok:
+            typer.echo(f"  ✓ {result.image_path.name} -> {result.output_path}{timing}", err=True)
+            if result.image is not None:
+                typer.echo(f"    Image: {result.image.summary()}", err=True)
+        else:
+            typer.echo(f"  ✗ {result.image_path.name}: {result.error}", err=True)
+
+    pages = plan_outputs(images, input_dir, output_dir)
+    screened = []
+    if dedup != "off":
+        typer.echo(f"Checking {len(images)} images for blank pages and duplicates...", err=True)
+        index = PageIndex(output_dir / INDEX_FILENAME)
+        screening = screen_pages(pages, index, dedup_distance)
+        pages = screening.extract
+        screened = [PageResult(image, output, skipped="blank page") for image, output in screening.blank]
+        if dedup == "skip":
+            screened += [
+                PageResult(image, output, skipped=f"duplicate of {original}")
+                for image, output, original in screening.duplicates
+            ]
+        for result in screened:
+            report(result)
+
+    typer.echo(f"Processing {len(pages)} images with {model} ({workers} workers)...", err=True)
+
+    usage = TokenUsage()
+    cache = ExtractionCache() if use_cache else None
+    metrics = MetricsStore() if record_metrics else None
     try:
-        typer.echo(f"Processing {input_path.name}...", err=True)
-
-        # Load template content for LLM context
-        template_content = template_path.read_text()
-
-        # Extract text based on model choice
-        generated_tags = None  # Initialize for all models
-
-        if model == "local":
-            typer.echo("Using local TrOCR model...", err=True)
-            extracted_text = extract_text_local(input_path, preprocess=preprocess)
-
-        elif model == "claude":
-            typer.echo("Using Claude Sonnet 4.5 vision API...", err=True)
-            if optimize:
-                typer.echo(f"  Optimizing image (grayscale: {grayscale})...", err=True)
-
-            # Use two-step extraction with tags if --tags flag is enabled
-            if tags:
-                typer.echo("  Step 1: Generating tags...", err=True)
-                typer.echo("  Step 2: Extracting content with tags context...", err=True)
-                extracted_text, generated_tags = extract_with_claude_tags(
-                    image_path=input_path,
-                    template_content=template_content,
-                    api_key=api_key,
-                    optimize=optimize,
-                    grayscale=grayscale
-                )
+        with profiled(profile):
+            if use_async:
+                results = asyncio.run(run_batch_async(
+                    pages,
+                    template_path,
+                    options,
+                    source=source,
+                    concurrency=workers,
+                    on_result=report,
+                    cache=cache,
+                    usage=usage,
+                    metrics=metrics,
+                ))
             else:
-                extracted_text = extract_with_claude(
-                    image_path=input_path,
-                    template_content=template_content,
-                    api_key=api_key,
-                    optimize=optimize,
-                    grayscale=grayscale,
-                    prompt_name=prompt
+                results = run_batch(
+                    pages,
+                    template_path,
+                    options,
+                    source=source,
+                    workers=workers,
+                    optimize_workers=optimize_workers,
+                    max_in_flight=max_in_flight,
+                    on_result=report,
+                    cache=cache,
+                    usage=usage,
+                    stream=stream,
+                    metrics=metrics,
                 )
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
 
-        elif model == "ollama":
-            typer.echo(f"Using Ollama vision model ({ollama_model})...", err=True)
-            if optimize:
-                typer.echo(f"  Optimizing image (grayscale: {grayscale})...", err=True)
-            extracted_text = extract_with_ollama(
-                image_path=input_path,
-                template_content=template_content,
-                model=ollama_model,
-                ollama_url=ollama_url,
-                optimize=optimize,
-                grayscale=grayscale,
-                prompt_name=prompt
-            )
+    if dedup != "off":
+        if dedup == "alias":
+            results += alias_notes(screening.duplicates, template_path, source=source, on_result=report)
+        # Later runs find duplicates of every page written now
+        for result in results:
+            page = screening.fingerprints.get(result.image_path)
+            if page is not None and result.ok and not result.skipped:
+                index.record(result.image_path, page, result.output_path)
+        results += screened
+
+    failed = [result for result in results if not result.ok]
+    skipped = [result for result in results if result.skipped]
+    written = len(results) - len(failed) - len(skipped)
+    typer.echo(f"\n✓ {written}/{len(results)} notes written to {output_dir}", err=True)
+    if skipped:
+        typer.echo(f"  Skipped {len(skipped)} blank or duplicate pages", err=True)
+    if profile is not None:
+        typer.echo(f"  Profile: {profile} (python -m pstats {profile})", err=True)
+    _echo_usage(usage)
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command()
+def watch(
+    input_dir: Path = typer.Argument(..., help="Directory to watch for notebook images"),
+    output_dir: Path = typer.Option(
+        Path("results"),
+        "--output-dir",
+        "-o",
+        help="Directory for markdown notes (default: results/)"
+    ),
+    template: TemplateOption = None,
+    prompt: PromptOption = None,
+    model: ModelOption = "local",
+    preprocess: PreprocessOption = True,
+    preprocess_profile: PreprocessProfileOption = DEFAULT_PROFILE,
+    cv_threads: CvThreadsOption = None,
+    trocr_model: TrocrModelOption = DEFAULT_MODEL,
+    device: DeviceOption = None,
+    segment: SegmentOption = True,
+    batch_size: BatchSizeOption = 8,
+    optimize: OptimizeOption = True,
+    grayscale: GrayscaleOption = False,
+    max_image_tokens: MaxImageTokensOption = None,
+    max_image_kb: MaxImageKbOption = None,
+    min_sharpness: MinSharpnessOption = None,
+    crop_page: CropPageOption = False,
+    split_spread: SplitSpreadOption = False,
+    tiles: TilesOption = 1,
+    api_key: ApiKeyOption = None,
+    ollama_model: OllamaModelOption = "llama3.2-vision",
+    ollama_url: OllamaUrlOption = "http://localhost:11434",
+    ollama_keep_alive: OllamaKeepAliveOption = "10m",
+    tags: TagsOption = False,
+    tags_mode: TagsModeOption = "single",
+    source: SourceOption = None,
+    recursive: RecursiveOption = False,
+    workers: int = typer.Option(
+        2,
+        "--workers",
+        "-w",
+        min=1,
+        help="Pages processed at once (capped by the backend)"
+    ),
+    poll_interval: float = typer.Option(
+        2.0,
+        "--poll-interval",
+        help="Seconds between folder scans when polling"
+    ),
+    settle: float = typer.Option(
+        1.0,
+        "--settle",
+        min=0.0,
+        help="Seconds an image must stay unchanged before it is parsed"
+    ),
+    polling: bool = typer.Option(
+        False,
+        "--polling",
+        help="Scan the folder instead of using file system events (e.g. on network drives)"
+    ),
+    once: bool = typer.Option(
+        False,
+        "--once",
+        help="Parse new and changed images already in the folder, then exit"
+    ),
+    state: Optional[Path] = typer.Option(
+        None,
+        "--state",
+        help="State database of processed images (default: .notebook-parser-watch.sqlite3 in the output dir)"
+    ),
+    sidecar: SidecarOption = True,
+    use_cache: CacheOption = True,
+    record_metrics: MetricsOption = True,
+) -> None:
+    """
+    Watch a directory and parse images as they are added or changed.
+
+    The backend stays loaded while watching. Processed images are recorded
+    in a state database, so restarting only parses new or changed images.
+
+    Example:
+        notebook-parser watch ~/Scans --model ollama -o notes/
+        notebook-parser watch ~/Scans --model claude --once  # e.g. from cron
+    """
+    if not input_dir.is_dir():
+        typer.echo(f"Error: Input directory '{input_dir}' not found.", err=True)
+        raise typer.Exit(1)
 
+    template_path, options = _parse_options(
+        template=template,
+        model=model,
+        prompt=prompt,
+        preprocess=preprocess,
+        preprocess_profile=preprocess_profile,
+        cv_threads=cv_threads,
+        trocr_model=trocr_model,
+        device=device,
+        segment=segment,
+        batch_size=batch_size,
+        optimize=optimize,
+        grayscale=grayscale,
+        max_image_tokens=max_image_tokens,
+        max_image_kb=max_image_kb,
+        min_sharpness=min_sharpness,
+        crop_page=crop_page,
+        split_spread=split_spread,
+        tiles=tiles,
+        api_key=api_key,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        ollama_keep_alive=ollama_keep_alive,
+        tags=tags,
+        tags_mode=tags_mode,
+        sidecar=sidecar,
+    )
+
+    counts = {"ok": 0, "failed": 0}
+
+    def report(result):
+        if result.ok:
+            counts["ok"] += 1
+            typer.echo(f"  ✓ {result.image_path.name} -> {result.output_path}", err=True)
         else:
-            typer.echo(f"Error: Unknown model '{model}'.", err=True)
-            typer.echo("Valid options: 'local', 'claude', or 'ollama'", err=True)
+            counts["failed"] += 1
+            typer.echo(f"  ✗ {result.image_path.name}: {result.error}", err=True)
+
+    usage = TokenUsage()
+    watcher = FolderWatcher(
+        input_dir,
+        output_dir,
+        template_path,
+        options,
+        state=WatchState(state) if state is not None else None,
+        source=source,
+        recursive=recursive,
+        workers=workers,
+        poll_interval=poll_interval,
+        settle=settle,
+        use_events=not polling,
+        on_result=report,
+        cache=ExtractionCache() if use_cache else None,
+        usage=usage,
+        metrics=MetricsStore() if record_metrics else None,
+    )
+
+    if once:
+        typer.echo(f"Parsing new images in {input_dir} with {model}...", err=True)
+    else:
+        typer.echo(f"Watching {input_dir} with {model} ({watcher.mode}); press Ctrl-C to stop...", err=True)
+    try:
+        watcher.run(once=once)
+    except KeyboardInterrupt:
+        typer.echo("\nStopped.", err=True)
+    except Exception as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    typer.echo(f"\n✓ {counts['ok']} notes written to {output_dir}", err=True)
+    _echo_usage(usage)
+    if counts["failed"]:
+        typer.echo(f"  {counts['failed']} images failed; they are retried on the next run.", err=True)
+        if once:
             raise typer.Exit(1)
 
-        # Format into template variables
-        template_vars = format_for_template(extracted_text, input_path, generated_tags, source)
 
-        # Render template
-        engine = TemplateEngine(template_path)
-        markdown_content = engine.render(**template_vars)
+@app.command()
+def serve(
+    host: str = typer.Option(
+        "127.0.0.1",
+        "--host",
+        help="Interface to listen on"
+    ),
+    port: int = typer.Option(
+        8765,
+        "--port",
+        help="Port to listen on"
+    ),
+    template: TemplateOption = None,
+    prompt: PromptOption = None,
+    model: ModelOption = "local",
+    preprocess: PreprocessOption = True,
+    preprocess_profile: PreprocessProfileOption = DEFAULT_PROFILE,
+    cv_threads: CvThreadsOption = None,
+    trocr_model: TrocrModelOption = DEFAULT_MODEL,
+    device: DeviceOption = None,
+    segment: SegmentOption = True,
+    batch_size: BatchSizeOption = 8,
+    optimize: OptimizeOption = True,
+    grayscale: GrayscaleOption = False,
+    max_image_tokens: MaxImageTokensOption = None,
+    max_image_kb: MaxImageKbOption = None,
+    min_sharpness: MinSharpnessOption = None,
+    crop_page: CropPageOption = False,
+    split_spread: SplitSpreadOption = False,
+    tiles: TilesOption = 1,
+    api_key: ApiKeyOption = None,
+    ollama_model: OllamaModelOption = "llama3.2-vision",
+    ollama_url: OllamaUrlOption = "http://localhost:11434",
+    ollama_keep_alive: OllamaKeepAliveOption = "10m",
+    tags: TagsOption = False,
+    tags_mode: TagsModeOption = "single",
+    workers: int = typer.Option(
+        4,
+        "--workers",
+        "-w",
+        min=1,
+        help="Requests extracted at once (local OCR requests are batched together instead)"
+    ),
+    max_queue: int = typer.Option(
+        32,
+        "--max-queue",
+        min=0,
+        help="Requests allowed to wait for a worker; more are rejected with 429"
+    ),
+    max_upload_mb: int = typer.Option(
+        25,
+        "--max-upload-mb",
+        min=1,
+        help="Largest accepted image (MB)"
+    ),
+    batch_lines: int = typer.Option(
+        64,
+        "--batch-lines",
+        min=1,
+        help="Local OCR: most text lines recognized in one coalesced batch"
+    ),
+    batch_wait_ms: float = typer.Option(
+        20.0,
+        "--batch-wait-ms",
+        min=0.0,
+        help="Local OCR: how long a page waits for others to share its batch"
+    ),
+    use_cache: CacheOption = True,
+    verbose: bool = typer.Option(
+        False,
+        "--verbose",
+        "-v",
+        help="Log every request"
+    ),
+) -> None:
+    """
+    Serve image-to-markdown conversion over a local HTTP endpoint.
 
-        # Write output
-        output.write_text(markdown_content)
+    Backends, prompts and the template stay loaded between requests.
+    POST image bytes to /parse (query: filename, source, model); see
+    /metrics for queue depth and latencies.
 
-        typer.echo(f"\n✓ Successfully created: {output}", err=True)
-        typer.echo(f"  Title: {template_vars['title']}", err=True)
-        typer.echo(f"  Source: {template_vars['source']}", err=True)
+    Example:
+        notebook-parser serve --model claude --tags
+        curl --data-binary @page.jpg "http://127.0.0.1:8765/parse?filename=page.jpg"
+    """
+    template_path, options = _parse_options(
+        template=template,
+        model=model,
+        prompt=prompt,
+        preprocess=preprocess,
+        preprocess_profile=preprocess_profile,
+        cv_threads=cv_threads,
+        trocr_model=trocr_model,
+        device=device,
+        segment=segment,
+        batch_size=batch_size,
+        optimize=optimize,
+        grayscale=grayscale,
+        max_image_tokens=max_image_tokens,
+        max_image_kb=max_image_kb,
+        min_sharpness=min_sharpness,
+        crop_page=crop_page,
+        split_spread=split_spread,
+        tiles=tiles,
+        api_key=api_key,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        ollama_keep_alive=ollama_keep_alive,
+        tags=tags,
+        tags_mode=tags_mode,
+    )
 
+    service = NoteService(
+        template_path,
+        options,
+        workers=workers,
+        max_queue=max_queue,
+        cache=ExtractionCache() if use_cache else None,
+        batch_lines=batch_lines,
+        batch_wait=batch_wait_ms / 1000,
+    )
+    try:
+        typer.echo(f"Loading {model}...", err=True)
+        service.open()
+        server = make_server(service, host, port, max_upload_mb=max_upload_mb, verbose=verbose)
     except Exception as e:
+        service.close()
         typer.echo(f"Error: {e}", err=True)
         raise typer.Exit(1)
+
+    bound_host, bound_port = server.server_address[:2]
+    typer.echo(f"Serving on http://{bound_host}:{bound_port} (POST /parse); press Ctrl-C to stop...", err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        typer.echo("\nStopped.", err=True)
+    finally:
+        server.server_close()
+        service.close()
+
+
+@app.command()
+def rerender(
+    path: Path = typer.Argument(..., help="Directory of notes, or a single .extraction.json sidecar"),
+    template: Optional[Path] = typer.Option(
+        None,
+        "--template",
+        "-t",
+        help="Template to render with (default: templates/bullet-points-template.md)"
+    ),
+    recursive: bool = typer.Option(
+        False,
+        "--recursive",
+        "-r",
+        help="Include notes in subdirectories"
+    ),
+    workers: int = typer.Option(
+        8,
+        "--workers",
+        "-w",
+        min=1,
+        help="Notes rendered at once"
+    ),
+) -> None:
+    """
+    Rebuild notes from their saved extractions, without calling a model.
+
+    Every note written by parse, parse-dir or watch has a sidecar with the
+    raw extraction. Use this after changing a template: notes keep their
+    original date, tags and source.
+
+    Example:
+        notebook-parser rerender notes/ -t templates/note-template.md -r
+    """
+    if path.is_file():
+        sidecars = [path]
+    elif path.is_dir():
+        sidecars = find_sidecars(path, recursive=recursive)
+    else:
+        typer.echo(f"Error: '{path}' not found.", err=True)
+        raise typer.Exit(1)
+
+    template_path = template if template is not None else TemplateEngine.get_default_template()
+    _check_template(template_path)
+
+    if not sidecars:
+        typer.echo(f"No saved extractions found in '{path}'.", err=True)
+        return
+
+    def report(result):
+        if not result.ok:
+            typer.echo(f"  ✗ {result.output_path.name}: {result.error}", err=True)
+
+    typer.echo(f"Re-rendering {len(sidecars)} notes with {template_path.name}...", err=True)
+    results = rerender_notes(sidecars, template_path, workers=workers, on_result=report)
+
+    failed = [result for result in results if not result.ok]
+    typer.echo(f"\n✓ {len(results) - len(failed)}/{len(results)} notes re-rendered", err=True)
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command()
+def collect(
+    batch_ids: Optional[list[str]] = typer.Argument(
+        None,
+        help="Batch ids to collect (default: every batch with uncollected pages)"
+    ),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Poll until each batch has finished instead of exiting early"
+    ),
+    poll_interval: float = typer.Option(
+        60.0,
+        "--poll-interval",
+        help="Seconds between status checks with --wait"
+    ),
+    api_key: Optional[str] = typer.Option(
+        None,
+        "--api-key",
+        help="Anthropic API key (or set ANTHROPIC_API_KEY env var)"
+    ),
+) -> None:
+    """
+    Write notes for batches submitted with 'parse-dir --batch-api'.
+
+    Safe to re-run: pages that were already written are skipped.
+
+    Example:
+        notebook-parser collect --wait
+    """
+    if batch_ids:
+        manifests = [find_manifest(batch_id) for batch_id in batch_ids]
+        missing = [batch_id for batch_id, path in zip(batch_ids, manifests) if path is None]
+        if missing:
+            typer.echo(f"Error: Unknown batch '{missing[0]}'.", err=True)
+            raise typer.Exit(1)
+    else:
+        manifests = pending_manifests()
+
+    if not manifests:
+        typer.echo("No batches waiting to be collected.", err=True)
+        return
+
+    def report(result):
+        if result.ok:
+            typer.echo(f"  ✓ {result.image_path.name} -> {result.output_path}", err=True)
+        else:
+            typer.echo(f"  ✗ {result.image_path.name}: {result.error}", err=True)
+
+    failed = 0
+    for manifest_path in manifests:
+        typer.echo(f"Batch {manifest_path.stem}:", err=True)
+        try:
+            status, results = collect_batch(
+                manifest_path, api_key=api_key, wait=wait, poll_interval=poll_interval, on_result=report
+            )
+        except Exception as e:
+            typer.echo(f"Error: {e}", err=True)
+            raise typer.Exit(1)
+
+        if status != "ended":
+            typer.echo(f"  Still {status.replace('_', ' ')}, try again later.", err=True)
+            continue
+
+        pages = load_manifest(manifest_path)["pages"].values()
+        done = sum(page["status"] == "done" for page in pages)
+        failed += sum(not result.ok for result in results)
+        typer.echo(f"  {done}/{len(pages)} notes written", err=True)
+
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command()
+def stats(
+    backend: Optional[str] = typer.Option(
+        None,
+        "--backend",
+        help="Only show this backend, e.g. 'claude'"
+    ),
+    clear: bool = typer.Option(
+        False,
+        "--clear",
+        help="Delete the recorded metrics"
+    ),
+) -> None:
+    """
+    Show latency percentiles, throughput and stage timings per backend.
+
+    Pages processed by parse, parse-dir and watch are recorded unless
+    they ran with --no-metrics.
+
+    Example:
+        notebook-parser stats --backend ollama
+    """
+    store = MetricsStore()
+    if clear:
+        typer.echo(f"Removed {store.clear()} recorded pages.")
+        return
+
+    summaries = store.summary(backend)
+    typer.echo(f"Metrics: {store.path}")
+    if not summaries:
+        typer.echo("  No pages recorded yet.")
+        return
+
+    for summary in summaries:
+        throughput = f", {summary.pages_per_minute} pages/min" if summary.pages_per_minute is not None else ""
+        typer.echo(f"{summary.backend}: {summary.pages} pages ({summary.failed} failed){throughput}")
+        if summary.p50 is not None:
+            typer.echo(f"  Latency: p50 {summary.p50:.2f}s, p95 {summary.p95:.2f}s, p99 {summary.p99:.2f}s")
+        if summary.stages:
+            stages = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in summary.stages.items())
+            typer.echo(f"  Stages (median): {stages}")
+
+        counters = summary.counters
+        if counters.get("requests"):
+            typer.echo(
+                f"  Tokens: {counters['requests']:.0f} requests, "
+                f"input {counters.get('input_tokens', 0):.0f}, output {counters.get('output_tokens', 0):.0f}, "
+                f"cache write {counters.get('cache_creation_input_tokens', 0):.0f}, "
+                f"cache read {counters.get('cache_read_input_tokens', 0):.0f}"
+            )
+        if counters.get("eval_duration"):
+            typer.echo(
+                f"  Ollama: prompt eval {counters.get('prompt_eval_count', 0):.0f} tokens in "
+                f"{counters.get('prompt_eval_duration', 0):.1f}s, "
+                f"eval {counters.get('eval_count', 0):.0f} tokens in {counters['eval_duration']:.1f}s "
+                f"({counters.get('eval_count', 0) / counters['eval_duration']:.1f} tokens/s)"
+            )
+
+
+@cache_app.command("stats")
+def cache_stats() -> None:
+    """Show extraction cache size and contents."""
+    stats = ExtractionCache().stats()
+
+    typer.echo(f"Cache: {stats['path']}")
+    typer.echo(f"  Entries: {stats['entries']}")
+    typer.echo(f"  Size: {stats['size_bytes'] / 1024 / 1024:.2f} MB (limit {stats['max_bytes'] / 1024 / 1024:.0f} MB)")
+    typer.echo(f"  File: {stats['file_bytes'] / 1024 / 1024:.2f} MB")
+    for backend, count in sorted(stats["backends"].items()):
+        typer.echo(f"  {backend}: {count}")
+
+    payloads = get_payload_cache().stats()
+    typer.echo(f"Optimized images: {payloads['path']}")
+    typer.echo(f"  Entries: {payloads['entries']}")
+    typer.echo(f"  Size: {payloads['size_bytes'] / 1024 / 1024:.2f} MB (limit {payloads['max_bytes'] / 1024 / 1024:.0f} MB)")
+
+
+@cache_app.command("prune")
+def cache_prune(
+    max_size: Optional[float] = typer.Option(
+        None,
+        "--max-size",
+        help="Evict least recently used entries until the cache is below this size in MB"
+    ),
+    clear: bool = typer.Option(
+        False,
+        "--all",
+        help="Remove every cached extraction"
+    ),
+) -> None:
+    """Evict least recently used extractions and optimized images from the cache."""
+    if clear:
+        max_bytes = 0
+    elif max_size is not None:
+        max_bytes = int(max_size * 1024 * 1024)
+    else:
+        max_bytes = None
+
+    removed = ExtractionCache().prune(max_bytes=max_bytes)
+    removed_payloads = get_payload_cache().prune(max_bytes=max_bytes)
+
+    typer.echo(f"Removed {removed} cached extractions and {removed_payloads} optimized images.")
@@ -0,0 +1,398 @@
+"""
+Blank and near-duplicate page detection before extraction.
+
+Photographing a notebook often produces the same page twice, or a blank
+page, and each of those would otherwise cost a full extraction. Every
+page gets a cheap fingerprint from a small grayscale decode:
+
+- a 64-bit difference hash (dHash): each bit says whether a cell of a
+  9x8 thumbnail is brighter than its right neighbour. Re-shots of the
+  same page differ in a few bits, different pages in dozens.
+- an ink density: the share of pixels clearly darker than the paper
+  around them. Lighting gradients don't count, so a blank page in uneven
+  light still reads close to zero.
+
+A hash this small mostly sees the layout of a page, so ruled pages with
+the same number of written lines can land within a few bits of each
+other. The hash only shortlists candidates: a candidate is taken for the
+same page only if keypoints of the two images (ORB) line up under a
+single shift, scale and rotation. Different writing leaves a handful of
+chance matches; a re-shot keeps hundreds.
+
+Fingerprints of pages that were extracted are kept in a small SQLite
+index in the output directory and searched with a BK-tree, so duplicates
+are also found against earlier runs.
+"""
+
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Generic, Optional, TypeVar
+
+from PIL import Image, ImageOps
+
+from .image_optimizer import load_for_llm
+
+INDEX_FILENAME = ".notebook-parser-pages.sqlite3"
+DEDUP_MODES = ("off", "skip", "alias")
+
+# Decode size for fingerprints; draft mode makes this a fraction of a full decode
+FINGERPRINT_SIZE = 256
+# Thumbnail rows; the hash has HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 8
+# Bits two pages may differ in and still count as the same page
+DEFAULT_MAX_DISTANCE = 10
+# Side of the squares the paper brightness is estimated over, in pixels
+PAPER_BLOCK = 8
+# How much darker than the surrounding paper a pixel must be to count as ink
+INK_CONTRAST = 40
+# Pages with less ink than this are blank
+BLANK_INK = 0.002
+# Decode size and keypoints per image for confirming a candidate duplicate
+MATCH_SIZE = 512
+MATCH_FEATURES = 1000
+# Keypoint matches that must agree on one transform, absolute and as a share of keypoints
+MIN_INLIERS = 20
+MIN_INLIER_SHARE = 0.05
+# Pixels (at MATCH_SIZE) a match may land from where the transform puts it
+MATCH_TOLERANCE = 4.0
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Perceptual hash and ink density of a page."""
+
+    dhash: int
+    ink: float
+
+    @property
+    def blank(self) -> bool:
+        return self.ink < BLANK_INK
+
+
+def dhash(gray: Image.Image) -> int:
+    """
+    Difference hash of a grayscale image.
+
+    Args:
+        gray: Image in 'L' mode
+
+    Returns:
+        HASH_SIZE * HASH_SIZE bit hash
+    """
+    import numpy as np
+
+    thumb = ImageOps.autocontrast(gray).resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def ink_density(gray: Image.Image) -> float:
+    """
+    Share of pixels darker than the paper around them.
+
+    The paper brightness is the brightest pixel of each PAPER_BLOCK
+    square, smoothly scaled back up: strokes are thinner than a block,
+    so they drop out, while shadows and lighting gradients remain.
+
+    Args:
+        gray: Image in 'L' mode
+
+    Returns:
+        Fraction of ink pixels, 0-1
+    """
+    import numpy as np
+
+    pixels = np.asarray(gray, dtype=np.int16)
+    rows, cols = pixels.shape[0] // PAPER_BLOCK, pixels.shape[1] // PAPER_BLOCK
+    if rows == 0 or cols == 0:
+        return 0.0
+    pixels = pixels[:rows * PAPER_BLOCK, :cols * PAPER_BLOCK]
+    blocks = pixels.reshape(rows, PAPER_BLOCK, cols, PAPER_BLOCK).max(axis=(1, 3))
+    paper = Image.fromarray(blocks.astype(np.uint8)).resize(
+        (cols * PAPER_BLOCK, rows * PAPER_BLOCK), Image.Resampling.BILINEAR
+    )
+    darker = np.asarray(paper, dtype=np.int16) - pixels
+    return float((darker > INK_CONTRAST).mean())
+
+
+def fingerprint(image_path: Path) -> Fingerprint:
+    """
+    Fingerprint an image file.
+
+    Args:
+        image_path: Path to image file
+
+    Returns:
+        The page's hash and ink density
+    """
+    gray = load_for_llm(image_path, max_size=FINGERPRINT_SIZE, grayscale=True)
+    return Fingerprint(dhash(gray), ink_density(gray))
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of bits two hashes differ in."""
+    return bin(a ^ b).count("1")
+
+
+class ShotMatcher:
+    """
+    Confirms that two images are shots of the same page.
+
+    ORB keypoints are matched between the images (cross-checked), and
+    RANSAC fits a similarity transform to the matches. Shots of one page
+    agree on a transform; different pages only produce chance matches.
+    Keypoints are computed once per image.
+    """
+
+    def __init__(self):
+        self._features: dict[Path, Optional[tuple]] = {}
+
+    def _keypoints(self, image_path: Path) -> Optional[tuple]:
+        if image_path not in self._features:
+            import cv2
+            import numpy as np
+
+            try:
+                gray = np.asarray(load_for_llm(image_path, max_size=MATCH_SIZE, grayscale=True))
+            except Exception:
+                # Moved or unreadable: nothing to confirm a match with
+                self._features[image_path] = None
+            else:
+                keypoints, descriptors = cv2.ORB_create(nfeatures=MATCH_FEATURES).detectAndCompute(gray, None)
+                self._features[image_path] = (keypoints, descriptors) if descriptors is not None else None
+        return self._features[image_path]
+
+    def __call__(self, first: Path, second: Path) -> bool:
+        """Whether first and second show the same page."""
+        import cv2
+        import numpy as np
+
+        features = self._keypoints(first), self._keypoints(second)
+        if features[0] is None or features[1] is None:
+            return False
+        (first_points, first_descriptors), (second_points, second_descriptors) = features
+
+        matches = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True).match(first_descriptors, second_descriptors)
+        if len(matches) < MIN_INLIERS:
+            return False
+        source = np.float32([first_points[match.queryIdx].pt for match in matches])
+        target = np.float32([second_points[match.trainIdx].pt for match in matches])
+        _, inliers = cv2.estimateAffinePartial2D(
+            source, target, method=cv2.RANSAC, ransacReprojThreshold=MATCH_TOLERANCE
+        )
+        if inliers is None:
+            return False
+        agreeing = int(inliers.sum())
+        fewer_points = min(len(first_points), len(second_points))
+        return agreeing >= MIN_INLIERS and agreeing >= MIN_INLIER_SHARE * fewer_points
+
+
+class BKTree(Generic[T]):
+    """
+    Hashes indexed by Hamming distance.
+
+    Each child edge is labelled with its distance to the parent, so a
+    search within radius r only descends into edges labelled d - r to
+    d + r (triangle inequality) instead of comparing every hash.
+    """
+
+    def __init__(self):
+        # Node: (hash, values, children by distance)
+        self._root: Optional[tuple[int, list[T], dict[int, tuple]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_value: int, value: T) -> None:
+        """Index value under hash_value."""
+        self._size += 1
+        if self._root is None:
+            self._root = (hash_value, [value], {})
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(hash_value, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (hash_value, [value], {})
+                return
+            node = child
+
+    def search(self, hash_value: int, max_distance: int) -> list[tuple[int, T]]:
+        """
+        Values whose hash is within max_distance bits.
+
+        Returns:
+            (distance, value) pairs, nearest first
+        """
+        found = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming(hash_value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    pending.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class PageIndex:
+    """SQLite record of extracted pages' fingerprints, searched with a BK-tree."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: SQLite file, created on first use
+        """
+        self.path = path
+        self._tree: Optional[BKTree[tuple[str, str]]] = None
+
+    @contextmanager
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    path TEXT PRIMARY KEY,
+                    dhash TEXT NOT NULL,
+                    ink REAL NOT NULL,
+                    output TEXT NOT NULL,
+                    recorded REAL NOT NULL
+                )
+                """
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _loaded(self) -> "BKTree[tuple[str, str]]":
+        if self._tree is None:
+            self._tree = BKTree()
+            with self._connect() as conn:
+                # Hashes are stored as hex: SQLite integers are signed 64-bit
+                for path, hash_hex, output in conn.execute("SELECT path, dhash, output FROM pages"):
+                    self._tree.add(int(hash_hex, 16), (path, output))
+        return self._tree
+
+    def matches(self, image_path: Path, page: Fingerprint, max_distance: int) -> list[tuple[Path, Path]]:
+        """
+        Indexed pages whose hash is within max_distance bits of this one.
+
+        The image's own earlier entry doesn't count, so re-running a
+        directory doesn't mark every page as a duplicate of itself.
+
+        Returns:
+            (image_path, note output path) pairs, nearest first
+        """
+        own_path = str(image_path.resolve())
+        return [
+            (Path(path), Path(output))
+            for _, (path, output) in self._loaded().search(page.dhash, max_distance)
+            if path != own_path
+        ]
+
+    def record(self, image_path: Path, page: Fingerprint, output_path: Path) -> None:
+        """Index a page whose note was written."""
+        path = str(image_path.resolve())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (path, f"{page.dhash:x}", page.ink, str(output_path), time.time()),
+            )
+        # Replaced entries stay in the tree; matches() only uses the paths
+        if self._tree is not None:
+            self._tree.add(page.dhash, (path, str(output_path)))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+
+@dataclass
+class Screening:
+    """Pages sorted into those to extract, blank pages and duplicates."""
+
+    extract: list[tuple[Path, Path]] = field(default_factory=list)
+    blank: list[tuple[Path, Path]] = field(default_factory=list)
+    # (image_path, output_path, output_path of the page it duplicates)
+    duplicates: list[tuple[Path, Path, Path]] = field(default_factory=list)
+    fingerprints: dict[Path, Fingerprint] = field(default_factory=dict)
+
+
+def screen_pages(
+    pages: list[tuple[Path, Path]],
+    index: PageIndex,
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    workers: Optional[int] = None
+) -> Screening:
+    """
+    Find blank pages and duplicates before anything is extracted.
+
+    Pages are compared against the index and against the pages before
+    them in the list, so the first shot of a page is extracted and later
+    shots point at it. Hash matches are only candidates; each is
+    confirmed with ShotMatcher, nearest first. Unreadable images are left
+    for extraction to report.
+
+    Args:
+        pages: List of (image_path, output_path) pairs
+        index: Fingerprints of pages extracted in earlier runs
+        max_distance: Hash bits two shots of the same page may differ in
+        workers: Threads decoding images (default: Python's default)
+
+    Returns:
+        The screened pages, with the fingerprint of every readable image
+    """
+    def safe_fingerprint(image_path: Path) -> Optional[Fingerprint]:
+        try:
+            return fingerprint(image_path)
+        except Exception:
+            return None
+
+    # Decoding and resizing release the GIL, so threads are enough
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        prints = list(pool.map(safe_fingerprint, [image_path for image_path, _ in pages]))
+
+    screening = Screening()
+    same_page = ShotMatcher()
+    batch: BKTree[tuple[Path, Path]] = BKTree()
+    for (image_path, output_path), page in zip(pages, prints):
+        if page is None:
+            screening.extract.append((image_path, output_path))
+            continue
+        screening.fingerprints[image_path] = page
+
+        if page.blank:
+            screening.blank.append((image_path, output_path))
+            continue
+
+        candidates = [value for _, value in batch.search(page.dhash, max_distance)]
+        candidates += index.matches(image_path, page, max_distance)
+        original = next(
+            (note for candidate, note in candidates if same_page(image_path, candidate)), None
+        )
+        if original is not None:
+            screening.duplicates.append((image_path, output_path, original))
+            continue
+
+        batch.add(page.dhash, (image_path, output_path))
+        screening.extract.append((image_path, output_path))
+    return screening
@@ -0,0 +1,360 @@
+"""
+Extraction backends behind a common interface.
+
+Each backend is an Extractor built from ParseOptions. Callers open it
+once, extract many pages, and close it, so models, clients and prompts
+stay warm between pages instead of being set up per image.
+
+Backends are looked up by name in a registry. Besides the built-in
+local, claude and ollama extractors, other packages can add backends
+through the "notebook_parser.extractors" entry point group:
+
+    [project.entry-points."notebook_parser.extractors"]
+    my-backend = "my_package.extractor:MyExtractor"
+
+The entry point must resolve to a callable taking ParseOptions and
+returning an Extractor.
+"""
+
+import asyncio
+import os
+import threading
+import warnings
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional, Protocol, Union, runtime_checkable
+
+from .cache import ExtractionCache
+from .llm import claude_vision, ollama_vision
+from .llm.claude_vision import (
+    extract_with_claude,
+    extract_with_claude_tags,
+    extract_with_claude_structured,
+    extract_with_claude_async,
+    extract_with_claude_tags_async,
+    extract_with_claude_structured_async,
+)
+from .llm.clients import get_anthropic_client, get_ollama_session
+from .llm.ollama_vision import extract_with_ollama, extract_with_ollama_async
+from .llm.streaming import TextStream
+from .llm.usage import TokenUsage
+from .ocr import extract_text_local, model_registry
+from .preprocess import get_profile, set_cv_threads
+from .prompt_loader import PromptLoader
+
+if TYPE_CHECKING:
+    from .pipeline import ParseOptions
+
+ENTRY_POINT_GROUP = "notebook_parser.extractors"
+
+# (extracted_text, generated_tags); tags are a list, a "#a #b" string or None
+Extraction = tuple[str, Union[str, list[str], None]]
+
+
+@runtime_checkable
+class Extractor(Protocol):
+    """Interface every extraction backend implements."""
+
+    # Registry name, e.g. "claude"
+    name: str
+    # (max_size, quality) the image is optimized to before upload, or None
+    # if the backend reads the original file itself
+    optimize_settings: Optional[tuple[int, int]]
+    # Most pages this backend should process at once, or None for no limit
+    max_concurrency: Optional[int]
+
+    def open(self) -> None:
+        """Prepare warm state (models, clients, prompts) before the first page."""
+
+    def close(self) -> None:
+        """Release what open() acquired."""
+
+    def describe(self) -> list[str]:
+        """Progress lines shown before extraction starts."""
+
+    def extract(
+        self,
+        image_path: Path,
+        template_content: str,
+        image_bytes: Optional[bytes] = None,
+        cache: Optional[ExtractionCache] = None,
+        usage: Optional[TokenUsage] = None,
+        stream: Optional[TextStream] = None
+    ) -> Extraction:
+        """Extract text (and optionally tags) from one page."""
+
+    async def extract_async(
+        self,
+        image_path: Path,
+        template_content: str,
+        image_bytes: Optional[bytes] = None,
+        cache: Optional[ExtractionCache] = None,
+        usage: Optional[TokenUsage] = None
+    ) -> Extraction:
+        """Async version of extract."""
+
+
+class BaseExtractor:
+    """Shared lifecycle plumbing; subclasses implement extract()."""
+
+    name = "base"
+    optimize_settings: Optional[tuple[int, int]] = None
+    max_concurrency: Optional[int] = None
+
+    def __init__(self, options: "ParseOptions"):
+        self.options = options
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def describe(self) -> list[str]:
+        return []
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        raise NotImplementedError
+
+    async def extract_async(self, image_path, template_content, image_bytes=None, cache=None, usage=None):
+        """Run the blocking extract() in a worker thread."""
+        return await asyncio.to_thread(
+            self.extract, image_path, template_content, image_bytes, cache, usage
+        )
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalExtractor(BaseExtractor):
+    """TrOCR on this machine; open() loads the model so the first page doesn't pay for it."""
+
+    name = "local"
+    # TrOCR inference is memory heavy, run pages one at a time
+    max_concurrency = 1
+
+    def __init__(self, options: "ParseOptions"):
+        super().__init__(options)
+        self._model = None
+        # Also serializes callers that share one open extractor across threads
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        # Fail on an unknown profile before loading the model
+        get_profile(self.options.preprocess_profile)
+        set_cv_threads(self.options.cv_threads)
+        self._model = model_registry.get(self.options.trocr_model, device=self.options.device)
+
+    def close(self) -> None:
+        # The model stays in the shared registry (LRU bounded) for later runs
+        self._model = None
+
+    def describe(self) -> list[str]:
+        lines = [f"Using local TrOCR model ({self.options.trocr_model})..."]
+        if self.options.preprocess:
+            lines.append(f"  Preprocessing profile: {self.options.preprocess_profile}")
+        return lines
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        with self._lock:
+            text = extract_text_local(
+                image_path,
+                preprocess=self.options.preprocess,
+                model_name=self.options.trocr_model,
+                device=self.options.device,
+                segment=self.options.segment,
+                batch_size=self.options.batch_size,
+                preprocess_profile=self.options.preprocess_profile,
+                cv_threads=self.options.cv_threads
+            )
+            return text, None
+
+
+class ClaudeExtractor(BaseExtractor):
+    """Claude vision API; open() loads the prompts and the pooled client."""
+
+    name = "claude"
+    optimize_settings = (claude_vision.IMAGE_MAX_SIZE, claude_vision.IMAGE_QUALITY)
+
+    def open(self) -> None:
+        # Fail on a missing or broken prompt before the first page, not halfway through
+        PromptLoader.load_all()
+        if self.options.tags and self.options.tags_mode == "single":
+            PromptLoader.load_prompt("tags-and-bullet-points")
+        elif self.options.tags:
+            PromptLoader.load_prompt("generate-tags")
+            PromptLoader.load_prompt("bullet-points-with-tags")
+        elif self.options.prompt:
+            PromptLoader.load_prompt(self.options.prompt)
+
+        # Cached results don't need a key, so a missing one only fails on the first request
+        api_key = self.options.api_key or os.getenv("ANTHROPIC_API_KEY")
+        if api_key:
+            get_anthropic_client(api_key)
+
+    def describe(self) -> list[str]:
+        lines = ["Using Claude Sonnet 4.5 vision API..."]
+        if self.options.optimize:
+            lines.append(f"  Optimizing image (grayscale: {self.options.grayscale})...")
+
+        # Tags and content in one structured request, or two steps
+        if self.options.tags and self.options.tags_mode == "single":
+            lines.append("  Generating tags and extracting content in one request...")
+        elif self.options.tags:
+            lines.append("  Step 1: Generating tags...")
+            lines.append("  Step 2: Extracting content with tags context...")
+        return lines
+
+    def _kwargs(self, image_path, template_content, image_bytes, cache, usage) -> dict:
+        return dict(
+            image_path=image_path,
+            template_content=template_content,
+            api_key=self.options.api_key,
+            optimize=self.options.optimize,
+            grayscale=self.options.grayscale,
+            image_bytes=image_bytes,
+            cache=cache,
+            usage=usage,
+            budget=self.options.image_budget
+        )
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        kwargs = self._kwargs(image_path, template_content, image_bytes, cache, usage)
+        if self.options.tags and self.options.tags_mode == "single":
+            return extract_with_claude_structured(stream=stream, **kwargs)
+        if self.options.tags:
+            return extract_with_claude_tags(stream=stream, **kwargs)
+        return extract_with_claude(prompt_name=self.options.prompt, stream=stream, **kwargs), None
+
+    async def extract_async(self, image_path, template_content, image_bytes=None, cache=None, usage=None):
+        kwargs = self._kwargs(image_path, template_content, image_bytes, cache, usage)
+        if self.options.tags and self.options.tags_mode == "single":
+            return await extract_with_claude_structured_async(**kwargs)
+        if self.options.tags:
+            return await extract_with_claude_tags_async(**kwargs)
+        return await extract_with_claude_async(prompt_name=self.options.prompt, **kwargs), None
+
+
+class OllamaExtractor(BaseExtractor):
+    """Local Ollama server; open() sets up the pooled session."""
+
+    name = "ollama"
+    optimize_settings = (ollama_vision.IMAGE_MAX_SIZE, ollama_vision.IMAGE_QUALITY)
+
+    def open(self) -> None:
+        PromptLoader.load_all()
+        if self.options.prompt:
+            PromptLoader.load_prompt(self.options.prompt)
+        get_ollama_session(self.options.ollama_url)
+
+    def describe(self) -> list[str]:
+        lines = [f"Using Ollama vision model ({self.options.ollama_model})..."]
+        if self.options.optimize:
+            lines.append(f"  Optimizing image (grayscale: {self.options.grayscale})...")
+        return lines
+
+    def _kwargs(self, image_path, template_content, image_bytes, cache) -> dict:
+        return dict(
+            image_path=image_path,
+            template_content=template_content,
+            model=self.options.ollama_model,
+            ollama_url=self.options.ollama_url,
+            optimize=self.options.optimize,
+            grayscale=self.options.grayscale,
+            prompt_name=self.options.prompt,
+            image_bytes=image_bytes,
+            cache=cache,
+            keep_alive=self.options.ollama_keep_alive,
+            budget=self.options.image_budget
+        )
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        kwargs = self._kwargs(image_path, template_content, image_bytes, cache)
+        return extract_with_ollama(stream=stream, **kwargs), None
+
+    async def extract_async(self, image_path, template_content, image_bytes=None, cache=None, usage=None):
+        kwargs = self._kwargs(image_path, template_content, image_bytes, cache)
+        return await extract_with_ollama_async(**kwargs), None
+
+
+ExtractorFactory = Callable[["ParseOptions"], Extractor]
+
+_registry: dict[str, ExtractorFactory] = {
+    LocalExtractor.name: LocalExtractor,
+    ClaudeExtractor.name: ClaudeExtractor,
+    OllamaExtractor.name: OllamaExtractor,
+}
+_entry_points_loaded = False
+_registry_lock = threading.Lock()
+
+
+def register_extractor(name: str, factory: ExtractorFactory) -> None:
+    """
+    Register an extraction backend under a model name.
+
+    Args:
+        name: Name used with --model
+        factory: Callable taking ParseOptions and returning an Extractor
+    """
+    with _registry_lock:
+        _registry[name] = factory
+
+
+def _load_entry_points() -> None:
+    """Register backends advertised by installed packages (once)."""
+    global _entry_points_loaded
+    with _registry_lock:
+        if _entry_points_loaded:
+            return
+        _entry_points_loaded = True
+
+    discovered = entry_points()
+    if hasattr(discovered, "select"):
+        discovered = discovered.select(group=ENTRY_POINT_GROUP)
+    else:  # Python 3.9 returns a dict of groups
+        discovered = discovered.get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in discovered:
+        # Built-in names can't be replaced by accident
+        if entry_point.name in _registry:
+            continue
+        try:
+            factory = entry_point.load()
+        except Exception as e:
+            # A broken plugin shouldn't take the built-in backends down with it
+            warnings.warn(
+                f"Skipping extractor plugin '{entry_point.name}' ({entry_point.value}): {e}",
+                RuntimeWarning,
+                stacklevel=3,
+            )
+            continue
+        register_extractor(entry_point.name, factory)
+
+
+def available_extractors() -> list[str]:
+    """Names of all registered backends, including entry point plugins."""
+    _load_entry_points()
+    with _registry_lock:
+        return list(_registry)
+
+
+def create_extractor(options: "ParseOptions") -> Extractor:
+    """
+    Build the extractor for options.model (not yet opened).
+
+    Raises:
+        ValueError: If no backend is registered under that name
+    """
+    _load_entry_points()
+    with _registry_lock:
+        factory = _registry.get(options.model)
+    if factory is None:
+        raise ValueError(
+            f"Unknown model '{options.model}'. "
+            f"Valid options: {', '.join(repr(name) for name in available_extractors())}"
+        )
+    return factory(options)
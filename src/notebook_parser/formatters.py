@@ -4,17 +4,50 @@ Formatters for converting OCR text to structured markdown.
 
 from datetime import datetime
 from pathlib import Path
+from typing import Union
 
+# Variables format_for_template provides to note templates
+TEMPLATE_VARIABLES = ("title", "source", "date", "tags", "key_idea", "key_points")
 
-def format_for_template(extracted_text: str, source_image: Path, generated_tags: str = None, custom_source: str = None) -> dict:
+
+def format_tags(tags: Union[str, list[str]]) -> str:
+    """
+    Normalize tags into a space-separated Obsidian tag string.
+
+    Args:
+        tags: Tag string (returned as-is) or list of tags from structured output
+
+    Returns:
+        Tags like "#machine-learning #python"
+    """
+    if isinstance(tags, str):
+        return tags.strip()
+
+    normalized = []
+    for tag in tags:
+        tag = "-".join(tag.strip().lstrip("#").split())
+        if tag and f"#{tag}" not in normalized:
+            normalized.append(f"#{tag}")
+    return " ".join(normalized)
+
+
+def format_for_template(
+    extracted_text: str,
+    source_image: Path,
+    generated_tags: Union[str, list[str]] = None,
+    custom_source: str = None,
+    date: str = None
+) -> dict:
     """
     Format extracted OCR text into template variables.
 
     Args:
         extracted_text: Raw text from OCR
         source_image: Path to source image file
-        generated_tags: Optional AI-generated tags (with # prefix)
+        generated_tags: Optional AI-generated tags, as a "#a #b" string or
+            a list of tags from structured output
         custom_source: Optional custom source description
+        date: Date of the note as YYYY-MM-DD (default: today)
 
     Returns:
         Dictionary of template variables
@@ -22,13 +55,14 @@ def format_for_template(extracted_text: str, source_image: Path, generated_tags:
     # Use image filename (without extension) as title
     title = source_image.stem
 
-    # Use current date
-    date = datetime.now().strftime("%Y-%m-%d")
+    # Use current date unless the note is being re-rendered
+    date = date if date else datetime.now().strftime("%Y-%m-%d")
 
     # Use custom source if provided, otherwise image filename
     source = custom_source if custom_source else source_image.name
 
     # Combine generated tags with default tags
+    generated_tags = format_tags(generated_tags) if generated_tags else ""
     if generated_tags:
         tags = f"{generated_tags} #notes #handwritten"
     else:
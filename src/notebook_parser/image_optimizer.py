@@ -1,13 +1,94 @@
 """
 Image optimization for LLM vision models.
 Resize, compress, and optimize images to reduce tokens while maintaining quality.
+
+optimize_for_llm applies fixed settings. optimize_for_budget searches
+for the smallest resize scale and JPEG quality that keep the handwriting
+legible and fit a token or byte budget, so a sparse sticky note is sent
+smaller than a dense full page.
+
+Both decode through load_for_llm, which uses JPEG draft mode so large
+phone photos are decoded near the target size instead of in full.
 """
 
 import base64
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
-from PIL import Image
+from typing import Optional
+from PIL import ExifTags, Image, ImageChops, ImageFilter, ImageOps, ImageStat
 import io
 
+from .cache import get_cache_dir, file_digest
+from .telemetry import span
+
+
+# Resize in two steps (integer box reduce, then LANCZOS) once the scale
+# factor is at least this; from 3 on the result matches a single LANCZOS pass
+RESIZE_REDUCING_GAP = 3.0
+
+# Bump when decoding or resizing changes, so cached payloads are rebuilt
+PAYLOAD_VERSION = 2
+
+# Pruning to stay within the disk budget spares files used this recently:
+# cropped pages and page pieces are handed out as paths that a backend reads later
+IN_USE_SECONDS = 60 * 60
+
+# EXIF orientations that turn the stored image by 90 degrees
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def _fit(size: tuple[int, int], max_size: int) -> tuple[int, int]:
+    """Size with the longest side clamped to max_size, keeping the aspect ratio."""
+    width, height = size
+    if width <= max_size and height <= max_size:
+        return size
+    if width > height:
+        return max_size, int(height * (max_size / width))
+    return int(width * (max_size / height)), max_size
+
+
+def load_for_llm(image_path: Path, max_size: int = 1568, grayscale: bool = False) -> Image.Image:
+    """
+    Decode an image upright and no larger than max_size.
+
+    JPEG files are decoded in draft mode: libjpeg scales the DCT blocks
+    by 1/2, 1/4 or 1/8, picking the smallest scale still at least the
+    target size, so a 12-48 MP phone photo is never fully decoded.
+    LANCZOS then resizes to the exact target. EXIF orientation is
+    applied to the small image.
+
+    Args:
+        image_path: Path to image file
+        max_size: Maximum dimension (width or height) in pixels
+        grayscale: Decode to grayscale instead of RGB
+
+    Returns:
+        Image in 'L' or 'RGB' mode
+    """
+    mode = 'L' if grayscale else 'RGB'
+    with span("decode"):
+        img = Image.open(image_path)
+
+        rotated = img.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS
+        stored_size = img.size[::-1] if rotated else img.size
+        target = _fit(stored_size, max_size)
+
+        # draft() works in stored orientation and is a no-op for non-JPEG files
+        img.draft(mode, target[::-1] if rotated else target)
+        img = ImageOps.exif_transpose(img).convert(mode)
+
+        if img.size != target:
+            img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+    return img
+
 
 def optimize_for_llm(
     image_path: Path,
@@ -27,37 +108,494 @@ def optimize_for_llm(
     Returns:
         Optimized image as bytes
     """
-    img = Image.open(image_path)
+    # Grayscale reduces tokens by ~3x
+    img = load_for_llm(image_path, max_size=max_size, grayscale=grayscale)
+
+    # Save to bytes with compression
+    with span("encode"):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+# Claude bills roughly width * height / 750 tokens per image and
+# downscales anything above about 1600 tokens before reading it
+CLAUDE_PIXELS_PER_TOKEN = 750
+CLAUDE_MAX_IMAGE_TOKENS = 1600
+
+# Budget search bounds
+MIN_SHARPNESS = 0.6
+MIN_SCALE = 0.25
+MIN_QUALITY = 30
+SCALE_TOLERANCE = 0.02
+# Bytes kept free under max_bytes for the parameters stored in the JPEG comment
+COMMENT_RESERVE = 256
+
+
+def estimate_claude_tokens(width: int, height: int) -> int:
+    """Estimate the input tokens Claude charges for an image of this size."""
+    return min(math.ceil(width * height / CLAUDE_PIXELS_PER_TOKEN), CLAUDE_MAX_IMAGE_TOKENS)
+
+
+@dataclass(frozen=True)
+class ImageBudget:
+    """Limits for adaptive optimization; unset limits are not enforced."""
 
-    # Convert to grayscale if requested (reduces tokens by ~3x)
-    if grayscale:
-        img = img.convert('L')
+    max_tokens: Optional[int] = None
+    max_bytes: Optional[int] = None
+    min_sharpness: float = MIN_SHARPNESS
+
+    def key(self) -> str:
+        """Stable string identifying these limits in cache keys."""
+        return f"{self.max_tokens}:{self.max_bytes}:{self.min_sharpness}"
+
+
+@dataclass(frozen=True)
+class ImageChoice:
+    """Parameters optimize_for_budget picked for one image."""
+
+    width: int
+    height: int
+    scale: float
+    quality: int
+    sharpness: float  # Share of the reference image's fine detail preserved
+    size_bytes: int
+    legible: bool  # False if the budget forced sharpness below the threshold
+
+    @property
+    def tokens(self) -> int:
+        return estimate_claude_tokens(self.width, self.height)
+
+    def summary(self) -> str:
+        """One-line description for progress output."""
+        note = "" if self.legible else ", below sharpness threshold"
+        return (
+            f"{self.width}x{self.height} at quality {self.quality}, ~{self.tokens} tokens, "
+            f"{self.size_bytes // 1024} KB (scale {self.scale:.2f}, sharpness {self.sharpness:.2f}{note})"
+        )
+
+
+def _detail(gray: Image.Image) -> float:
+    # What a heavy blur removes: strokes and texture, without lighting gradients
+    return ImageStat.Stat(ImageChops.difference(gray, gray.filter(ImageFilter.BoxBlur(8)))).rms[0]
+
+
+def _encode(img: Image.Image, quality: int, optimize: bool = False, comment: str = "") -> bytes:
+    with span("encode"):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=optimize, comment=comment)
+    return buffer.getvalue()
+
+
+def optimize_for_budget(
+    image_path: Path,
+    budget: ImageBudget,
+    max_size: int = 1568,
+    quality: int = 85,
+    grayscale: bool = False
+) -> tuple[bytes, ImageChoice]:
+    """
+    Find the smallest JPEG that stays legible and fits the budget.
+
+    The reference is the image resized to max_size. A candidate's
+    sharpness is one minus its RMS error against the reference (after
+    scaling back up), relative to the reference's fine detail. Thin,
+    dense writing loses detail quickly when downscaled, large writing
+    does not, so sparse pages end up smaller. A binary search first
+    picks the smallest resize scale that keeps sharpness above
+    budget.min_sharpness (within the token budget), then the lowest JPEG
+    quality that does. If the result exceeds the byte budget, quality
+    and then scale are lowered until it fits, even below the threshold.
+
+    Args:
+        image_path: Path to image file
+        budget: Token, byte and sharpness limits
+        max_size: Largest dimension considered (the reference size)
+        quality: Highest JPEG quality considered
+        grayscale: Convert to grayscale to reduce tokens
+
+    Returns:
+        Tuple of (JPEG bytes, chosen parameters). The parameters are also
+        stored in the JPEG comment, see read_image_choice.
+    """
+    reference = load_for_llm(image_path, max_size=max_size, grayscale=grayscale)
+    reference_gray = reference.convert('L')
+    reference_detail = _detail(reference_gray) or 1.0
+    width, height = reference.size
+
+    def resized(scale: float) -> Image.Image:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return reference if size == reference.size else reference.resize(size, Image.Resampling.LANCZOS)
+
+    def sharpness(candidate: Image.Image) -> float:
+        restored = candidate.convert('L').resize(reference.size, Image.Resampling.BICUBIC)
+        error = ImageStat.Stat(ImageChops.difference(reference_gray, restored)).rms[0]
+        return 1 - error / reference_detail
+
+    def decoded(candidate: Image.Image, q: int) -> Image.Image:
+        return Image.open(io.BytesIO(_encode(candidate, q)))
+
+    def fits(candidate: Image.Image, q: int) -> bool:
+        return len(_encode(candidate, q, optimize=True)) + COMMENT_RESERVE <= budget.max_bytes
+
+    # Largest scale the token budget allows
+    max_scale = 1.0
+    if budget.max_tokens is not None:
+        max_pixels = budget.max_tokens * CLAUDE_PIXELS_PER_TOKEN
+        max_scale = min(1.0, math.sqrt(max_pixels / (width * height)))
+    min_scale = min(MIN_SCALE, max_scale)
+
+    def legible_at(scale: float) -> bool:
+        return sharpness(decoded(resized(scale), quality)) >= budget.min_sharpness
+
+    # Smallest legible scale at full quality; resizing saves the most
+    low, high = min_scale, max_scale
+    if not legible_at(low):
+        while high - low > SCALE_TOLERANCE:
+            middle = (low + high) / 2
+            if legible_at(middle):
+                high = middle
+            else:
+                low = middle
     else:
-        img = img.convert('RGB')
-
-    # Resize if image is too large
-    width, height = img.size
-    if width > max_size or height > max_size:
-        # Calculate new size maintaining aspect ratio
-        if width > height:
-            new_width = max_size
-            new_height = int(height * (max_size / width))
+        high = low
+    scale = high
+    candidate = resized(scale)
+
+    # Lowest legible quality at that scale
+    low, high = MIN_QUALITY, quality
+    while low < high:
+        middle = (low + high) // 2
+        if sharpness(decoded(candidate, middle)) >= budget.min_sharpness:
+            high = middle
         else:
-            new_height = max_size
-            new_width = int(width * (max_size / height))
+            low = middle + 1
+    chosen_quality = high
 
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    if budget.max_bytes is not None and not fits(candidate, chosen_quality):
+        # Over the byte budget: give up sharpness, quality first
+        low, high = MIN_QUALITY, chosen_quality
+        while low < high:
+            middle = (low + high + 1) // 2
+            if fits(candidate, middle):
+                low = middle
+            else:
+                high = middle - 1
+        chosen_quality = low
 
-    # Save to bytes with compression
-    buffer = io.BytesIO()
-    if grayscale:
-        img.save(buffer, format='JPEG', quality=quality, optimize=True)
-    else:
-        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        if not fits(candidate, chosen_quality):
+            low, high = 0.0, scale
+            while high - low > SCALE_TOLERANCE:
+                middle = (low + high) / 2
+                if fits(resized(middle), chosen_quality):
+                    low = middle
+                else:
+                    high = middle
+            scale = max(low, SCALE_TOLERANCE)
+            candidate = resized(scale)
 
-    return buffer.getvalue()
+    final_sharpness = sharpness(decoded(candidate, chosen_quality))
+    choice = ImageChoice(
+        width=candidate.width,
+        height=candidate.height,
+        scale=round(scale, 3),
+        quality=chosen_quality,
+        sharpness=round(final_sharpness, 3),
+        size_bytes=0,
+        legible=final_sharpness >= budget.min_sharpness,
+    )
+    # Record the choice in the file so cached payloads can still report it
+    data = _encode(candidate, chosen_quality, optimize=True, comment=json.dumps(asdict(choice)))
+    return data, replace(choice, size_bytes=len(data))
+
+
+def read_image_choice(image_bytes: bytes) -> Optional[ImageChoice]:
+    """
+    Parameters optimize_for_budget stored in a JPEG, if any.
+
+    Args:
+        image_bytes: JPEG produced by optimize_for_budget
+
+    Returns:
+        The chosen parameters, or None for other images
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        comment = img.info.get("comment")
+    if not comment:
+        return None
+    try:
+        fields = json.loads(comment)
+        fields["size_bytes"] = len(image_bytes)
+        return ImageChoice(**fields)
+    except (ValueError, TypeError):
+        return None
 
 
 def image_to_base64(image_bytes: bytes) -> str:
     """Convert image bytes to base64 string."""
-    return base64.b64encode(image_bytes).decode('utf-8')
+    with span("base64"):
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+class PayloadCache:
+    """
+    Cache of optimized image payloads.
+
+    Keeps recently used payloads (bytes and base64) in memory and every
+    payload on disk, sharded by key prefix, so re-runs and other backends
+    skip decoding, resizing and re-encoding the same image.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024
+    ):
+        """
+        Initialize the payload cache.
+
+        Args:
+            directory: Directory for on-disk payloads
+            max_memory_bytes: Budget for payloads held in memory
+            max_disk_bytes: Budget for payloads stored on disk
+        """
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None  # Computed on first write
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        image_path: Path,
+        max_size: int,
+        quality: int,
+        grayscale: bool,
+        budget: Optional[ImageBudget] = None
+    ) -> str:
+        """Key payloads by image content and optimization settings."""
+        raw = f"{PAYLOAD_VERSION}:{file_digest(image_path)}:{max_size}:{quality}:{int(grayscale)}"
+        if budget is not None:
+            raw += f":{budget.key()}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.jpg"
+
+    def get(
+        self,
+        image_path: Path,
+        max_size: int = 1568,
+        quality: int = 85,
+        grayscale: bool = False,
+        budget: Optional[ImageBudget] = None
+    ) -> tuple[bytes, str]:
+        """
+        Get the optimized payload for an image, creating it on a miss.
+
+        With a budget, max_size and quality are upper bounds for
+        optimize_for_budget.
+
+        Returns:
+            Tuple of (JPEG bytes, base64 string)
+        """
+        key = self.make_key(image_path, max_size, quality, grayscale, budget)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        disk_path = self._disk_path(key)
+        if disk_path.exists():
+            image_bytes = disk_path.read_bytes()
+            os.utime(disk_path)  # Mark as recently used
+        elif budget is not None:
+            image_bytes, _ = optimize_for_budget(
+                image_path, budget, max_size=max_size, quality=quality, grayscale=grayscale
+            )
+            self._write_disk(disk_path, image_bytes)
+        else:
+            image_bytes = optimize_for_llm(image_path, max_size=max_size, quality=quality, grayscale=grayscale)
+            self._write_disk(disk_path, image_bytes)
+
+        payload = (image_bytes, image_to_base64(image_bytes))
+        self._remember(key, payload)
+        return payload
+
+    def cropped_page(self, image_path: Path) -> Path:
+        """
+        Get the page cropped out of a photo (see page_crop), creating it on a miss.
+
+        Cropped pages are stored next to the payloads and pruned with
+        them, but not while in use (see IN_USE_SECONDS).
+
+        Returns:
+            Path to the cropped JPEG
+        """
+        from .page_crop import CROP_VERSION, crop_page, encode_crop
+
+        key = hashlib.sha256(f"crop:{CROP_VERSION}:{file_digest(image_path)}".encode("utf-8")).hexdigest()
+        disk_path = self._disk_path(key)
+        if disk_path.exists():
+            os.utime(disk_path)  # Mark as recently used
+        else:
+            self._write_disk(disk_path, encode_crop(*crop_page(image_path)))
+        return disk_path
+
+    def split_page(self, image_path: Path, spread: bool = False, tiles: int = 1) -> list[list[Path]]:
+        """
+        Cut a page into pieces (see tiling.split_page) stored next to the payloads.
+
+        Pieces are keyed by their content, so re-splitting an unchanged
+        image yields the same files and their extractions stay cached.
+        Like cropped pages, pieces aren't pruned while in use.
+
+        Returns:
+            For each page, the paths of its bands in reading order
+        """
+        from .tiling import PIECE_QUALITY, split_page
+
+        pages = []
+        for bands in split_page(image_path, spread=spread, tiles=tiles):
+            paths = []
+            for band in bands:
+                data = _encode(band, PIECE_QUALITY)
+                disk_path = self._disk_path(hashlib.sha256(data).hexdigest())
+                if disk_path.exists():
+                    os.utime(disk_path)  # Mark as recently used
+                else:
+                    self._write_disk(disk_path, data)
+                paths.append(disk_path)
+            pages.append(paths)
+        return pages
+
+    def _remember(self, key: str, payload: tuple[bytes, str]) -> None:
+        size = len(payload[0]) + len(payload[1])
+        if size > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = payload
+                self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (old_bytes, old_b64) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old_bytes) + len(old_b64)
+
+    def _write_disk(self, disk_path: Path, image_bytes: bytes) -> None:
+        disk_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically so concurrent processes never read partial files
+        fd, tmp_name = tempfile.mkstemp(dir=disk_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_name, disk_path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(image_bytes)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+
+        if over_budget:
+            self.prune(keep_recent=IN_USE_SECONDS)
+
+    def _disk_entries(self) -> list[tuple[Path, int, float]]:
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob("*/*.jpg"):
+            stat = path.stat()
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def prune(self, max_bytes: Optional[int] = None, keep_recent: float = 0) -> int:
+        """
+        Delete least recently used payloads from disk until under budget.
+
+        Args:
+            max_bytes: Target size (default: max_disk_bytes). 0 clears everything.
+            keep_recent: Keep files used within this many seconds, even if
+                that leaves the cache over budget
+
+        Returns:
+            Number of payloads removed
+        """
+        target = self.max_disk_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - keep_recent
+
+        removed = 0
+        for path, size, used in entries:
+            if total <= target or (keep_recent and used > cutoff):
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            if target == 0:
+                self._memory.clear()
+                self._memory_bytes = 0
+        return removed
+
+    def stats(self) -> dict:
+        """Summarize memory and disk usage."""
+        entries = self._disk_entries()
+        with self._lock:
+            return {
+                "path": str(self.directory),
+                "entries": len(entries),
+                "size_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_disk_bytes,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+_payload_cache = None
+_payload_cache_lock = threading.Lock()
+
+
+def get_payload_cache() -> PayloadCache:
+    """Get the shared payload cache for the current cache directory."""
+    global _payload_cache
+    directory = get_cache_dir() / "payloads"
+
+    with _payload_cache_lock:
+        if _payload_cache is None or _payload_cache.directory != directory:
+            _payload_cache = PayloadCache(directory)
+        return _payload_cache
+
+
+def optimized_payload(
+    image_path: Path,
+    max_size: int = 1568,
+    quality: int = 85,
+    grayscale: bool = False,
+    budget: Optional[ImageBudget] = None
+) -> tuple[bytes, str]:
+    """
+    Optimize an image for LLM vision, reusing earlier results.
+
+    Args:
+        image_path: Path to image file
+        max_size: Maximum dimension (width or height) in pixels
+        quality: JPEG quality (1-100, lower = smaller file)
+        grayscale: Convert to grayscale to reduce tokens
+        budget: Search for the smallest legible payload within these limits
+            instead of using max_size and quality as-is
+
+    Returns:
+        Tuple of (optimized JPEG bytes, base64 string)
+    """
+    return get_payload_cache().get(
+        image_path, max_size=max_size, quality=quality, grayscale=grayscale, budget=budget
+    )
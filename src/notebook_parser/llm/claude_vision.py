@@ -1,12 +1,294 @@
 """
 Claude vision integration for high-quality handwriting recognition.
+
+Requests put the static instructions and template in the system prompt,
+marked with cache_control, so runs over many pages reuse the cached
+prefix. Only the image and a short per-page instruction change.
 """
 
+import asyncio
 import os
 from pathlib import Path
-from anthropic import Anthropic
-from ..image_optimizer import optimize_for_llm, image_to_base64
-from ..prompt_loader import PromptLoader
+from typing import Optional
+from ..cache import ExtractionCache, cache_key
+from ..image_optimizer import ImageBudget, optimized_payload, image_to_base64
+from ..prompt_loader import PromptLoader, compose_prompt, split_tags_prompt
+from ..telemetry import span
+from .clients import get_anthropic_client, get_async_anthropic_client
+from .streaming import StreamInterrupted, TextStream
+from .usage import TokenUsage
+
+CLAUDE_MODEL = "claude-sonnet-4-5-20250929"  # Claude Sonnet 4.5 vision model
+
+# Image optimization settings
+IMAGE_MAX_SIZE = 1568  # Claude's recommended size
+IMAGE_QUALITY = 85
+
+# Per-page instruction sent next to the image
+PAGE_INSTRUCTION = "Extract the notes from this notebook page."
+
+# Tool used to get tags and content back as structured output in one call
+NOTE_TOOL = {
+    "name": "record_note",
+    "description": "Record the topic tags and bullet point content extracted from a notebook page.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "tags": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "3-7 topic tags, lowercase with hyphens, each starting with #",
+            },
+            "content": {
+                "type": "string",
+                "description": "The note content as markdown bullet points",
+            },
+        },
+        "required": ["tags", "content"],
+    },
+}
+
+
+def resolve_api_key(api_key: Optional[str]) -> str:
+    """Get API key from argument or ANTHROPIC_API_KEY env var."""
+    if api_key is None:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+
+    if not api_key:
+        raise ValueError(
+            "ANTHROPIC_API_KEY not found. Set it via:\n"
+            "  export ANTHROPIC_API_KEY=sk-ant-xxx\n"
+            "Or pass it with --api-key flag"
+        )
+    return api_key
+
+
+def load_prompt(prompt_name: Optional[str]) -> str:
+    """Load the named prompt, or the default one."""
+    if prompt_name:
+        return PromptLoader.load_prompt(prompt_name)
+    return PromptLoader.get_default_prompt()
+
+
+def _extraction_key(
+    image_path: Path,
+    backend: str,
+    prompt,
+    template_content: str,
+    optimize: bool,
+    grayscale: bool,
+    budget: Optional[ImageBudget] = None,
+    **extra
+) -> str:
+    """Cache key for a Claude extraction."""
+    # Only budgeted runs carry the field, so existing keys stay valid
+    if budget is not None:
+        extra["budget"] = budget.key()
+    return cache_key(
+        image_path,
+        backend=backend,
+        model=CLAUDE_MODEL,
+        prompt=prompt,
+        **extra,
+        template=template_content,
+        optimize=optimize,
+        max_size=IMAGE_MAX_SIZE,
+        quality=IMAGE_QUALITY,
+        grayscale=grayscale,
+    )
+
+
+def encode_image(
+    image_path: Path,
+    optimize: bool,
+    grayscale: bool,
+    image_bytes: Optional[bytes],
+    budget: Optional[ImageBudget] = None
+) -> str:
+    """Base64 image payload, reusing earlier optimized payloads for this image."""
+    if image_bytes is not None:
+        return image_to_base64(image_bytes)
+    if optimize:
+        _, image_b64 = optimized_payload(
+            image_path,
+            max_size=IMAGE_MAX_SIZE,
+            quality=IMAGE_QUALITY,
+            grayscale=grayscale,
+            budget=budget
+        )
+        return image_b64
+    return image_to_base64(image_path.read_bytes())
+
+
+def build_system(prompt: str, template_content: str) -> list[dict]:
+    """
+    System prompt with template context, marked for prompt caching.
+
+    Claude only caches the prefix (tools and system prompt) once it
+    reaches MIN_CACHEABLE_TOKENS; shorter prompts and templates are sent
+    uncached. TokenUsage.cache_unused reports that after a run.
+
+    Args:
+        prompt: Extraction instructions
+        template_content: Template the output will be inserted into
+
+    Returns:
+        System content blocks
+    """
+    text = compose_prompt(prompt, template_content)
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def build_user_message(image_b64: str, text: str = PAGE_INSTRUCTION) -> list[dict]:
+    """
+    User turn with the page image followed by a short instruction.
+
+    Args:
+        image_b64: Base64 JPEG payload
+        text: Per-page instruction
+
+    Returns:
+        Messages list with a single user message
+    """
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/jpeg",
+                        "data": image_b64,
+                    },
+                },
+                {
+                    "type": "text",
+                    "text": text
+                }
+            ],
+        }
+    ]
+
+
+def request_params(
+    prompt: str,
+    template_content: str,
+    image_b64: str,
+    structured: bool = False
+) -> dict:
+    """
+    Messages API parameters for one page.
+
+    Shared by direct requests and Message Batches so both send the same
+    cacheable prefix.
+
+    Args:
+        prompt: Extraction instructions
+        template_content: Template the output will be inserted into
+        image_b64: Base64 JPEG payload
+        structured: Force the record_note tool for tags and content
+
+    Returns:
+        Keyword arguments for `messages.create`
+    """
+    params = {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 4096,
+        "system": build_system(prompt, template_content),
+        "messages": build_user_message(image_b64),
+    }
+    if structured:
+        # The cache breakpoint on the system prompt also covers the tool definition
+        params["tools"] = [NOTE_TOOL]
+        params["tool_choice"] = {"type": "tool", "name": NOTE_TOOL["name"]}
+    return params
+
+
+def _tags_params(tags_prompt: str, image_b64: str) -> dict:
+    """Parameters for the tags step of the two-step flow."""
+    return {
+        "model": CLAUDE_MODEL,
+        "max_tokens": 256,
+        "system": [{"type": "text", "text": tags_prompt, "cache_control": {"type": "ephemeral"}}],
+        "messages": build_user_message(image_b64, "Generate the tags for this notebook page."),
+    }
+
+
+def _content_with_tags_params(
+    bullet_points_template: str,
+    generated_tags: str,
+    template_content: str,
+    image_b64: str
+) -> dict:
+    """Parameters for the content step of the two-step flow."""
+    # The prompt and template stay a cached prefix; only the block after it carries this page's tags
+    shared_prompt, tags_lines = split_tags_prompt(bullet_points_template)
+    params = request_params(shared_prompt, template_content, image_b64)
+    if tags_lines:
+        params["system"].append({"type": "text", "text": tags_lines.replace("{tags}", generated_tags)})
+    return params
+
+
+def _send(client, params: dict, stream: Optional[TextStream] = None):
+    """
+    Send one request, streaming text into `stream` when given.
+
+    Structured requests stream the partial `content` field of the tool
+    input; unfinished strings are parsed too, so content grows with every
+    delta instead of appearing only once complete.
+
+    Raises:
+        StreamInterrupted: If the stream fails after some text arrived
+    """
+    if stream is None:
+        with span("request"):
+            return client.messages.create(**params)
+
+    import jiter  # Partial JSON parser shipped with the anthropic SDK
+
+    tool_json = ""
+    stream.start()
+    try:
+        with span("request"), client.messages.stream(**params) as response:
+            for event in response:
+                if event.type == "text":
+                    stream.update(event.snapshot)
+                elif event.type == "input_json":
+                    tool_json += event.partial_json
+                    note = jiter.from_json(tool_json.encode(), partial_mode="trailing-strings")
+                    if isinstance(note, dict):
+                        stream.update(str(note.get("content") or ""))
+            return response.get_final_message()
+    except Exception as e:
+        if stream.text:
+            raise StreamInterrupted(stream.text, str(e)) from e
+        raise
+
+
+async def _send_async(client, params: dict):
+    """Async counterpart of _send, without streaming."""
+    with span("request"):
+        return await client.messages.create(**params)
+
+
+def parse_note_tool(message) -> tuple[str, list[str]]:
+    """
+    Read tags and content from a record_note tool call.
+
+    Raises:
+        ValueError: If the response contains no tool call
+    """
+    note = next(
+        (block.input for block in message.content if block.type == "tool_use"),
+        None
+    )
+    if note is None:
+        raise ValueError("Claude did not return structured note content")
+
+    extracted_text = str(note.get("content", "")).strip()
+    tags = [str(tag).strip() for tag in note.get("tags", []) if str(tag).strip()]
+    return extracted_text, tags
 
 
 def extract_with_claude(
@@ -15,7 +297,12 @@ def extract_with_claude(
     api_key: str = None,
     optimize: bool = True,
     grayscale: bool = False,
-    prompt_name: str = None
+    prompt_name: str = None,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: Optional[TextStream] = None,
+    budget: Optional[ImageBudget] = None
 ) -> str:
     """
     Extract text from image using Claude vision API.
@@ -27,79 +314,41 @@ def extract_with_claude(
         optimize: Whether to optimize image (resize, compress)
         grayscale: Convert to grayscale to save tokens
         prompt_name: Name of prompt to use (without .txt). If None, uses default
+        image_bytes: Pre-optimized image bytes (skips optimization)
+        cache: Optional extraction cache checked before calling the API
+        usage: Optional accumulator for token counts (including cache reads/writes)
+        stream: Stream the response into this TextStream as it arrives
+        budget: Optimize adaptively within these limits instead of fixed settings
 
     Returns:
         Extracted and structured text matching template
     """
-    # Get API key
-    if api_key is None:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-
-    if not api_key:
-        raise ValueError(
-            "ANTHROPIC_API_KEY not found. Set it via:\n"
-            "  export ANTHROPIC_API_KEY=sk-ant-xxx\n"
-            "Or pass it with --api-key flag"
-        )
-
-    # Optimize image if requested
-    if optimize:
-        image_bytes = optimize_for_llm(
-            image_path,
-            max_size=1568,  # Claude's recommended size
-            quality=85,
-            grayscale=grayscale
-        )
-    else:
-        image_bytes = image_path.read_bytes()
+    base_prompt = load_prompt(prompt_name)
 
-    # Convert to base64
-    image_b64 = image_to_base64(image_bytes)
+    # Return cached result if this exact extraction ran before
+    if cache is not None:
+        key = _extraction_key(image_path, "claude", base_prompt, template_content, optimize, grayscale, budget)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
 
-    # Create Claude client
-    client = Anthropic(api_key=api_key)
+    api_key = resolve_api_key(api_key)
+    image_b64 = encode_image(image_path, optimize, grayscale, image_bytes, budget)
 
-    # Load prompt
-    if prompt_name:
-        base_prompt = PromptLoader.load_prompt(prompt_name)
-    else:
-        base_prompt = PromptLoader.get_default_prompt()
-
-    # Craft full prompt with template context
-    prompt = f"""{base_prompt}
-
-The extracted text will be used to fill this template:
-
-{template_content}"""
+    # Shared client, reusing open connections from earlier pages
+    client = get_anthropic_client(api_key)
 
     # Call Claude vision API
-    message = client.messages.create(
-        model="claude-sonnet-4-5-20250929",  # Claude Sonnet 4.5 vision model
-        max_tokens=4096,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": image_b64,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ],
-            }
-        ],
-    )
+    message = _send(client, request_params(base_prompt, template_content, image_b64), stream)
+    if usage is not None:
+        usage.add(message.usage)
 
     # Extract text from response
     extracted_text = message.content[0].text.strip()
 
+    if cache is not None:
+        cache.put(key, extracted_text, backend="claude", model=CLAUDE_MODEL)
+
     return extracted_text
 
 
@@ -108,7 +357,12 @@ def extract_with_claude_tags(
     template_content: str,
     api_key: str = None,
     optimize: bool = True,
-    grayscale: bool = False
+    grayscale: bool = False,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: Optional[TextStream] = None,
+    budget: Optional[ImageBudget] = None
 ) -> tuple[str, str]:
     """
     Extract text from image using Claude vision API with two-step process:
@@ -121,104 +375,277 @@ def extract_with_claude_tags(
         api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
         optimize: Whether to optimize image (resize, compress)
         grayscale: Convert to grayscale to save tokens
+        image_bytes: Pre-optimized image bytes (skips optimization)
+        cache: Optional extraction cache checked before calling the API
+        usage: Optional accumulator for token counts (including cache reads/writes)
+        stream: Stream the content step into this TextStream as it arrives
+        budget: Optimize adaptively within these limits instead of fixed settings
 
     Returns:
         Tuple of (extracted_text, generated_tags)
     """
-    # Get API key
-    if api_key is None:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
+    # Load prompts
+    tags_prompt = PromptLoader.load_prompt("generate-tags")
+    bullet_points_template = PromptLoader.load_prompt("bullet-points-with-tags")
 
-    if not api_key:
-        raise ValueError(
-            "ANTHROPIC_API_KEY not found. Set it via:\n"
-            "  export ANTHROPIC_API_KEY=sk-ant-xxx\n"
-            "Or pass it with --api-key flag"
+    # Return cached result if this exact extraction ran before
+    if cache is not None:
+        key = _extraction_key(
+            image_path, "claude-tags", [tags_prompt, bullet_points_template],
+            template_content, optimize, grayscale, budget
         )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1]
 
-    # Optimize image if requested
-    if optimize:
-        image_bytes = optimize_for_llm(
-            image_path,
-            max_size=1568,  # Claude's recommended size
-            quality=85,
-            grayscale=grayscale
+    api_key = resolve_api_key(api_key)
+    image_b64 = encode_image(image_path, optimize, grayscale, image_bytes, budget)
+
+    # Shared client, reusing open connections from earlier pages
+    client = get_anthropic_client(api_key)
+
+    # Step 1: Generate tags (static prompt, cached across pages)
+    tags_message = _send(client, _tags_params(tags_prompt, image_b64))
+    if usage is not None:
+        usage.add(tags_message.usage)
+
+    generated_tags = tags_message.content[0].text.strip()
+
+    # Step 2: Extract bullet points with tags context
+    content_message = _send(
+        client,
+        _content_with_tags_params(bullet_points_template, generated_tags, template_content, image_b64),
+        stream
+    )
+    if usage is not None:
+        usage.add(content_message.usage)
+
+    extracted_text = content_message.content[0].text.strip()
+
+    if cache is not None:
+        cache.put(key, extracted_text, generated_tags, backend="claude-tags", model=CLAUDE_MODEL)
+
+    return extracted_text, generated_tags
+
+
+def extract_with_claude_structured(
+    image_path: Path,
+    template_content: str,
+    api_key: str = None,
+    optimize: bool = True,
+    grayscale: bool = False,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: Optional[TextStream] = None,
+    budget: Optional[ImageBudget] = None
+) -> tuple[str, list[str]]:
+    """
+    Extract tags and content from image in a single Claude request.
+
+    Claude is forced to answer through the record_note tool, so tags and
+    bullet points come back as structured JSON from one round trip.
+
+    Args:
+        image_path: Path to notebook image
+        template_content: Template to guide extraction
+        api_key: Anthropic API key (defaults to ANTHROPIC_API_KEY env var)
+        optimize: Whether to optimize image (resize, compress)
+        grayscale: Convert to grayscale to save tokens
+        image_bytes: Pre-optimized image bytes (skips optimization)
+        cache: Optional extraction cache checked before calling the API
+        usage: Optional accumulator for token counts (including cache reads/writes)
+        stream: Stream the response into this TextStream as it arrives
+        budget: Optimize adaptively within these limits instead of fixed settings
+
+    Returns:
+        Tuple of (extracted_text, tags)
+    """
+    # Load prompt
+    base_prompt = PromptLoader.load_prompt("tags-and-bullet-points")
+
+    # Return cached result if this exact extraction ran before
+    if cache is not None:
+        key = _extraction_key(
+            image_path, "claude-structured", base_prompt, template_content, optimize, grayscale, budget,
+            tool=NOTE_TOOL
         )
-    else:
-        image_bytes = image_path.read_bytes()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], (cached[1] or "").split()
+
+    api_key = resolve_api_key(api_key)
+    image_b64 = encode_image(image_path, optimize, grayscale, image_bytes, budget)
+
+    # Shared client, reusing open connections from earlier pages
+    client = get_anthropic_client(api_key)
+
+    # Call Claude vision API, forcing the structured tool response
+    message = _send(
+        client, request_params(base_prompt, template_content, image_b64, structured=True), stream
+    )
+    if usage is not None:
+        usage.add(message.usage)
+
+    extracted_text, tags = parse_note_tool(message)
+
+    if cache is not None:
+        cache.put(key, extracted_text, " ".join(tags), backend="claude-structured", model=CLAUDE_MODEL)
+
+    return extracted_text, tags
+
+
+async def extract_with_claude_async(
+    image_path: Path,
+    template_content: str,
+    api_key: str = None,
+    optimize: bool = True,
+    grayscale: bool = False,
+    prompt_name: str = None,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    budget: Optional[ImageBudget] = None
+) -> str:
+    """
+    Async version of extract_with_claude built on AsyncAnthropic.
+
+    Image optimization runs in a worker thread so the event loop stays
+    free for other requests.
+
+    Args:
+        Same as extract_with_claude
+
+    Returns:
+        Extracted and structured text matching template
+    """
+    base_prompt = load_prompt(prompt_name)
 
-    # Convert to base64
-    image_b64 = image_to_base64(image_bytes)
+    if cache is not None:
+        key = _extraction_key(image_path, "claude", base_prompt, template_content, optimize, grayscale, budget)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
 
-    # Create Claude client
-    client = Anthropic(api_key=api_key)
+    api_key = resolve_api_key(api_key)
+    image_b64 = await asyncio.to_thread(encode_image, image_path, optimize, grayscale, image_bytes, budget)
 
-    # Step 1: Generate tags
+    client = get_async_anthropic_client(api_key)
+    message = await _send_async(client, request_params(base_prompt, template_content, image_b64))
+    if usage is not None:
+        usage.add(message.usage)
+
+    extracted_text = message.content[0].text.strip()
+
+    if cache is not None:
+        cache.put(key, extracted_text, backend="claude", model=CLAUDE_MODEL)
+
+    return extracted_text
+
+
+async def extract_with_claude_tags_async(
+    image_path: Path,
+    template_content: str,
+    api_key: str = None,
+    optimize: bool = True,
+    grayscale: bool = False,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    budget: Optional[ImageBudget] = None
+) -> tuple[str, str]:
+    """
+    Async version of extract_with_claude_tags.
+
+    The two steps of one page run in sequence; run many pages concurrently
+    to overlap one page's tags step with another page's content step.
+
+    Args:
+        Same as extract_with_claude_tags
+
+    Returns:
+        Tuple of (extracted_text, generated_tags)
+    """
     tags_prompt = PromptLoader.load_prompt("generate-tags")
+    bullet_points_template = PromptLoader.load_prompt("bullet-points-with-tags")
 
-    tags_message = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=256,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": image_b64,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": tags_prompt
-                    }
-                ],
-            }
-        ],
-    )
+    if cache is not None:
+        key = _extraction_key(
+            image_path, "claude-tags", [tags_prompt, bullet_points_template],
+            template_content, optimize, grayscale, budget
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1]
+
+    api_key = resolve_api_key(api_key)
+    image_b64 = await asyncio.to_thread(encode_image, image_path, optimize, grayscale, image_bytes, budget)
+
+    client = get_async_anthropic_client(api_key)
+    tags_message = await _send_async(client, _tags_params(tags_prompt, image_b64))
+    if usage is not None:
+        usage.add(tags_message.usage)
 
     generated_tags = tags_message.content[0].text.strip()
 
-    # Step 2: Extract bullet points with tags context
-    bullet_points_prompt = PromptLoader.load_prompt("bullet-points-with-tags")
-    # Insert the generated tags into the prompt
-    bullet_points_prompt = bullet_points_prompt.replace("{tags}", generated_tags)
-
-    # Add template context
-    full_prompt = f"""{bullet_points_prompt}
-
-The extracted text will be used to fill this template:
-
-{template_content}"""
-
-    # Call Claude vision API for bullet points
-    content_message = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=4096,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": image_b64,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": full_prompt
-                    }
-                ],
-            }
-        ],
+    content_message = await _send_async(
+        client, _content_with_tags_params(bullet_points_template, generated_tags, template_content, image_b64)
     )
+    if usage is not None:
+        usage.add(content_message.usage)
 
     extracted_text = content_message.content[0].text.strip()
 
+    if cache is not None:
+        cache.put(key, extracted_text, generated_tags, backend="claude-tags", model=CLAUDE_MODEL)
+
     return extracted_text, generated_tags
+
+
+async def extract_with_claude_structured_async(
+    image_path: Path,
+    template_content: str,
+    api_key: str = None,
+    optimize: bool = True,
+    grayscale: bool = False,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    budget: Optional[ImageBudget] = None
+) -> tuple[str, list[str]]:
+    """
+    Async version of extract_with_claude_structured.
+
+    Args:
+        Same as extract_with_claude_structured
+
+    Returns:
+        Tuple of (extracted_text, tags)
+    """
+    base_prompt = PromptLoader.load_prompt("tags-and-bullet-points")
+
+    if cache is not None:
+        key = _extraction_key(
+            image_path, "claude-structured", base_prompt, template_content, optimize, grayscale, budget,
+            tool=NOTE_TOOL
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], (cached[1] or "").split()
+
+    api_key = resolve_api_key(api_key)
+    image_b64 = await asyncio.to_thread(encode_image, image_path, optimize, grayscale, image_bytes, budget)
+
+    client = get_async_anthropic_client(api_key)
+    message = await _send_async(
+        client, request_params(base_prompt, template_content, image_b64, structured=True)
+    )
+    if usage is not None:
+        usage.add(message.usage)
+
+    extracted_text, tags = parse_note_tool(message)
+
+    if cache is not None:
+        cache.put(key, extracted_text, " ".join(tags), backend="claude-structured", model=CLAUDE_MODEL)
+
+    return extracted_text, tags
@@ -0,0 +1,222 @@
+"""
+Shared HTTP clients for the LLM backends.
+
+Clients are created once per endpoint and reused, so consecutive pages
+share keep-alive connections instead of opening a new TCP (and TLS)
+connection each time. Async clients belong to an event loop and are
+cached per loop. The Ollama health check is cached for a short TTL, so
+a run pays for it once rather than once per page.
+
+The HTTP libraries are imported when the first client is created.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from anthropic import Anthropic, AsyncAnthropic
+
+# Connections kept open per Ollama endpoint (the Anthropic SDK pools its own)
+POOL_SIZE = 32
+
+# Seconds a successful Ollama health check is trusted
+HEALTH_CHECK_TTL = 30.0
+
+OLLAMA_UNAVAILABLE = (
+    "Cannot connect to Ollama at {url}\n"
+    "Make sure Ollama is installed and running:\n"
+    "  brew install ollama (macOS)\n"
+    "  ollama serve\n"
+    "  ollama pull llama3.2-vision"
+)
+
+_lock = threading.Lock()
+_anthropic_clients = {}
+_ollama_sessions = {}
+_healthy_until = {}
+# Event loop -> {key: client}; entries go away with their loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _anthropic_key(api_key: str) -> tuple[str, Optional[str]]:
+    # The SDK reads ANTHROPIC_BASE_URL when the client is created
+    return api_key, os.getenv("ANTHROPIC_BASE_URL")
+
+
+def get_anthropic_client(api_key: str) -> "Anthropic":
+    """
+    Shared Anthropic client for an API key and base URL.
+
+    Args:
+        api_key: Anthropic API key
+
+    Returns:
+        Client reused by every request with the same credentials
+    """
+    key = _anthropic_key(api_key)
+    with _lock:
+        client = _anthropic_clients.get(key)
+        if client is None:
+            from anthropic import Anthropic
+
+            client = Anthropic(api_key=api_key)
+            _anthropic_clients[key] = client
+    return client
+
+
+def _loop_clients() -> dict:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def get_async_anthropic_client(api_key: str) -> "AsyncAnthropic":
+    """
+    Shared AsyncAnthropic client for the running event loop.
+
+    Args:
+        api_key: Anthropic API key
+
+    Returns:
+        Client reused by every request on this loop with the same credentials
+    """
+    clients = _loop_clients()
+    key = ("anthropic",) + _anthropic_key(api_key)
+    if key not in clients:
+        from anthropic import AsyncAnthropic
+
+        clients[key] = AsyncAnthropic(api_key=api_key)
+    return clients[key]
+
+
+def get_ollama_session(ollama_url: str) -> "requests.Session":
+    """
+    Shared requests session with a keep-alive pool for an Ollama server.
+
+    Args:
+        ollama_url: Ollama API endpoint
+
+    Returns:
+        Session reused by every request to this endpoint
+    """
+    with _lock:
+        session = _ollama_sessions.get(ollama_url)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _ollama_sessions[ollama_url] = session
+    return session
+
+
+def get_async_ollama_client(ollama_url: str) -> "httpx.AsyncClient":
+    """
+    Shared httpx client for an Ollama server on the running event loop.
+
+    Args:
+        ollama_url: Ollama API endpoint
+
+    Returns:
+        Client reused by every request on this loop to this endpoint
+    """
+    clients = _loop_clients()
+    key = ("ollama", ollama_url)
+    if key not in clients:
+        import httpx
+
+        clients[key] = httpx.AsyncClient(
+            base_url=ollama_url,
+            timeout=600,  # Vision models can be slow
+            limits=httpx.Limits(max_connections=POOL_SIZE),
+        )
+    return clients[key]
+
+
+def _health_cached(ollama_url: str) -> bool:
+    with _lock:
+        return _healthy_until.get(ollama_url, 0) > time.monotonic()
+
+
+def _mark_healthy(ollama_url: str, ttl: float) -> None:
+    with _lock:
+        _healthy_until[ollama_url] = time.monotonic() + ttl
+
+
+def check_ollama(ollama_url: str, ttl: float = HEALTH_CHECK_TTL) -> None:
+    """
+    Make sure Ollama is reachable, reusing a recent successful check.
+
+    Args:
+        ollama_url: Ollama API endpoint
+        ttl: Seconds a successful check stays valid
+
+    Raises:
+        ConnectionError: If Ollama does not respond
+    """
+    if _health_cached(ollama_url):
+        return
+
+    import requests
+
+    try:
+        response = get_ollama_session(ollama_url).get(f"{ollama_url}/api/tags", timeout=5)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        raise ConnectionError(OLLAMA_UNAVAILABLE.format(url=ollama_url))
+    _mark_healthy(ollama_url, ttl)
+
+
+async def check_ollama_async(ollama_url: str, ttl: float = HEALTH_CHECK_TTL) -> None:
+    """
+    Async version of check_ollama.
+
+    Raises:
+        ConnectionError: If Ollama does not respond
+    """
+    if _health_cached(ollama_url):
+        return
+
+    import httpx
+
+    try:
+        response = await get_async_ollama_client(ollama_url).get("/api/tags", timeout=5)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        raise ConnectionError(OLLAMA_UNAVAILABLE.format(url=ollama_url))
+    _mark_healthy(ollama_url, ttl)
+
+
+async def close_async_clients() -> None:
+    """Close the shared async clients of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        # httpx clients close with aclose(), Anthropic clients with close()
+        if hasattr(client, "aclose"):
+            await client.aclose()
+        else:
+            await client.close()
+
+
+def reset_clients() -> None:
+    """Close shared blocking clients and forget cached clients and health checks."""
+    with _lock:
+        for client in _anthropic_clients.values():
+            client.close()
+        for session in _ollama_sessions.values():
+            session.close()
+        _anthropic_clients.clear()
+        _ollama_sessions.clear()
+        _healthy_until.clear()
+        _async_clients.clear()
@@ -3,10 +3,125 @@ Ollama integration for local LLM vision models.
 Requires Ollama to be installed and running locally.
 """
 
-import requests
+import asyncio
+import json
 from pathlib import Path
-from ..image_optimizer import optimize_for_llm, image_to_base64
-from ..prompt_loader import PromptLoader
+from typing import Optional
+from ..cache import ExtractionCache, cache_key
+from ..image_optimizer import ImageBudget, optimized_payload, image_to_base64
+from ..prompt_loader import PromptLoader, compose_prompt
+from ..telemetry import count_ollama, span
+from .clients import check_ollama, check_ollama_async, get_ollama_session, get_async_ollama_client
+from .streaming import StreamInterrupted, TextStream
+
+# Image optimization settings
+IMAGE_MAX_SIZE = 1024  # Smaller for local models
+IMAGE_QUALITY = 75
+
+# How long Ollama keeps the model loaded after a request, so the next
+# page doesn't pay for reloading the vision model
+KEEP_ALIVE = "10m"
+
+
+def _load_prompt(prompt_name: Optional[str]) -> str:
+    """Load the named prompt, or the default one."""
+    if prompt_name:
+        return PromptLoader.load_prompt(prompt_name)
+    return PromptLoader.get_default_prompt()
+
+
+def _extraction_key(
+    image_path: Path,
+    model: str,
+    base_prompt: str,
+    template_content: str,
+    optimize: bool,
+    grayscale: bool,
+    budget: Optional[ImageBudget] = None
+) -> str:
+    """Cache key for an Ollama extraction."""
+    # Only budgeted runs carry the field, so existing keys stay valid
+    extra = {"budget": budget.key()} if budget is not None else {}
+    return cache_key(
+        image_path,
+        backend="ollama",
+        model=model,
+        prompt=base_prompt,
+        template=template_content,
+        optimize=optimize,
+        max_size=IMAGE_MAX_SIZE,
+        quality=IMAGE_QUALITY,
+        grayscale=grayscale,
+        **extra,
+    )
+
+
+def _build_payload(
+    image_path: Path,
+    base_prompt: str,
+    template_content: str,
+    model: str,
+    optimize: bool,
+    grayscale: bool,
+    image_bytes: Optional[bytes],
+    keep_alive: str,
+    stream: bool = False,
+    budget: Optional[ImageBudget] = None
+) -> dict:
+    """Request body for /api/generate, reusing earlier optimized payloads for this image."""
+    if image_bytes is not None:
+        image_b64 = image_to_base64(image_bytes)
+    elif optimize:
+        _, image_b64 = optimized_payload(
+            image_path,
+            max_size=IMAGE_MAX_SIZE,
+            quality=IMAGE_QUALITY,
+            grayscale=grayscale,
+            budget=budget
+        )
+    else:
+        image_b64 = image_to_base64(image_path.read_bytes())
+
+    return {
+        "model": model,
+        "prompt": compose_prompt(base_prompt, template_content),
+        "images": [image_b64],
+        "stream": stream,
+        "keep_alive": keep_alive
+    }
+
+
+def _stream_generate(session, ollama_url: str, payload: dict, stream: TextStream) -> str:
+    """
+    POST /api/generate and read Ollama's NDJSON stream into `stream`.
+
+    Raises:
+        StreamInterrupted: If the stream fails after some text arrived
+    """
+    text = ""
+    stream.start()
+    try:
+        with span("request"), session.post(
+            f"{ollama_url}/api/generate", json=payload, stream=True, timeout=600
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                text += chunk.get("response", "")
+                stream.update(text)
+                if chunk.get("done"):
+                    # The last chunk carries the token counts and durations
+                    count_ollama(chunk)
+                    break
+    except Exception as e:
+        if text:
+            raise StreamInterrupted(text, str(e)) from e
+        raise
+    return text.strip()
 
 
 def extract_with_ollama(
@@ -16,7 +131,12 @@ def extract_with_ollama(
     ollama_url: str = "http://localhost:11434",
     optimize: bool = True,
     grayscale: bool = False,
-    prompt_name: str = None
+    prompt_name: str = None,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    keep_alive: str = KEEP_ALIVE,
+    stream: Optional[TextStream] = None,
+    budget: Optional[ImageBudget] = None
 ) -> str:
     """
     Extract text from image using local Ollama vision model.
@@ -29,67 +149,105 @@ def extract_with_ollama(
         optimize: Whether to optimize image
         grayscale: Convert to grayscale
         prompt_name: Name of prompt to use (without .txt). If None, uses default
+        image_bytes: Pre-optimized image bytes (skips optimization)
+        cache: Optional extraction cache checked before calling Ollama
+        keep_alive: How long Ollama keeps the model loaded afterwards (e.g. "10m", "-1")
+        stream: Stream the response into this TextStream as it arrives
+        budget: Optimize adaptively within these limits instead of fixed settings
 
     Returns:
         Extracted text
     """
-    # Check if Ollama is running
-    try:
-        response = requests.get(f"{ollama_url}/api/tags", timeout=5)
-        response.raise_for_status()
-    except requests.exceptions.RequestException:
-        raise ConnectionError(
-            f"Cannot connect to Ollama at {ollama_url}\n"
-            "Make sure Ollama is installed and running:\n"
-            "  brew install ollama (macOS)\n"
-            "  ollama serve\n"
-            "  ollama pull llama3.2-vision"
-        )
+    base_prompt = _load_prompt(prompt_name)
 
-    # Optimize image if requested
-    if optimize:
-        image_bytes = optimize_for_llm(
-            image_path,
-            max_size=1024,  # Smaller for local models
-            quality=75,
-            grayscale=grayscale
-        )
-    else:
-        image_bytes = image_path.read_bytes()
+    # Return cached result if this exact extraction ran before
+    if cache is not None:
+        key = _extraction_key(image_path, model, base_prompt, template_content, optimize, grayscale, budget)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
 
-    # Convert to base64
-    image_b64 = image_to_base64(image_bytes)
+    # Check if Ollama is running (cached for a few seconds across pages)
+    check_ollama(ollama_url)
 
-    # Load prompt
-    if prompt_name:
-        base_prompt = PromptLoader.load_prompt(prompt_name)
+    payload = _build_payload(
+        image_path, base_prompt, template_content, model, optimize, grayscale, image_bytes, keep_alive,
+        stream=stream is not None, budget=budget
+    )
+
+    # Call Ollama API over the shared keep-alive session
+    session = get_ollama_session(ollama_url)
+    if stream is not None:
+        extracted_text = _stream_generate(session, ollama_url, payload, stream)
     else:
-        base_prompt = PromptLoader.get_default_prompt()
+        with span("request"):
+            response = session.post(
+                f"{ollama_url}/api/generate",
+                json=payload,
+                timeout=600  # Vision models can be slow
+            )
+            response.raise_for_status()
 
-    # Craft full prompt with template context
-    prompt = f"""{base_prompt}
+        # Extract text from response
+        result = response.json()
+        count_ollama(result)
+        extracted_text = result.get("response", "").strip()
 
-The extracted text will be used to fill this template:
+    if cache is not None:
+        cache.put(key, extracted_text, backend="ollama", model=model)
 
-{template_content}"""
+    return extracted_text
 
-    # Call Ollama API
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "images": [image_b64],
-        "stream": False
-    }
 
-    response = requests.post(
-        f"{ollama_url}/api/generate",
-        json=payload,
-        timeout=600  # Vision models can be slow
+async def extract_with_ollama_async(
+    image_path: Path,
+    template_content: str,
+    model: str = "llama3.2-vision",
+    ollama_url: str = "http://localhost:11434",
+    optimize: bool = True,
+    grayscale: bool = False,
+    prompt_name: str = None,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    keep_alive: str = KEEP_ALIVE,
+    budget: Optional[ImageBudget] = None
+) -> str:
+    """
+    Async version of extract_with_ollama on a shared httpx client.
+
+    Image optimization runs in a worker thread so the event loop stays
+    free for other requests.
+
+    Args:
+        Same as extract_with_ollama
+
+    Returns:
+        Extracted text
+    """
+    base_prompt = _load_prompt(prompt_name)
+
+    if cache is not None:
+        key = _extraction_key(image_path, model, base_prompt, template_content, optimize, grayscale, budget)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+    await check_ollama_async(ollama_url)
+
+    payload = await asyncio.to_thread(
+        _build_payload, image_path, base_prompt, template_content, model, optimize, grayscale,
+        image_bytes, keep_alive, budget=budget
     )
-    response.raise_for_status()
 
-    # Extract text from response
+    with span("request"):
+        response = await get_async_ollama_client(ollama_url).post("/api/generate", json=payload)
+        response.raise_for_status()
+
     result = response.json()
+    count_ollama(result)
     extracted_text = result.get("response", "").strip()
 
+    if cache is not None:
+        cache.put(key, extracted_text, backend="ollama", model=model)
+
     return extracted_text
@@ -0,0 +1,55 @@
+"""
+Streaming support shared by the LLM backends.
+"""
+
+import time
+from typing import Callable, Optional
+
+
+class StreamInterrupted(ConnectionError):
+    """A streamed response stopped early; `text` holds what arrived before the failure."""
+
+    def __init__(self, text: str, reason: str):
+        super().__init__(f"Stream interrupted after {len(text)} characters: {reason}")
+        self.text = text
+
+
+class TextStream:
+    """
+    Receives the text of one streamed response as it grows.
+
+    Backends call start() right before sending the request and update()
+    with the accumulated text on every chunk, which gives the
+    time-to-first-token of the page.
+    """
+
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            on_text: Called with the accumulated text after every chunk
+        """
+        self.on_text = on_text
+        self.text = ""
+        self.started: Optional[float] = None
+        self.first_token: Optional[float] = None
+
+    def start(self) -> None:
+        """Mark the moment the request is sent."""
+        self.started = time.perf_counter()
+
+    def update(self, text: str) -> None:
+        """Record the accumulated text received so far."""
+        if not text:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.text = text
+        if self.on_text is not None:
+            self.on_text(text)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from request to first text, or None if nothing arrived."""
+        if self.started is None or self.first_token is None:
+            return None
+        return self.first_token - self.started
@@ -0,0 +1,64 @@
+"""
+Token usage accounting for Claude requests.
+"""
+
+import threading
+from dataclasses import dataclass, field
+
+from ..telemetry import count
+
+# Shortest prefix Claude Sonnet caches. A cache_control marker on a shorter
+# prefix is accepted without error but ignored, so it is billed in full every time
+MIN_CACHEABLE_TOKENS = 1024
+
+
+@dataclass
+class TokenUsage:
+    """Accumulates `usage` blocks from Claude responses (thread-safe)."""
+
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, usage) -> None:
+        """
+        Add the usage of one response.
+
+        Args:
+            usage: `message.usage` from the Anthropic SDK (or any object with
+                the same attributes; missing values count as 0)
+        """
+        tokens = {
+            name: getattr(usage, name, 0) or 0
+            for name in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+        }
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += tokens["input_tokens"]
+            self.output_tokens += tokens["output_tokens"]
+            self.cache_creation_input_tokens += tokens["cache_creation_input_tokens"]
+            self.cache_read_input_tokens += tokens["cache_read_input_tokens"]
+        # Also per page, when a page is being traced
+        count(requests=1, **tokens)
+
+    @property
+    def cache_unused(self) -> bool:
+        """
+        Whether requests were made but none wrote or read the prompt cache.
+
+        Every Claude request marks its prompt and template for caching, so
+        this means the prefix is below MIN_CACHEABLE_TOKENS.
+        """
+        return self.requests > 0 and not (self.cache_creation_input_tokens or self.cache_read_input_tokens)
+
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        return (
+            f"{self.requests} requests, "
+            f"input {self.input_tokens}, output {self.output_tokens}, "
+            f"cache write {self.cache_creation_input_tokens}, "
+            f"cache read {self.cache_read_input_tokens}"
+        )
@@ -1,20 +1,146 @@
 """
 OCR functionality for extracting text from images.
+
+OpenCV, NumPy, transformers and torch are imported inside the functions
+that use them, so importing this module (and the CLI) stays fast for
+commands that never touch the local model.
 """
 
+import gc
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Callable, Optional
 from PIL import Image
-import cv2
-import numpy as np
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 
+from .preprocess import DEFAULT_PROFILE, preprocess_page, set_cv_threads
+from .telemetry import add_spans
+
+DEFAULT_MODEL = "microsoft/trocr-large-handwritten"
+
+
+def _resolve_device(device: Optional[str]) -> str:
+    """Pick CUDA when available unless a device is given explicitly."""
+    if device is not None:
+        return device
+
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_trocr(model_name: str, device: str, dtype: Optional[str]):
+    """Load a TrOCR processor and model onto a device."""
+    from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+
+    processor = TrOCRProcessor.from_pretrained(model_name)
+    ocr_model = VisionEncoderDecoderModel.from_pretrained(model_name)
+
+    if dtype is not None:
+        import torch
+        ocr_model = ocr_model.to(device=device, dtype=getattr(torch, dtype))
+    else:
+        ocr_model = ocr_model.to(device)
+    ocr_model.eval()
+
+    return processor, ocr_model
+
+
+class ModelRegistry:
+    """
+    Keeps TrOCR processors and models resident across calls.
+
+    Each (model_name, device, dtype) combination is loaded once. The least
+    recently used entry is evicted when more than max_models are loaded.
+    """
+
+    def __init__(self, max_models: int = 2):
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str = DEFAULT_MODEL, device: Optional[str] = None, dtype: Optional[str] = None):
+        """
+        Get a loaded (processor, model) pair, loading it on first use.
+
+        Args:
+            model_name: Name of the TrOCR model
+            device: Torch device (default: cuda if available, else cpu)
+            dtype: Torch dtype name, e.g. 'float16' (default: model's own)
+
+        Returns:
+            Tuple of (processor, model)
+        """
+        key = (model_name, _resolve_device(device), dtype)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+
+            loaded = _load_trocr(*key)
+            self._models[key] = loaded
+
+            while len(self._models) > self.max_models:
+                evicted_key, _ = self._models.popitem(last=False)
+                _release_memory(evicted_key[1])
+
+            return loaded
 
-def preprocess_image(image_path: Path) -> Image.Image:
+    def unload(self, model_name: Optional[str] = None, device: Optional[str] = None, dtype: Optional[str] = None) -> int:
+        """
+        Unload matching models. Arguments left as None match anything.
+
+        Returns:
+            Number of models unloaded
+        """
+        with self._lock:
+            keys = [
+                key for key in self._models
+                if (model_name is None or key[0] == model_name)
+                and (device is None or key[1] == device)
+                and (dtype is None or key[2] == dtype)
+            ]
+            for key in keys:
+                del self._models[key]
+
+        for device_name in {key[1] for key in keys}:
+            _release_memory(device_name)
+
+        return len(keys)
+
+    def loaded(self) -> list[tuple[str, str, Optional[str]]]:
+        """List (model_name, device, dtype) keys currently resident."""
+        with self._lock:
+            return list(self._models)
+
+
+def _release_memory(device: str) -> None:
+    """Return freed model memory to the system."""
+    gc.collect()
+    if device.startswith("cuda"):
+        import torch
+        torch.cuda.empty_cache()
+
+
+# Shared registry used by the CLI and library calls
+model_registry = ModelRegistry()
+
+
+def preprocess_image(
+    image_path: Path,
+    profile: str = DEFAULT_PROFILE,
+    threads: Optional[int] = None
+) -> Image.Image:
     """
     Enhance image quality for better OCR.
 
     Args:
         image_path: Path to the image file
+        profile: Preprocessing profile (see preprocess.PROFILES)
+        threads: OpenCV thread count (default: OpenCV's own)
 
     Returns:
         Preprocessed PIL Image in RGB mode
@@ -22,51 +148,327 @@ def preprocess_image(image_path: Path) -> Image.Image:
     Raises:
         ValueError: If image cannot be read
     """
-    img = cv2.imread(str(image_path))
-    if img is None:
-        raise ValueError(f"Could not read image: {image_path}")
+    return preprocess_page(image_path, profile=profile, threads=threads).image
+
+
+def segment_lines(
+    image: Image.Image,
+    min_line_height: int = 8,
+    max_gap: int = 3,
+    padding: int = 4
+) -> list[Image.Image]:
+    """
+    Split a page into text line crops using a horizontal projection profile.
 
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    Args:
+        image: Page image (typically the output of preprocess_image)
+        min_line_height: Ignore ink bands shorter than this many pixels
+        max_gap: Merge bands separated by at most this many blank rows
+        padding: Pixels of margin kept around each line
+
+    Returns:
+        Line images in reading order (top to bottom). The whole page is
+        returned as a single line if no text lines are found.
+    """
+    import cv2
+    import numpy as np
+
+    gray = np.array(image.convert("L"))
+    height, width = gray.shape
+
+    # Binarize with ink as foreground; adaptive so uneven lighting is ignored
+    block_size = max(15, (min(height, width) // 40) | 1)
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block_size, 15
+    )
+
+    # Remove ruled notebook lines and isolated specks
+    rule_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, width // 8), 1))
+    binary = cv2.subtract(binary, cv2.morphologyEx(binary, cv2.MORPH_OPEN, rule_kernel))
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    ink = binary > 0
 
-    # Contrast enhancement using CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
+    # Rows clearly above the background ink level belong to a text line
+    row_profile = ink.sum(axis=1).astype(float)
+    smoothing = max(1, height // 200)
+    row_profile = np.convolve(row_profile, np.ones(smoothing) / smoothing, mode="same")
+    background, peak = np.percentile(row_profile, 10), np.percentile(row_profile, 95)
+    text_rows = row_profile > max(1.0, background + 0.25 * (peak - background))
 
-    # Denoise
-    denoised = cv2.fastNlMeansDenoising(enhanced)
+    # Collect runs of text rows, bridging small gaps
+    bands = []
+    start = None
+    last = None
+    for y, is_text in enumerate(text_rows):
+        if not is_text:
+            continue
+        if start is None:
+            start = y
+        elif y - last > max_gap + 1:
+            bands.append((start, last))
+            start = y
+        last = y
+    if start is not None:
+        bands.append((start, last))
 
-    return Image.fromarray(denoised).convert("RGB")
+    lines = []
+    for top, bottom in bands:
+        if bottom - top + 1 < min_line_height:
+            continue
 
+        # Trim blank margins to the left and right of the line
+        columns = np.flatnonzero(ink[top:bottom + 1].any(axis=0))
+        left, right = columns[0], columns[-1]
 
-def extract_text_local(image_path: Path, preprocess: bool = True, model_name: str = "microsoft/trocr-large-handwritten") -> str:
+        box = (
+            max(0, left - padding),
+            max(0, top - padding),
+            min(width, right + padding + 1),
+            min(height, bottom + padding + 1),
+        )
+        lines.append(image.crop(box))
+
+    return lines or [image]
+
+
+def recognize_lines(lines: list[Image.Image], processor, ocr_model, batch_size: int = 8) -> list[str]:
     """
-    Extract text from image using local TrOCR model.
+    Run TrOCR over line images in batches.
+
+    Lines of similar width are batched together so generation lengths
+    within a batch are close; results are returned in input order.
+
+    Args:
+        lines: Line images
+        processor: TrOCR processor
+        ocr_model: TrOCR model
+        batch_size: Number of lines per generate call
+
+    Returns:
+        Recognized text for each line
+    """
+    order = sorted(range(len(lines)), key=lambda i: lines[i].width)
+    texts = [""] * len(lines)
+
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        batch = [lines[i] for i in indices]
+
+        pixel_values = processor(images=batch, return_tensors="pt").pixel_values
+        pixel_values = pixel_values.to(ocr_model.device, dtype=ocr_model.dtype)
+        generated_ids = ocr_model.generate(pixel_values)
+        decoded = processor.batch_decode(generated_ids, skip_special_tokens=True)
+
+        for i, text in zip(indices, decoded):
+            texts[i] = text
+
+    return texts
+
+
+def read_lines(
+    image_path: Path,
+    preprocess: bool = True,
+    segment: bool = True,
+    preprocess_profile: str = DEFAULT_PROFILE,
+    cv_threads: Optional[int] = None,
+    timings: Optional[dict] = None
+) -> list[Image.Image]:
+    """
+    Load a page and cut it into the line images TrOCR reads.
 
     Args:
         image_path: Path to the image file
         preprocess: Whether to apply image preprocessing
-        model_name: Name of the TrOCR model to use
+        segment: Split the page into text lines
+        preprocess_profile: Preprocessing profile (see preprocess.PROFILES)
+        cv_threads: OpenCV thread count (default: OpenCV's own)
+        timings: Optional dict that receives seconds per step
 
     Returns:
-        Extracted text from the image
+        Line images in reading order
 
     Raises:
         ValueError: If image cannot be processed
     """
-    # Load model
-    processor = TrOCRProcessor.from_pretrained(model_name)
-    ocr_model = VisionEncoderDecoderModel.from_pretrained(model_name)
-
-    # Load and optionally preprocess image
+    steps = {}
     if preprocess:
-        image = preprocess_image(image_path)
+        result = preprocess_page(image_path, profile=preprocess_profile, threads=cv_threads)
+        image = result.image
+        steps.update(result.timings)
     else:
+        set_cv_threads(cv_threads)
         image = Image.open(image_path).convert("RGB")
 
-    # Perform OCR
-    pixel_values = processor(images=image, return_tensors="pt").pixel_values
-    generated_ids = ocr_model.generate(pixel_values)
-    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    start = time.perf_counter()
+    lines = segment_lines(image) if segment else [image]
+    steps["segment"] = time.perf_counter() - start
+
+    if timings is not None:
+        timings.update(steps)
+    return lines
+
+
+def join_lines(texts: list[str]) -> str:
+    """Page text from recognized lines, skipping empty ones."""
+    return "\n".join(text.strip() for text in texts if text.strip())
+
+
+class LineBatcher:
+    """
+    Coalesces line recognition from concurrent pages into shared batches.
+
+    Pages submitted by different threads within max_wait of each other
+    are recognized in one call, so the model runs full batches of lines
+    of similar width instead of one partial batch per page. Only the
+    batcher's thread runs the model, which keeps its memory use bounded
+    however many pages are in flight.
+    """
+
+    def __init__(
+        self,
+        recognize: Callable[[list[Image.Image]], list[str]],
+        max_lines: int = 64,
+        max_wait: float = 0.02
+    ):
+        """
+        Args:
+            recognize: Recognizes a list of line images, e.g. recognize_lines
+                bound to a loaded model
+            max_lines: Stop collecting pages once a batch has this many lines
+            max_wait: Seconds to wait for more pages after the first arrives
+        """
+        self.recognize_batch = recognize
+        self.max_lines = max_lines
+        self.max_wait = max_wait
+        self.batches = 0
+        self.pages = 0
+        self.lines = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def recognize(self, lines: list[Image.Image]) -> list[str]:
+        """
+        Recognize one page's lines along with whatever else is waiting.
+
+        Returns:
+            Recognized text for each line, in input order
+        """
+        future = Future()
+        self._queue.put((lines, future))
+        return future.result()
+
+    def _collect(self, first) -> list:
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_lines:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Finish this batch, then stop
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+
+            lines = [line for page_lines, _ in pending for line in page_lines]
+            try:
+                texts = self.recognize_batch(lines)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.pages += len(pending)
+            self.lines += len(lines)
+            start = 0
+            for page_lines, future in pending:
+                future.set_result(texts[start:start + len(page_lines)])
+                start += len(page_lines)
+
+    def stats(self) -> dict:
+        """Batches run, pages and lines recognized, and mean pages per batch."""
+        return {
+            "batches": self.batches,
+            "pages": self.pages,
+            "lines": self.lines,
+            "pages_per_batch": round(self.pages / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def extract_text_local(
+    image_path: Path,
+    preprocess: bool = True,
+    model_name: str = DEFAULT_MODEL,
+    device: Optional[str] = None,
+    dtype: Optional[str] = None,
+    segment: bool = True,
+    batch_size: int = 8,
+    preprocess_profile: str = DEFAULT_PROFILE,
+    cv_threads: Optional[int] = None,
+    timings: Optional[dict] = None
+) -> str:
+    """
+    Extract text from image using local TrOCR model.
+
+    TrOCR reads a single line of text, so the page is first split into
+    lines which are recognized in batches and joined in reading order.
+    The model is loaded once through the shared model registry and kept
+    resident for later calls.
+
+    Args:
+        image_path: Path to the image file
+        preprocess: Whether to apply image preprocessing
+        model_name: Name of the TrOCR model to use
+        device: Torch device (default: cuda if available, else cpu)
+        dtype: Torch dtype name, e.g. 'float16'
+        segment: Split the page into text lines before recognition
+        batch_size: Number of lines per generate call
+        preprocess_profile: Preprocessing profile (see preprocess.PROFILES)
+        cv_threads: OpenCV thread count (default: OpenCV's own)
+        timings: Optional dict that receives seconds per step (decode,
+            resize, clahe, denoise, segment, recognize)
+
+    Returns:
+        Extracted text from the image, one line per detected text line
+
+    Raises:
+        ValueError: If image cannot be processed
+    """
+    # Load model (cached after the first call)
+    processor, ocr_model = model_registry.get(model_name, device=device, dtype=dtype)
+
+    # Load, optionally preprocess, and split the page into lines
+    steps = {}
+    lines = read_lines(image_path, preprocess, segment, preprocess_profile, cv_threads, timings=steps)
+
+    # Perform OCR line by line
+    start = time.perf_counter()
+    texts = recognize_lines(lines, processor, ocr_model, batch_size=batch_size)
+    steps["recognize"] = time.perf_counter() - start
+
+    if timings is not None:
+        timings.update(steps)
+    add_spans(steps)
 
-    return text
+    return join_lines(texts)
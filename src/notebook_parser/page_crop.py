@@ -0,0 +1,357 @@
+"""
+Page detection and cropping before upload.
+
+Notebook photos include the desk, hands and wide blank margins. Every
+one of those pixels is billed as image tokens, and it shrinks the
+handwriting once the image is clamped to the backend's max size. This
+module finds the page, flattens it and crops it to the written area:
+
+1. Page detection: the largest convex quadrilateral among the edge and
+   brightness contours of a small copy of the photo.
+2. Perspective correction: the quadrilateral is warped to a rectangle.
+3. Deskew: the rotation that makes the ink rows (text and ruled lines)
+   most sharply separated, found with a horizontal projection profile.
+4. Ink crop: the bounding box of the handwriting, with ruled lines,
+   specks and the page border ignored, plus a small margin.
+
+Every step falls back to doing nothing when it finds nothing, so a
+frame-filling scan or a blank page comes out unchanged.
+
+OpenCV and NumPy are imported inside the functions that use them.
+"""
+
+import io
+import json
+import math
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+# Bump when the crop output changes, so cached pages are rebuilt
+CROP_VERSION = 1
+
+# Largest dimension the page is cropped at. About 1.3x the largest backend
+# max_size, so a crop down to ~77% of the photo still uploads at full
+# resolution, while 12 MP photos decode in JPEG draft mode at half scale
+CROP_MAX_SIZE = 2000
+CROP_QUALITY = 95
+
+# Largest dimension detection and ink analysis run at
+ANALYSIS_SIZE = 800
+
+# A page must cover this share of the photo to count as found; at the top
+# end the page fills the frame and there is nothing to correct
+MIN_PAGE_AREA = 0.2
+MAX_PAGE_AREA = 0.97
+# Share of a page candidate that must be bright paper
+MIN_PAPER_SHARE = 0.95
+
+# Deskew search range and precision (degrees)
+MAX_SKEW = 10.0
+SKEW_STEP = 0.1
+
+# Margin kept around the ink, as a share of the page size
+INK_MARGIN = 0.03
+# Ink touching this band along the page border is shadow or desk, not writing
+BORDER_BAND = 0.02
+# Ink blobs smaller than this share of the page are noise
+MIN_BLOB_AREA = 0.0002
+
+
+@dataclass(frozen=True)
+class PageCrop:
+    """What the crop did to one photo."""
+
+    page_found: bool
+    angle: float  # Deskew rotation, degrees
+    width: int
+    height: int
+    area_ratio: float  # Cropped pixels / original pixels
+
+    def summary(self) -> str:
+        """One-line description, e.g. 'page found, deskewed +1.2°, 1450x1997 (41% of pixels)'."""
+        parts = ["page found" if self.page_found else "no page edge"]
+        if self.angle:
+            parts.append(f"deskewed {self.angle:+.1f}°")
+        parts.append(f"{self.width}x{self.height} ({self.area_ratio:.0%} of pixels)")
+        return ", ".join(parts)
+
+
+def _order_corners(quad):
+    """Corners as top-left, top-right, bottom-right, bottom-left."""
+    import numpy as np
+
+    points = quad.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+
+def find_page(gray) -> Optional["np.ndarray"]:
+    """
+    Find the page outline in a grayscale photo.
+
+    Candidates are the contours of the Canny edge map and the outer
+    contours of the Otsu-thresholded (bright paper) mask. The largest
+    convex quadrilateral covering between MIN_PAGE_AREA and MAX_PAGE_AREA
+    of the photo that is almost all paper wins.
+
+    Args:
+        gray: Grayscale image as a NumPy array (ideally ANALYSIS_SIZE)
+
+    Returns:
+        4x2 float array of corners (top-left, top-right, bottom-right,
+        bottom-left), or None if no page outline was found
+    """
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    edges = cv2.dilate(cv2.Canny(blurred, 50, 150), np.ones((3, 3), np.uint8))
+    _, paper = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    paper = cv2.morphologyEx(paper, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+
+    best, best_area = None, 0.0
+    for mask, mode in ((edges, cv2.RETR_LIST), (paper, cv2.RETR_EXTERNAL)):
+        contours, _ = cv2.findContours(mask, mode, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            hull = cv2.convexHull(contour)
+            quad = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+            if len(quad) != 4 or not cv2.isContourConvex(quad):
+                continue
+            area = cv2.contourArea(quad) / (width * height)
+            if not MIN_PAGE_AREA <= area <= MAX_PAGE_AREA or area <= best_area:
+                continue
+            # Edge contours can merge with a busy desk; the page itself is paper
+            inside = np.zeros_like(paper)
+            cv2.fillConvexPoly(inside, quad, 255)
+            if cv2.mean(paper, mask=inside)[0] / 255 >= MIN_PAPER_SHARE:
+                best, best_area = quad, area
+
+    return _order_corners(best) if best is not None else None
+
+
+def warp_page(image, corners):
+    """
+    Warp the page quadrilateral to a flat rectangle.
+
+    Args:
+        image: Image as a NumPy array
+        corners: Corners from find_page, in image coordinates
+
+    Returns:
+        The flattened page
+    """
+    import cv2
+    import numpy as np
+
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = int(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)))
+    height = int(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _binarize(gray):
+    """Ink as 255 on 0; adaptive so uneven lighting is ignored."""
+    import cv2
+
+    height, width = gray.shape
+    block_size = max(15, (min(height, width) // 40) | 1)
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block_size, 15
+    )
+
+
+def _rotate(image, angle: float, border_value=None):
+    import cv2
+
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    if border_value is None:
+        return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_NEAREST, borderValue=border_value)
+
+
+def estimate_skew(gray) -> float:
+    """
+    Estimate the rotation that levels the lines of a page.
+
+    Written and ruled lines make the row sums of the ink mask peak and
+    dip sharply when level; a tilt smears them. The angle with the
+    highest row-sum variance wins, searched in 1 degree steps and then
+    refined to SKEW_STEP.
+
+    Args:
+        gray: Grayscale page as a NumPy array (ideally ANALYSIS_SIZE)
+
+    Returns:
+        Angle in degrees to rotate by (counter-clockwise positive), 0.0
+        if the page has no ink
+    """
+    import numpy as np
+
+    binary = _binarize(gray)
+    # Page edges left over from the warp would pin the angle to 0
+    height, width = binary.shape
+    band_x, band_y = int(width * BORDER_BAND) + 1, int(height * BORDER_BAND) + 1
+    binary[:band_y] = binary[-band_y:] = 0
+    binary[:, :band_x] = binary[:, -band_x:] = 0
+    if not binary.any():
+        return 0.0
+
+    def score(angle: float) -> float:
+        return float(np.var(_rotate(binary, angle, border_value=0).sum(axis=1, dtype=np.float64)))
+
+    coarse = max(np.arange(-MAX_SKEW, MAX_SKEW + 0.5, 1.0), key=score)
+    fine = np.arange(coarse - 1.0, coarse + 1.0 + SKEW_STEP / 2, SKEW_STEP)
+    angle = round(float(max(fine, key=score)), 1)
+    return angle if abs(angle) >= SKEW_STEP else 0.0
+
+
+def ink_box(gray) -> Optional[tuple[int, int, int, int]]:
+    """
+    Bounding box of the handwriting on a flattened page.
+
+    Ruled and margin lines are removed with long horizontal and vertical
+    openings, specks with a small opening. Nearby strokes are merged and
+    blobs that are tiny or touch the page border are dropped.
+
+    Args:
+        gray: Grayscale page as a NumPy array (ideally ANALYSIS_SIZE)
+
+    Returns:
+        (left, top, right, bottom) in pixels including INK_MARGIN, or
+        None if the page is blank
+    """
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape
+    binary = _binarize(gray)
+
+    horizontal = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, width // 8), 1))
+    vertical = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(1, height // 8)))
+    rules = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal) | cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical)
+    ink = cv2.subtract(binary, rules)
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+    # Merge strokes into words and lines so the size filter keeps them
+    merge = max(3, min(height, width) // 60)
+    ink = cv2.dilate(ink, np.ones((merge, merge), np.uint8))
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink)
+    band_x, band_y = int(width * BORDER_BAND), int(height * BORDER_BAND)
+    min_area = MIN_BLOB_AREA * width * height
+
+    boxes = []
+    for left, top, box_width, box_height, area in stats[1:count]:
+        right, bottom = left + box_width, top + box_height
+        touches_border = (
+            left <= band_x or top <= band_y or right >= width - band_x or bottom >= height - band_y
+        )
+        if area >= min_area and not touches_border:
+            boxes.append((left, top, right, bottom))
+    if not boxes:
+        return None
+
+    margin_x, margin_y = int(width * INK_MARGIN), int(height * INK_MARGIN)
+    return (
+        max(0, min(box[0] for box in boxes) - margin_x),
+        max(0, min(box[1] for box in boxes) - margin_y),
+        min(width, max(box[2] for box in boxes) + margin_x),
+        min(height, max(box[3] for box in boxes) + margin_y),
+    )
+
+
+def _analysis_copy(gray):
+    """Grayscale copy with the long edge at most ANALYSIS_SIZE, and its scale."""
+    import cv2
+
+    height, width = gray.shape
+    scale = min(1.0, ANALYSIS_SIZE / max(height, width))
+    if scale == 1.0:
+        return gray, scale
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+
+def crop_page(image_path: Path, max_size: int = CROP_MAX_SIZE) -> tuple[Image.Image, PageCrop]:
+    """
+    Detect, flatten, deskew and crop the page in a photo.
+
+    Detection and analysis run on an ANALYSIS_SIZE copy; the geometry
+    is then applied to the photo decoded at up to max_size.
+
+    Args:
+        image_path: Path to image file
+        max_size: Largest dimension the photo is decoded at
+
+    Returns:
+        Tuple of (cropped RGB image, what was done)
+    """
+    import cv2
+    import numpy as np
+
+    from .image_optimizer import load_for_llm
+
+    photo = load_for_llm(image_path, max_size=max_size)
+    original_pixels = photo.width * photo.height
+    page = np.asarray(photo)
+
+    small, scale = _analysis_copy(cv2.cvtColor(page, cv2.COLOR_RGB2GRAY))
+    corners = find_page(small)
+    if corners is not None:
+        page = warp_page(page, corners / scale)
+        small = warp_page(small, corners)
+
+    angle = estimate_skew(small)
+    if angle:
+        page = _rotate(page, angle)
+        small = _rotate(small, angle)
+
+    box = ink_box(small)
+    if box is not None:
+        ratio_y, ratio_x = page.shape[0] / small.shape[0], page.shape[1] / small.shape[1]
+        left, top, right, bottom = box
+        page = page[int(top * ratio_y):math.ceil(bottom * ratio_y), int(left * ratio_x):math.ceil(right * ratio_x)]
+
+    height, width = page.shape[:2]
+    crop = PageCrop(
+        page_found=corners is not None,
+        angle=angle,
+        width=width,
+        height=height,
+        area_ratio=round(width * height / original_pixels, 3),
+    )
+    return Image.fromarray(np.ascontiguousarray(page)), crop
+
+
+def encode_crop(image: Image.Image, crop: PageCrop) -> bytes:
+    """JPEG bytes of a cropped page, with the crop details in the comment."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=CROP_QUALITY, comment=json.dumps(asdict(crop)))
+    return buffer.getvalue()
+
+
+def read_page_crop(image_path: Path) -> Optional[PageCrop]:
+    """Crop details stored in a cropped page by encode_crop, or None."""
+    with Image.open(image_path) as img:
+        comment = img.info.get("comment")
+    if not comment:
+        return None
+    try:
+        return PageCrop(**json.loads(comment))
+    except (ValueError, TypeError):
+        return None
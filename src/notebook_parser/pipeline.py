@@ -0,0 +1,346 @@
+"""
+Shared parse pipeline: optimize, extract and render a single page.
+
+Used by the single-image `parse` command and by batch processing.
+"""
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from .cache import ExtractionCache
+from .extractors import Extraction, Extractor, available_extractors, create_extractor
+from .formatters import format_for_template
+from .sidecar import NoteRecord, backend_model, write_sidecar
+from .image_optimizer import ImageBudget, get_payload_cache, optimized_payload
+from .template_engine import TemplateEngine
+from .telemetry import span
+from .tiling import merge_tags, merge_texts
+from .llm import ollama_vision
+from .ocr import DEFAULT_MODEL
+from .preprocess import DEFAULT_PROFILE
+from .llm.streaming import TextStream
+from .llm.usage import TokenUsage
+
+# How --tags runs on Claude: one structured request, or tags first then content
+TAG_MODES = ("single", "two-step")
+
+
+@dataclass
+class ParseOptions:
+    """Extraction settings shared by every page of a run."""
+
+    model: str = "local"
+    prompt: Optional[str] = None
+    preprocess: bool = True
+    preprocess_profile: str = DEFAULT_PROFILE
+    cv_threads: Optional[int] = None
+    # TrOCR settings for the local backend
+    trocr_model: str = DEFAULT_MODEL
+    device: Optional[str] = None
+    segment: bool = True
+    batch_size: int = 8
+    optimize: bool = True
+    grayscale: bool = False
+    api_key: Optional[str] = None
+    ollama_model: str = "llama3.2-vision"
+    ollama_url: str = "http://localhost:11434"
+    ollama_keep_alive: str = ollama_vision.KEEP_ALIVE
+    tags: bool = False
+    tags_mode: str = "single"
+    # Adaptive image optimization; None uses the backend's fixed size and quality
+    image_budget: Optional[ImageBudget] = None
+    # Send the detected, flattened page cropped to its ink instead of the whole photo
+    crop_page: bool = False
+    # Split two-page spreads at the gutter
+    split_spread: bool = False
+    # Overlapping horizontal bands each page is cut into
+    tiles: int = 1
+    # Save the raw extraction next to each note, for re-rendering
+    sidecar: bool = True
+
+    @property
+    def splits_pages(self) -> bool:
+        """Whether pages are cut into pieces that are extracted separately."""
+        return self.split_spread or self.tiles > 1
+
+
+def page_image(image_path: Path, options: ParseOptions) -> Path:
+    """
+    The image the backend should read: the cropped page with crop_page, else the photo.
+
+    Args:
+        image_path: Path to notebook image
+        options: Extraction settings
+
+    Returns:
+        Path to the cached cropped page, or image_path unchanged
+    """
+    if not options.crop_page:
+        return image_path
+    return get_payload_cache().cropped_page(image_path)
+
+
+def page_pieces(image_path: Path, options: ParseOptions) -> list[list[Path]]:
+    """
+    The images to extract for a page, in reading order.
+
+    Args:
+        image_path: Path to notebook image
+        options: Extraction settings
+
+    Returns:
+        For each page of a spread, its bands; [[page_image]] without splitting
+    """
+    image_path = page_image(image_path, options)
+    if not options.splits_pages:
+        return [[image_path]]
+    return get_payload_cache().split_page(image_path, spread=options.split_spread, tiles=options.tiles)
+
+
+def _stitch(pieces: list[list[Path]], results: list[Extraction]) -> Extraction:
+    """Combine per-piece extractions into one, in reading order."""
+    texts = iter(text for text, _ in results)
+    return (
+        merge_texts([[next(texts) for _ in bands] for bands in pieces]),
+        merge_tags([tags for _, tags in results]),
+    )
+
+
+def _piece_workers(extractor: Extractor, count: int) -> int:
+    return min(count, extractor.max_concurrency or count)
+
+
+def prepare_image(image_path: Path, options: ParseOptions) -> Optional[bytes]:
+    """
+    Optimize an image for the selected vision backend.
+
+    Kept at module level so it can run in a process pool. Payloads are
+    shared through the on-disk payload cache.
+
+    Args:
+        image_path: Path to notebook image
+        options: Extraction settings
+
+    Returns:
+        Optimized JPEG bytes, or None if the backend reads the file itself
+        (or optimizes each piece of a split page)
+    """
+    settings = create_extractor(options).optimize_settings
+    if not options.optimize or settings is None or options.splits_pages:
+        return None
+
+    max_size, quality = settings
+    image_bytes, _ = optimized_payload(
+        page_image(image_path, options),
+        max_size=max_size,
+        quality=quality,
+        grayscale=options.grayscale,
+        budget=options.image_budget
+    )
+    return image_bytes
+
+
+def extract_page(
+    image_path: Path,
+    template_content: str,
+    options: ParseOptions,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    stream: Optional[TextStream] = None,
+    extractor: Optional[Extractor] = None
+) -> tuple[str, Optional[str]]:
+    """
+    Extract text (and optionally tags) from a notebook image.
+
+    Args:
+        image_path: Path to notebook image
+        template_content: Template to guide extraction
+        options: Extraction settings
+        image_bytes: Pre-optimized image bytes (skips optimization in the backend)
+        cache: Optional extraction cache for the LLM backends
+        usage: Optional accumulator for Claude token counts
+        stream: Stream Claude/Ollama responses into this TextStream (ignored by local TrOCR)
+        extractor: Open extractor to reuse; without one, a backend is
+            opened for this page and closed afterwards
+
+    Returns:
+        Tuple of (extracted_text, generated_tags). Tags are None unless
+        tag generation was requested with the Claude backend; they are a
+        list in single-request mode and a "#a #b" string in two-step mode.
+        Split pages are extracted piece by piece in parallel (without
+        streaming) and stitched; their tags are a list.
+
+    Raises:
+        ValueError: If the model is unknown
+    """
+    if extractor is None:
+        with open_extractor(options) as extractor:
+            return extract_page(
+                image_path, template_content, options, image_bytes, cache, usage, stream, extractor
+            )
+
+    pieces = page_pieces(image_path, options)
+    paths = [path for bands in pieces for path in bands]
+    if len(paths) == 1:
+        return extractor.extract(paths[0], template_content, image_bytes, cache, usage, stream)
+
+    # Pieces run in copies of this context so their spans reach the page's trace
+    contexts = [contextvars.copy_context() for _ in paths]
+    with ThreadPoolExecutor(max_workers=_piece_workers(extractor, len(paths))) as pool:
+        results = list(pool.map(
+            lambda context, path: context.run(extractor.extract, path, template_content, None, cache, usage, None),
+            contexts, paths
+        ))
+    return _stitch(pieces, results)
+
+
+async def extract_page_async(
+    image_path: Path,
+    template_content: str,
+    options: ParseOptions,
+    image_bytes: bytes = None,
+    cache: Optional[ExtractionCache] = None,
+    usage: Optional[TokenUsage] = None,
+    extractor: Optional[Extractor] = None
+) -> tuple[str, Optional[str]]:
+    """
+    Async version of extract_page.
+
+    Claude and Ollama use their async clients; local TrOCR runs in a
+    worker thread.
+
+    Args:
+        Same as extract_page
+
+    Returns:
+        Tuple of (extracted_text, generated_tags)
+
+    Raises:
+        ValueError: If the model is unknown
+    """
+    if extractor is None:
+        with open_extractor(options) as extractor:
+            return await extract_page_async(
+                image_path, template_content, options, image_bytes, cache, usage, extractor
+            )
+
+    pieces = await asyncio.to_thread(page_pieces, image_path, options)
+    paths = [path for bands in pieces for path in bands]
+    if len(paths) == 1:
+        return await extractor.extract_async(paths[0], template_content, image_bytes, cache, usage)
+
+    limit = asyncio.Semaphore(_piece_workers(extractor, len(paths)))
+
+    async def extract_piece(path: Path) -> Extraction:
+        async with limit:
+            return await extractor.extract_async(path, template_content, None, cache, usage)
+
+    results = await asyncio.gather(*(extract_piece(path) for path in paths))
+    return _stitch(pieces, results)
+
+
+@contextmanager
+def open_extractor(options: ParseOptions) -> Iterator[Extractor]:
+    """
+    Create and open the backend for options.model, closing it on exit.
+
+    Raises:
+        ValueError: If the model is unknown
+    """
+    extractor = create_extractor(options)
+    extractor.open()
+    try:
+        yield extractor
+    finally:
+        extractor.close()
+
+
+def write_note(
+    engine: TemplateEngine,
+    image_path: Path,
+    output_path: Path,
+    extracted_text: str,
+    generated_tags: Union[str, list[str], None] = None,
+    source: Optional[str] = None,
+    options: Optional[ParseOptions] = None,
+    timings: Optional[dict] = None
+) -> dict:
+    """
+    Render extracted text through the template and write the markdown note.
+
+    Args:
+        engine: Template engine to render with
+        image_path: Path to source image
+        output_path: Markdown file to write
+        extracted_text: Text returned by the extraction backend
+        generated_tags: Optional AI-generated tags
+        source: Optional custom source description
+        options: Settings the text was extracted with; if given (and
+            options.sidecar is set) the extraction is saved in a sidecar
+            next to the note
+        timings: Optional seconds per step, saved in the sidecar
+
+    Returns:
+        Template variables used for rendering
+    """
+    template_vars = format_for_template(extracted_text, image_path, generated_tags, source)
+    note = engine.render(**template_vars)
+
+    with span("write"):
+        output_path.write_text(note)
+        if options is not None and options.sidecar:
+            write_sidecar(output_path, NoteRecord(
+                image=str(image_path.resolve()),
+                extracted_text=extracted_text,
+                generated_tags=generated_tags,
+                source=source,
+                date=template_vars["date"],
+                backend=options.model,
+                model=backend_model(options),
+                prompt=options.prompt,
+                template=str(engine.template_path.resolve()),
+                timings=timings or {},
+            ))
+    return template_vars
+
+
+class NoteWriter:
+    """Re-renders a note on disk while its text is still streaming in."""
+
+    def __init__(
+        self,
+        engine: TemplateEngine,
+        image_path: Path,
+        output_path: Path,
+        source: Optional[str] = None,
+        min_interval: float = 0.25
+    ):
+        """
+        Args:
+            engine: Template engine to render with
+            image_path: Path to source image
+            output_path: Markdown file to write
+            source: Optional custom source description
+            min_interval: Minimum seconds between rewrites of the file
+        """
+        self.engine = engine
+        self.image_path = image_path
+        self.output_path = output_path
+        self.source = source
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def __call__(self, text: str) -> None:
+        """Write the partial note, at most once per min_interval."""
+        now = time.monotonic()
+        if now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        write_note(self.engine, self.image_path, self.output_path, text, source=self.source)
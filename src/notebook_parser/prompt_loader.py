@@ -1,9 +1,41 @@
 """
 Prompt loading and management for different extraction tasks.
+
+Prompts are read once and kept in memory; a changed file (by mtime) is
+read again. The request prefix a backend sends (prompt followed by the
+template as context) is composed once per prompt and template pair
+instead of once per page.
 """
 
+import os
+import re
+import threading
+from functools import lru_cache
 from pathlib import Path
 
+# Placeholders a prompt must contain to be usable
+PROMPT_FIELDS = {
+    "bullet-points-with-tags": ("{tags}",),
+}
+
+TEMPLATE_CONTEXT = """
+
+The extracted text will be used to fill this template:
+
+"""
+
+_cache: dict[str, tuple[tuple[int, int], str]] = {}
+_cache_lock = threading.Lock()
+
+
+def _validate(prompt_name: str, prompt: str) -> None:
+    """Raise ValueError if a prompt can't be used."""
+    if not prompt:
+        raise ValueError(f"Prompt '{prompt_name}' is empty")
+    for field in PROMPT_FIELDS.get(prompt_name, ()):
+        if field not in prompt:
+            raise ValueError(f"Prompt '{prompt_name}' must contain {field}")
+
 
 class PromptLoader:
     """Loads prompts from the prompts directory."""
@@ -20,6 +52,9 @@ class PromptLoader:
         """
         Load a prompt from the prompts directory.
 
+        The prompt is cached in memory and only read again once the file's
+        modification time or size changes.
+
         Args:
             prompt_name: Name of the prompt file (without .txt extension)
 
@@ -28,14 +63,47 @@ class PromptLoader:
 
         Raises:
             FileNotFoundError: If prompt file doesn't exist
+            ValueError: If the prompt is empty or lacks a required placeholder
         """
         prompts_dir = PromptLoader.get_prompts_dir()
-        prompt_path = prompts_dir / f"{prompt_name}.txt"
+        prompt_path = os.path.join(prompts_dir, f"{prompt_name}.txt")
 
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt not found: {prompt_path}")
+        try:
+            stat = os.stat(prompt_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt not found: {prompt_path}") from None
+        version = (stat.st_mtime_ns, stat.st_size)
 
-        return prompt_path.read_text().strip()
+        with _cache_lock:
+            cached = _cache.get(prompt_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        prompt = Path(prompt_path).read_text().strip()
+        _validate(prompt_name, prompt)
+        with _cache_lock:
+            _cache[prompt_path] = (version, prompt)
+        return prompt
+
+    @staticmethod
+    def load_all() -> dict[str, str]:
+        """
+        Load and validate every prompt in the prompts directory.
+
+        Backends call this when they open, so a broken prompt fails the
+        run before the first page and later pages are served from memory.
+
+        Returns:
+            Prompt content by name
+
+        Raises:
+            ValueError: If a prompt is empty or lacks a required placeholder
+        """
+        prompts_dir = PromptLoader.get_prompts_dir()
+        return {
+            path.stem: PromptLoader.load_prompt(path.stem)
+            for path in sorted(prompts_dir.glob("*.txt"))
+        }
 
     @staticmethod
     def get_default_prompt() -> str:
@@ -52,3 +120,67 @@ Instructions:
 5. If text is unclear, make your best attempt
 
 Return the extracted text:"""
+
+
+@lru_cache(maxsize=64)
+def compose_prompt(prompt: str, template_content: str) -> str:
+    """
+    Prompt followed by the template the extracted text will fill.
+
+    Cached per (prompt, template) pair, so every page of a run reuses
+    the same string.
+
+    Args:
+        prompt: Extraction instructions
+        template_content: Template the output will be inserted into
+
+    Returns:
+        The full prompt text
+    """
+    return prompt + TEMPLATE_CONTEXT + template_content
+
+
+@lru_cache(maxsize=64)
+def _tags_segments(prompt: str, template_content: str) -> tuple[str, ...]:
+    """compose_prompt split at the prompt's {tags} placeholders."""
+    segments = prompt.split("{tags}")
+    segments[-1] = compose_prompt(segments[-1], template_content)
+    return tuple(segments)
+
+
+@lru_cache(maxsize=64)
+def split_tags_prompt(prompt: str) -> tuple[str, str]:
+    """
+    Split a prompt into the part every page shares and its {tags} lines.
+
+    Lets the shared part be sent as a cacheable prefix, with the page's
+    tags filled into the lines that follow it.
+
+    Args:
+        prompt: Extraction instructions containing {tags}
+
+    Returns:
+        Tuple of (prompt without the {tags} lines, those lines)
+    """
+    shared, tagged = [], []
+    for line in prompt.splitlines():
+        (tagged if "{tags}" in line else shared).append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(shared)).strip(), "\n".join(tagged)
+
+
+def compose_prompt_with_tags(prompt: str, template_content: str, tags: str) -> str:
+    """
+    compose_prompt with the prompt's {tags} placeholders filled in.
+
+    Only the prompt is searched for {tags}, never the template. The split
+    is cached, so each page only joins its tags in.
+
+    Args:
+        prompt: Extraction instructions containing {tags}
+        template_content: Template the output will be inserted into
+        tags: Tags generated for this page
+
+    Returns:
+        The full prompt text
+    """
+    return tags.join(_tags_segments(prompt, template_content))
@@ -0,0 +1,400 @@
+"""
+Local HTTP service for converting images to markdown notes.
+
+`notebook-parser serve` keeps backends open for the life of the
+process, so the TrOCR model, API clients, prompts and the template are
+loaded once instead of per request. Concurrent local OCR requests are
+coalesced: each page is preprocessed and segmented on its own request
+thread, and the line images of all waiting pages are recognized in
+shared batches (see ocr.LineBatcher).
+
+Endpoints:
+
+    POST /parse     Image bytes in the body. Query parameters: filename
+                    (sets the note title), source, model. Returns JSON
+                    with the markdown note, title, tags and timings.
+    GET  /metrics   Queue depth, request counts and latency percentiles.
+    GET  /health    Backends that are open.
+
+Requests beyond `workers` wait in a queue of at most `max_queue`; when
+it is full the request is rejected with 429 and a Retry-After header,
+so callers back off instead of piling up.
+"""
+
+import io
+import json
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import replace
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, UnidentifiedImageError
+
+from .cache import ExtractionCache
+from .extractors import LocalExtractor, available_extractors, create_extractor
+from .formatters import format_for_template
+from .llm.usage import TokenUsage
+from .ocr import LineBatcher, join_lines, read_lines, recognize_lines
+from .pipeline import ParseOptions, extract_page
+from .telemetry import percentile
+from .template_engine import TemplateEngine
+
+# Latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 1000
+# Seconds clients are told to wait after a 429
+RETRY_AFTER = 1
+
+
+class QueueFull(Exception):
+    """Raised when a request arrives while the queue is at capacity."""
+
+
+class BadRequest(ValueError):
+    """Raised for requests the client has to fix: an unknown model or an undecodable image."""
+
+
+class BatchedLocalExtractor(LocalExtractor):
+    """
+    TrOCR that recognizes the lines of concurrent pages in shared batches.
+
+    Pages are prepared in parallel on the callers' threads; only the
+    batcher's thread runs the model.
+    """
+
+    max_concurrency = None
+
+    def __init__(self, options: ParseOptions, batch_lines: int = 64, batch_wait: float = 0.02):
+        super().__init__(options)
+        self.batch_lines = batch_lines
+        self.batch_wait = batch_wait
+        self.batcher = None
+
+    def open(self) -> None:
+        super().open()
+        processor, ocr_model = self._model
+        self.batcher = LineBatcher(
+            partial(recognize_lines, processor=processor, ocr_model=ocr_model, batch_size=self.options.batch_size),
+            max_lines=self.batch_lines,
+            max_wait=self.batch_wait,
+        )
+        self.batcher.start()
+
+    def close(self) -> None:
+        if self.batcher is not None:
+            self.batcher.close()
+        super().close()
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        lines = read_lines(
+            image_path,
+            preprocess=self.options.preprocess,
+            segment=self.options.segment,
+            preprocess_profile=self.options.preprocess_profile,
+            cv_threads=self.options.cv_threads,
+        )
+        return join_lines(self.batcher.recognize(lines)), None
+
+
+class NoteService:
+    """Parses uploaded images with warm backends; shared by the HTTP handler threads."""
+
+    def __init__(
+        self,
+        template_path: Path,
+        options: ParseOptions,
+        workers: int = 4,
+        max_queue: int = 32,
+        cache: Optional[ExtractionCache] = None,
+        batch_lines: int = 64,
+        batch_wait: float = 0.02
+    ):
+        """
+        Args:
+            template_path: Template used for every note
+            options: Extraction settings; options.model is the default backend
+            workers: Requests extracted at once (local OCR is coalesced instead)
+            max_queue: Requests allowed to wait for a worker before 429s
+            cache: Optional extraction cache for the LLM backends
+            batch_lines: Local OCR: stop coalescing once a batch has this many lines
+            batch_wait: Local OCR: seconds to wait for more pages to join a batch
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue can't be negative")
+
+        self.engine = TemplateEngine(template_path)
+        self.options = options
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache = cache
+        self.batch_lines = batch_lines
+        self.batch_wait = batch_wait
+        self.usage = TokenUsage()
+
+        self._extractors = {}
+        self._extractors_lock = threading.Lock()
+        self._slots = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._counts = {"completed": 0, "failed": 0, "rejected": 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._queue_waits = deque(maxlen=LATENCY_WINDOW)
+        self._started = time.time()
+
+    def open(self) -> None:
+        """Open the default backend so the first request doesn't pay for it."""
+        self.extractor(self.options.model)
+
+    def close(self) -> None:
+        """Close every open backend."""
+        with self._extractors_lock:
+            extractors, self._extractors = self._extractors, {}
+        for extractor in extractors.values():
+            extractor.close()
+
+    def extractor(self, model: str):
+        """
+        The open backend for a model, opening it on first use.
+
+        Raises:
+            ValueError: If the model is unknown
+        """
+        with self._extractors_lock:
+            if model not in self._extractors:
+                options = replace(self.options, model=model)
+                if model == LocalExtractor.name:
+                    extractor = BatchedLocalExtractor(options, self.batch_lines, self.batch_wait)
+                else:
+                    extractor = create_extractor(options)
+                extractor.open()
+                self._extractors[model] = extractor
+            return self._extractors[model]
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._waiting + self._running >= self.workers + self.max_queue:
+                self._counts["rejected"] += 1
+                raise QueueFull(f"{self._waiting} requests already waiting")
+            self._waiting += 1
+
+    def parse(
+        self,
+        image_bytes: bytes,
+        filename: str = "page.jpg",
+        model: Optional[str] = None,
+        source: Optional[str] = None
+    ) -> dict:
+        """
+        Convert one image to a markdown note.
+
+        Args:
+            image_bytes: Encoded image
+            filename: Original file name; sets the note title and default source
+            model: Backend to use (default: the service's model)
+            source: Optional custom source description
+
+        Returns:
+            Dict with markdown, title, tags, model and timings in seconds
+
+        Raises:
+            QueueFull: If max_queue requests are already waiting
+            BadRequest: If the model is unknown or the image can't be decoded
+        """
+        model = model or self.options.model
+        if model not in available_extractors():
+            raise BadRequest(f"Unknown model '{model}'")
+        try:
+            # Reads the header only; the backend decodes the pixels later
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise BadRequest(f"Can't decode the image: {e}") from e
+
+        arrived = time.perf_counter()
+        self._admit()
+        try:
+            self._slots.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+        started = time.perf_counter()
+
+        try:
+            extractor = self.extractor(model)
+            options = replace(self.options, model=model)
+            with tempfile.TemporaryDirectory(prefix="notebook-parser-") as directory:
+                image_path = Path(directory) / (Path(filename).name or "page.jpg")
+                image_path.write_bytes(image_bytes)
+                extracted_text, generated_tags = extract_page(
+                    image_path, self.engine.template_content, options,
+                    cache=self.cache, usage=self.usage, extractor=extractor
+                )
+                template_vars = format_for_template(extracted_text, image_path, generated_tags, source)
+            markdown = self.engine.render(**template_vars)
+        except Exception:
+            with self._lock:
+                self._counts["failed"] += 1
+            raise
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._running -= 1
+
+        finished = time.perf_counter()
+        with self._lock:
+            self._counts["completed"] += 1
+            self._latencies.append(finished - arrived)
+            self._queue_waits.append(started - arrived)
+
+        return {
+            "markdown": markdown,
+            "title": template_vars["title"],
+            "tags": template_vars["tags"],
+            "model": model,
+            "queue_seconds": round(started - arrived, 4),
+            "seconds": round(finished - arrived, 4),
+        }
+
+    def metrics(self) -> dict:
+        """Queue depth, request counts, latency percentiles and OCR batching."""
+        with self._lock:
+            latencies = list(self._latencies)
+            queue_waits = list(self._queue_waits)
+            metrics = {
+                "uptime_seconds": round(time.time() - self._started, 1),
+                "queue_depth": self._waiting,
+                "in_flight": self._running,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                **self._counts,
+            }
+        metrics["latency_seconds"] = {
+            f"p{percent}": percentile(latencies, percent) for percent in (50, 95, 99)
+        }
+        metrics["queue_seconds"] = {
+            f"p{percent}": percentile(queue_waits, percent) for percent in (50, 95, 99)
+        }
+
+        with self._extractors_lock:
+            local = self._extractors.get(LocalExtractor.name)
+        if isinstance(local, BatchedLocalExtractor) and local.batcher is not None:
+            metrics["ocr_batching"] = local.batcher.stats()
+        if self.usage.requests:
+            metrics["tokens"] = self.usage.summary()
+        return metrics
+
+    def models(self) -> list[str]:
+        """Backends that are open."""
+        with self._extractors_lock:
+            return list(self._extractors)
+
+
+class NoteRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the server's NoteService."""
+
+    server_version = "notebook-parser"
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "models": service.models()})
+        elif path == "/metrics":
+            self._send_json(200, service.metrics())
+        else:
+            self._send_json(404, {"error": f"Unknown path '{path}'"})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != "/parse":
+            self._send_json(404, {"error": f"Unknown path '{url.path}'"})
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self._send_json(411, {"error": "Content-Length required"})
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        # A negative length would read until the client closes the connection
+        if length < 0:
+            self._send_json(400, {"error": "Invalid Content-Length"})
+            return
+        if length > self.server.max_upload:
+            self._send_json(413, {"error": f"Image larger than {self.server.max_upload} bytes"})
+            return
+        image_bytes = self.rfile.read(length)
+        if not image_bytes:
+            self._send_json(400, {"error": "Empty body; send the image bytes"})
+            return
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            note = service.parse(
+                image_bytes,
+                filename=query.get("filename", "page.jpg"),
+                model=query.get("model"),
+                source=query.get("source"),
+            )
+        except QueueFull as e:
+            self._send_json(429, {"error": f"Queue full: {e}"}, headers={"Retry-After": str(RETRY_AFTER)})
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:  # Backend or configuration errors, e.g. a missing API key
+            self._send_json(500, {"error": str(e)})
+        else:
+            self._send_json(200, note)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(
+    service: NoteService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    max_upload_mb: int = 25,
+    verbose: bool = False
+) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server for a service (call serve_forever() to run it).
+
+    Args:
+        service: Open note service
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+        max_upload_mb: Largest accepted image
+        verbose: Log every request to stderr
+
+    Returns:
+        The bound server; each request runs on its own thread
+    """
+    server = ThreadingHTTPServer((host, port), NoteRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload = max_upload_mb * 1024 * 1024
+    server.verbose = verbose
+    return server
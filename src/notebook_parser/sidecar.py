@@ -0,0 +1,123 @@
+"""
+JSON sidecars that keep the raw extraction next to each note.
+
+Rendering throws away the backend's output: the note only holds the text
+as the template placed it. Each written note therefore gets a sidecar
+(`note.md` -> `note.extraction.json`) with the extracted text, tags,
+backend, model, timings and the note's date. `notebook-parser rerender`
+rebuilds notes from sidecars with a new template or new formatting
+defaults, without calling a model again.
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from .pipeline import ParseOptions
+
+SIDECAR_SUFFIX = ".extraction.json"
+# Bumped when the fields change incompatibly
+SIDECAR_VERSION = 1
+
+
+@dataclass
+class NoteRecord:
+    """Everything needed to render a note again."""
+
+    image: str
+    extracted_text: str
+    # As returned by the backend: a list, a "#a #b" string or None
+    generated_tags: Union[str, list[str], None]
+    source: Optional[str]
+    # Date the note was first written, kept on re-render
+    date: str
+    backend: str
+    model: Optional[str] = None
+    prompt: Optional[str] = None
+    template: Optional[str] = None
+    # Seconds per step, e.g. {"extract": 2.31}
+    timings: dict = field(default_factory=dict)
+    created: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
+def sidecar_path(output_path: Path) -> Path:
+    """Sidecar for a note: `note.md` -> `note.extraction.json`."""
+    return output_path.with_name(output_path.stem + SIDECAR_SUFFIX)
+
+
+def note_path(sidecar: Path) -> Path:
+    """Note a sidecar belongs to: `note.extraction.json` -> `note.md`."""
+    return sidecar.with_name(sidecar.name[:-len(SIDECAR_SUFFIX)] + ".md")
+
+
+def backend_model(options: "ParseOptions") -> Optional[str]:
+    """Model the backend of options.model runs, or None for plugin backends."""
+    if options.model == "claude":
+        from .llm.claude_vision import CLAUDE_MODEL
+        return CLAUDE_MODEL
+    if options.model == "ollama":
+        return options.ollama_model
+    if options.model == "local":
+        return options.trocr_model
+    return None
+
+
+def write_sidecar(output_path: Path, record: NoteRecord) -> Path:
+    """
+    Save a note's record next to it, atomically.
+
+    Args:
+        output_path: Markdown note the record belongs to
+        record: Extraction to save
+
+    Returns:
+        Path of the sidecar
+    """
+    path = sidecar_path(output_path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".sidecar-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": SIDECAR_VERSION, **asdict(record)}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def read_sidecar(path: Path) -> NoteRecord:
+    """
+    Load a sidecar.
+
+    Raises:
+        ValueError: If the file isn't a sidecar this version can read
+    """
+    try:
+        data = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid sidecar {path.name}: {e}") from e
+    if not isinstance(data, dict) or data.get("version") != SIDECAR_VERSION:
+        raise ValueError(f"Unsupported sidecar version in {path.name}")
+
+    known = {f.name for f in fields(NoteRecord)}
+    try:
+        return NoteRecord(**{key: value for key, value in data.items() if key in known})
+    except TypeError as e:
+        raise ValueError(f"Incomplete sidecar {path.name}: {e}") from e
+
+
+def find_sidecars(directory: Path, recursive: bool = False) -> list[Path]:
+    """
+    Sidecars in a directory, sorted by path.
+
+    Args:
+        directory: Directory of notes
+        recursive: Also search subdirectories
+    """
+    pattern = f"**/*{SIDECAR_SUFFIX}" if recursive else f"*{SIDECAR_SUFFIX}"
+    return sorted(path for path in directory.glob(pattern) if path.is_file())
@@ -0,0 +1,307 @@
+"""
+Per-page timing spans, usage counters and a metrics store.
+
+Code doing a distinct stage of work wraps it in `span("name")`:
+decode, encode and base64 in image optimization, preprocessing steps,
+segment and recognize for TrOCR, request for the LLM backends, render
+and write for the note. Spans land in the trace of the page being
+processed, found through a context variable, so nothing is threaded
+through the call chain. Outside a trace a span costs one lookup.
+Backends add counters the same way: Claude token usage and Ollama's
+eval counts and durations.
+
+Finished traces are stored one row per page in a SQLite file in the
+cache directory; `notebook-parser stats` summarizes them per backend.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from .cache import get_cache_dir
+
+if TYPE_CHECKING:
+    from .pipeline import ParseOptions
+
+# Fields of an Ollama /api/generate response worth keeping; durations are nanoseconds
+OLLAMA_COUNTERS = ("prompt_eval_count", "eval_count")
+OLLAMA_DURATIONS = ("load_duration", "prompt_eval_duration", "eval_duration")
+
+# Pages kept in the metrics store; older rows are dropped as new ones arrive
+DEFAULT_MAX_PAGES = 50_000
+
+
+class Trace:
+    """Span durations and counters collected for one page (thread-safe)."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans: dict[str, float] = {}
+        self.counters: dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self) -> float:
+        """Time from the start of the trace to its end (or now, while open)."""
+        if self._seconds is not None:
+            return self._seconds
+        return time.perf_counter() - self._start
+
+    def add_span(self, name: str, seconds: float) -> None:
+        """Add time to a stage; repeated stages (e.g. tiles) accumulate."""
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add(self, name: str, value: float) -> None:
+        """Add to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self) -> None:
+        self._seconds = time.perf_counter() - self._start
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("notebook_parser_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Collect the spans and counters of the code run inside, e.g. one page."""
+    page_trace = Trace()
+    token = _current.set(page_trace)
+    try:
+        yield page_trace
+    finally:
+        page_trace.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage of work into the current trace, if any."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_span(name, time.perf_counter() - start)
+
+
+def add_spans(timings: dict) -> None:
+    """Add stages timed elsewhere (seconds by name) to the current trace."""
+    current = _current.get()
+    if current is not None:
+        for name, seconds in timings.items():
+            current.add_span(name, seconds)
+
+
+def count(**values: float) -> None:
+    """Add to counters of the current trace, e.g. count(input_tokens=812)."""
+    current = _current.get()
+    if current is not None:
+        for name, value in values.items():
+            current.add(name, value)
+
+
+def count_ollama(result: dict) -> None:
+    """Record the token counts and durations of an Ollama response."""
+    current = _current.get()
+    if current is None:
+        return
+    for name in OLLAMA_COUNTERS:
+        if result.get(name):
+            current.add(name, result[name])
+    for name in OLLAMA_DURATIONS:
+        if result.get(name):
+            current.add(name, result[name] / 1e9)
+
+
+def percentile(values: list[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile, or None without values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return round(ordered[index], 4)
+
+
+@dataclass
+class BackendStats:
+    """Latency and throughput of one backend over the recorded pages."""
+
+    backend: str
+    pages: int
+    failed: int
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+    # Pages finished per minute of wall time, summed over runs
+    pages_per_minute: Optional[float]
+    # Median seconds per stage, over the pages that ran it
+    stages: dict[str, float] = field(default_factory=dict)
+    # Counter totals, e.g. tokens
+    counters: dict[str, float] = field(default_factory=dict)
+
+
+class MetricsStore:
+    """SQLite record of page traces, one row per page, keeping the most recent pages."""
+
+    def __init__(self, path: Optional[Path] = None, max_pages: int = DEFAULT_MAX_PAGES):
+        """
+        Args:
+            path: SQLite file (default: <cache dir>/metrics.sqlite3)
+            max_pages: Pages kept before the oldest are deleted
+        """
+        self.path = path if path is not None else get_cache_dir() / "metrics.sqlite3"
+        self.max_pages = max_pages
+        # Pages recorded by this process belong to one run
+        self.run = uuid.uuid4().hex
+
+    @contextmanager
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    run TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    model TEXT,
+                    image TEXT NOT NULL,
+                    error TEXT,
+                    started REAL NOT NULL,
+                    seconds REAL NOT NULL,
+                    spans TEXT NOT NULL,
+                    counters TEXT NOT NULL
+                )
+                """
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(
+        self,
+        page_trace: Trace,
+        options: "ParseOptions",
+        image_path: Path,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Store a finished page.
+
+        Metrics are best effort: a database error never fails the page.
+        """
+        from .sidecar import backend_model
+
+        row = (
+            self.run, options.model, backend_model(options), str(image_path), error,
+            page_trace.started, round(page_trace.seconds, 4),
+            json.dumps({name: round(seconds, 4) for name, seconds in page_trace.spans.items()}),
+            json.dumps(page_trace.counters),
+        )
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                # Rowids grow with each insert, so this drops the oldest pages over the cap
+                conn.execute("DELETE FROM pages WHERE rowid <= ?", (cursor.lastrowid - self.max_pages,))
+        except sqlite3.Error:
+            pass
+
+    def summary(self, backend: Optional[str] = None) -> list[BackendStats]:
+        """
+        Per-backend latency percentiles, throughput, stage medians and counter totals.
+
+        Args:
+            backend: Only summarize this backend
+
+        Returns:
+            Stats sorted by backend name
+        """
+        query = "SELECT run, backend, error, started, seconds, spans, counters FROM pages"
+        params: tuple = ()
+        if backend is not None:
+            query += " WHERE backend = ?"
+            params = (backend,)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        by_backend: dict[str, list] = {}
+        for row in rows:
+            by_backend.setdefault(row[1], []).append(row)
+        return [self._stats(name, by_backend[name]) for name in sorted(by_backend)]
+
+    @staticmethod
+    def _stats(backend: str, rows: list) -> BackendStats:
+        succeeded = [row for row in rows if row[2] is None]
+        latencies = [row[4] for row in succeeded]
+
+        # Wall time per run: first page started to last page finished
+        runs: dict[str, tuple[float, float]] = {}
+        for run, _, _, started, seconds, _, _ in rows:
+            first, last = runs.get(run, (started, started + seconds))
+            runs[run] = (min(first, started), max(last, started + seconds))
+        wall = sum(last - first for first, last in runs.values())
+
+        stage_times: dict[str, list[float]] = {}
+        counters: dict[str, float] = {}
+        for row in succeeded:
+            for name, seconds in json.loads(row[5]).items():
+                stage_times.setdefault(name, []).append(seconds)
+            for name, value in json.loads(row[6]).items():
+                counters[name] = counters.get(name, 0) + value
+
+        return BackendStats(
+            backend=backend,
+            pages=len(rows),
+            failed=len(rows) - len(succeeded),
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+            pages_per_minute=round(len(succeeded) / wall * 60, 2) if wall > 0 and succeeded else None,
+            stages={name: percentile(times, 50) for name, times in stage_times.items()},
+            counters=counters,
+        )
+
+    def clear(self) -> int:
+        """Delete every recorded page; returns how many there were."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM pages").rowcount
+
+
+@contextmanager
+def profiled(path: Optional[Path]) -> Iterator[None]:
+    """
+    Run the code inside under cProfile and dump the stats to path.
+
+    Does nothing without a path. On Python 3.12 and later the profile
+    includes worker threads; earlier versions only see the calling thread.
+    """
+    if path is None:
+        yield
+        return
+
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(path))
@@ -1,49 +1,135 @@
 """
 Template loading and rendering for markdown notes.
+
+Templates are compiled once into alternating literal text and
+placeholder names, and rendered with a single join. Compiled templates
+are cached by path and modification time, so creating an engine for an
+unchanged template doesn't read the file again.
 """
 
-from pathlib import Path
-from datetime import datetime
+import os
 import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Collection, NamedTuple, Optional
+
+from .telemetry import span
+
+# {{name}} placeholders; anything else in braces is left alone
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+# Compiled templates kept in memory
+MAX_CACHED_TEMPLATES = 64
+
+
+class CompiledTemplate(NamedTuple):
+    """Template split at its placeholders: literals[i], names[i], ..., literals[-1]."""
+
+    literals: tuple[str, ...]
+    names: tuple[str, ...]
+
+
+def compile_template(content: str) -> CompiledTemplate:
+    """
+    Split template text at its {{name}} placeholders.
+
+    Args:
+        content: Template text
+
+    Returns:
+        Literal segments and the placeholder names between them
+    """
+    parts = PLACEHOLDER.split(content)
+    return CompiledTemplate(tuple(parts[0::2]), tuple(parts[1::2]))
+
+
+_cache: "OrderedDict[str, tuple[tuple[int, int], str, CompiledTemplate]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_template(template_path: Path) -> tuple[str, CompiledTemplate]:
+    """
+    Read and compile a template, reusing the cached result while the file is unchanged.
+
+    Args:
+        template_path: Path to the markdown template file
+
+    Returns:
+        Tuple of (template text, compiled template)
+
+    Raises:
+        FileNotFoundError: If template file doesn't exist
+    """
+    # One stat per call; abspath only looks up the working directory for relative paths
+    key = os.path.abspath(template_path)
+    try:
+        stat = os.stat(key)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Template not found: {template_path}") from None
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1], cached[2]
+
+    content = Path(key).read_text()
+    compiled = compile_template(content)
+    with _cache_lock:
+        _cache[key] = (version, content, compiled)
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_TEMPLATES:
+            _cache.popitem(last=False)
+    return content, compiled
 
 
 class TemplateEngine:
     """Simple template engine for markdown note generation."""
 
-    def __init__(self, template_path: Path):
+    def __init__(self, template_path: Path, variables: Optional[Collection[str]] = None):
         """
         Initialize template engine with a template file.
 
         Args:
             template_path: Path to the markdown template file
+            variables: Names render() will be given. Placeholders outside
+                this set are listed in unknown_placeholders (default: no check)
 
         Raises:
             FileNotFoundError: If template file doesn't exist
         """
-        if not template_path.exists():
-            raise FileNotFoundError(f"Template not found: {template_path}")
-
         self.template_path = template_path
-        self.template_content = template_path.read_text()
+        self.template_content, self._compiled = load_template(template_path)
+        self.unknown_placeholders = (
+            sorted(set(self._compiled.names) - set(variables)) if variables is not None else []
+        )
+
+    @property
+    def placeholders(self) -> frozenset[str]:
+        """Names of the template's {{name}} placeholders."""
+        return frozenset(self._compiled.names)
 
     def render(self, **kwargs) -> str:
         """
         Render template with provided values.
 
+        Placeholders without a value are left as they are, and values
+        without a placeholder are ignored.
+
         Args:
             **kwargs: Key-value pairs to replace in template
 
         Returns:
             Rendered template as string
         """
-        result = self.template_content
-
-        # Replace all {{variable}} placeholders
-        for key, value in kwargs.items():
-            placeholder = f"{{{{{key}}}}}"
-            result = result.replace(placeholder, str(value))
-
-        return result
+        with span("render"):
+            literals, names = self._compiled
+            parts = [literals[0]]
+            for name, literal in zip(names, literals[1:]):
+                parts.append(str(kwargs[name]) if name in kwargs else f"{{{{{name}}}}}")
+                parts.append(literal)
+            return "".join(parts)
 
     @staticmethod
     def get_default_template() -> Path:
@@ -0,0 +1,230 @@
+"""
+Spread splitting and overlapping tiles for dense pages.
+
+Vision backends clamp images to a max size (1024px for Ollama), so an
+open-notebook spread or a dense page is squashed before the model sees
+it. Splitting the spread at the gutter and cutting each page into
+overlapping horizontal bands sends every piece at a larger scale. The
+pieces are extracted in parallel and their texts stitched back in
+reading order: left page before right page, top band before bottom
+band.
+
+Bands span the full page width so no line of writing is cut sideways.
+They overlap by TILE_OVERLAP of a band, so every line is whole in at
+least one band; lines read twice are dropped when stitching.
+
+OpenCV and NumPy are imported inside the functions that use them.
+"""
+
+import re
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Optional, Union
+
+from PIL import Image
+
+# Largest dimension photos are decoded at before splitting; pieces are
+# then resized by the backend, so this keeps 12 MP photos at full size
+SPLIT_MAX_SIZE = 4096
+PIECE_QUALITY = 95
+
+# Share of each band repeated in the next one
+TILE_OVERLAP = 0.15
+
+# Spreads are wider than tall; only then is a gutter looked for
+MIN_SPREAD_ASPECT = 1.1
+# The gutter is searched in this central share of the width
+GUTTER_BAND = 0.2
+# A shadowed gutter is at least this much darker than the page on either side
+MIN_GUTTER_DEPTH = 0.08
+# An unshadowed gutter is an ink-free gap at least this share of the width
+MIN_GUTTER_GAP = 0.02
+
+# Lines compared when looking for text repeated across an overlap
+MAX_OVERLAP_LINES = 8
+# Two lines are the same when at least this similar
+LINE_SIMILARITY = 0.8
+
+
+def find_gutter(gray) -> Optional[int]:
+    """
+    Find the fold between the two pages of a spread.
+
+    The gutter is either a shadow (the darkest column near the center,
+    clearly darker than the pages) or, on flat scans, the widest
+    ink-free gap near the center.
+
+    Args:
+        gray: Grayscale image as a NumPy array
+
+    Returns:
+        Column of the gutter, or None if the image doesn't look like a spread
+    """
+    import cv2
+    import numpy as np
+
+    height, width = gray.shape
+    if width < MIN_SPREAD_ASPECT * height:
+        return None
+
+    start = int(width * (0.5 - GUTTER_BAND / 2))
+    end = int(width * (0.5 + GUTTER_BAND / 2))
+
+    # Shadow: a dip in the column brightness profile
+    kernel = max(1, width // 200)
+    brightness = np.convolve(gray.mean(axis=0), np.ones(kernel) / kernel, mode="same")
+    darkest = start + int(np.argmin(brightness[start:end]))
+    # A valley, not just the darker of two differently lit pages
+    sides = min(brightness[start], brightness[end - 1])
+    if brightness[darkest] < (1 - MIN_GUTTER_DEPTH) * sides:
+        return darkest
+
+    # Flat scan: the widest run of columns without ink
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, max(15, (height // 40) | 1), 15
+    )
+    blank = binary[:, start:end].sum(axis=0) == 0
+    best_start, best_length, run_start = 0, 0, None
+    for x, is_blank in enumerate(np.append(blank, False)):
+        if is_blank and run_start is None:
+            run_start = x
+        elif not is_blank and run_start is not None:
+            if x - run_start > best_length:
+                best_start, best_length = run_start, x - run_start
+            run_start = None
+    if best_length >= MIN_GUTTER_GAP * width:
+        return start + best_start + best_length // 2
+    return None
+
+
+def tile_bands(height: int, tiles: int, overlap: float = TILE_OVERLAP) -> list[tuple[int, int]]:
+    """
+    Split a height into overlapping bands.
+
+    Args:
+        height: Height of the page in pixels
+        tiles: Number of bands
+        overlap: Share of a band repeated in the next one
+
+    Returns:
+        (top, bottom) rows of each band, top to bottom
+    """
+    if tiles <= 1:
+        return [(0, height)]
+    # n bands of height b overlapping by overlap * b cover b * (n - (n - 1) * overlap)
+    band = height / (tiles - (tiles - 1) * overlap)
+    step = band * (1 - overlap)
+    return [(round(i * step), min(height, round(i * step + band))) for i in range(tiles)]
+
+
+def split_page(image_path: Path, spread: bool = False, tiles: int = 1) -> list[list[Image.Image]]:
+    """
+    Cut a photo into pieces in reading order.
+
+    Args:
+        image_path: Path to image file
+        spread: Split a two-page spread at its gutter (no-op if none is found)
+        tiles: Overlapping horizontal bands per page
+
+    Returns:
+        For each page (left to right), its RGB bands (top to bottom)
+    """
+    import numpy as np
+
+    from .image_optimizer import load_for_llm
+
+    photo = load_for_llm(image_path, max_size=SPLIT_MAX_SIZE)
+
+    pages = [photo]
+    if spread:
+        gutter = find_gutter(np.asarray(photo.convert("L")))
+        if gutter is not None:
+            pages = [photo.crop((0, 0, gutter, photo.height)), photo.crop((gutter, 0, photo.width, photo.height))]
+
+    return [
+        [page.crop((0, top, page.width, bottom)) for top, bottom in tile_bands(page.height, tiles)]
+        for page in pages
+    ]
+
+
+def _normalize(line: str) -> str:
+    """Line stripped of list markers, case and spacing, for comparison."""
+    line = re.sub(r"^\s*(?:[-*+]|\d+[.)])\s+", "", line)
+    return " ".join(line.lower().split())
+
+
+def _same(a: str, b: str) -> bool:
+    return SequenceMatcher(None, a, b).ratio() >= LINE_SIMILARITY
+
+
+def _repeated_lines(previous: list[str], current: list[str]) -> tuple[int, int]:
+    """
+    Find the lines of current that repeat the end of previous.
+
+    The line cut by a band edge can come out garbled at the end of one
+    band or the start of the next, so one line on either side may be
+    skipped when aligning (the whole copy, from the next band, is kept).
+
+    Returns:
+        (trailing lines to drop from previous, leading lines to drop from current)
+    """
+    tail = [i for i, line in enumerate(previous) if line.strip()][-MAX_OVERLAP_LINES - 1:]
+    head = [i for i, line in enumerate(current) if line.strip()][:MAX_OVERLAP_LINES + 1]
+
+    for count in range(min(len(tail), len(head)), 0, -1):
+        for skip_previous, skip_current in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            # A single line, aligned only by skipping, is too weak a match
+            if (skip_previous or skip_current) and count < 2:
+                continue
+            end = len(tail) - skip_previous
+            if end - count < 0 or skip_current + count > len(head):
+                continue
+            pairs = zip(tail[end - count:end], head[skip_current:skip_current + count])
+            if all(_same(_normalize(previous[i]), _normalize(current[j])) for i, j in pairs):
+                dropped_previous = len(previous) - tail[end - 1] - 1 if skip_previous else 0
+                return dropped_previous, head[skip_current + count - 1] + 1
+    return 0, 0
+
+
+def merge_texts(pages: list[list[str]]) -> str:
+    """
+    Stitch the texts of split pieces in reading order.
+
+    Bands of one page are joined with the lines repeated across each
+    overlap removed; pages are separated by a blank line.
+
+    Args:
+        pages: For each page, the extracted text of its bands
+
+    Returns:
+        The combined text
+    """
+    merged_pages = []
+    for bands in pages:
+        merged: list[str] = []
+        for text in bands:
+            lines = text.strip("\n").splitlines()
+            drop_previous, drop_current = _repeated_lines(merged, lines)
+            merged = merged[:len(merged) - drop_previous] + lines[drop_current:]
+        merged_pages.append("\n".join(merged))
+    return "\n\n".join(page for page in merged_pages if page.strip())
+
+
+def merge_tags(tags: list[Union[str, list[str], None]]) -> Optional[list[str]]:
+    """
+    Combine the tags generated for each piece, keeping first-seen order.
+
+    Args:
+        tags: Tags per piece, as lists, "#a #b" strings or None
+
+    Returns:
+        The distinct tags, or None if no piece had any
+    """
+    merged = []
+    for piece_tags in tags:
+        if not piece_tags:
+            continue
+        for tag in piece_tags.split() if isinstance(piece_tags, str) else piece_tags:
+            if tag not in merged:
+                merged.append(tag)
+    return merged or None
@@ -0,0 +1,412 @@
+"""
+Watch a folder and parse images as they arrive.
+
+New and changed images are fed through the parse pipeline with bounded
+concurrency. The backend is opened once and stays warm for the life of
+the process. A small SQLite state database records the content hash of
+every processed image, so a restart only processes images that are new
+or changed since the last run.
+
+File system events come from watchdog (inotify on Linux, FSEvents on
+macOS) when it is installed, otherwise the folder is polled. Either way,
+a file is only picked up once its size and modification time have been
+stable for a moment, so half-synced photos are not parsed.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .batch import IMAGE_EXTENSIONS, PageResult, find_images, process_page
+from .cache import ExtractionCache, file_digest
+from .llm.usage import TokenUsage
+from .pipeline import ParseOptions, open_extractor
+from .telemetry import MetricsStore
+from .template_engine import TemplateEngine
+
+STATE_FILENAME = ".notebook-parser-watch.sqlite3"
+
+
+@dataclass
+class FileRecord:
+    """What the state database knows about one image."""
+
+    digest: str
+    size: int
+    mtime_ns: int
+    output: str
+    error: Optional[str]
+    processed: float
+
+
+class WatchState:
+    """SQLite record of processed images, keyed by path."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: SQLite file, created on first use
+        """
+        self.path = path
+
+    @contextmanager
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    output TEXT NOT NULL,
+                    error TEXT,
+                    processed REAL NOT NULL
+                )
+                """
+            )
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, image_path: Path) -> Optional[FileRecord]:
+        """Record for an image, or None if it was never processed."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT digest, size, mtime_ns, output, error, processed FROM files WHERE path = ?",
+                (str(image_path.resolve()),)
+            ).fetchone()
+        return FileRecord(*row) if row is not None else None
+
+    def record(
+        self,
+        image_path: Path,
+        digest: str,
+        stat: os.stat_result,
+        output_path: Path,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Store the outcome of processing an image.
+
+        Args:
+            image_path: Processed image
+            digest: Content hash the image was processed with
+            stat: The image's stat, taken before digest: a file rewritten
+                during processing then no longer matches it
+            output_path: Note written for the image
+            error: Why processing failed, if it did
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(image_path.resolve()), digest, stat.st_size, stat.st_mtime_ns, str(output_path), error, time.time()),
+            )
+
+    def is_current(self, image_path: Path) -> bool:
+        """
+        Whether an image was processed successfully in its current state.
+
+        Size and modification time are checked first; the content is only
+        hashed when they changed, so touched but identical files are skipped
+        without re-parsing.
+        """
+        record = self.get(image_path)
+        if record is None or record.error is not None:
+            return False
+
+        stat = image_path.stat()
+        if (record.size, record.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return True
+        if file_digest(image_path) != record.digest:
+            return False
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime_ns, str(image_path.resolve())),
+            )
+        return True
+
+    def counts(self) -> dict:
+        """Number of processed and failed images."""
+        with self._connect() as conn:
+            total, failed = conn.execute(
+                "SELECT COUNT(*), COUNT(error) FROM files"
+            ).fetchone()
+        return {"processed": total - failed, "failed": failed}
+
+
+class PollingSource:
+    """Reports new and changed images by scanning the folder at an interval."""
+
+    def __init__(self, directory: Path, events: queue.Queue, recursive: bool = False, interval: float = 2.0):
+        self.directory = directory
+        self.events = events
+        self.recursive = recursive
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = {}
+
+    def _scan(self) -> None:
+        current = {}
+        for path in find_images(self.directory, recursive=self.recursive):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(path) != current[path]:
+                self.events.put(path)
+        self._seen = current
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._scan()
+
+    def start(self) -> None:
+        self._scan()
+        self._thread = threading.Thread(target=self._run, name="watch-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class EventSource:
+    """Reports images from native file system events through watchdog."""
+
+    def __init__(self, directory: Path, events: queue.Queue, recursive: bool = False):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                # Moves (e.g. a sync client renaming its temp file) report the new name
+                events.put(Path(getattr(event, "dest_path", "") or event.src_path))
+
+        self.directory = directory
+        self.events = events
+        self._observer = Observer()
+        self._observer.schedule(Handler(), str(directory), recursive=recursive)
+
+    def start(self) -> None:
+        # Images already in the folder are picked up by the initial scan
+        self._observer.start()
+
+    def stop(self) -> None:
+        self._observer.stop()
+        self._observer.join()
+
+
+def watchdog_available() -> bool:
+    """Whether native file system events can be used."""
+    try:
+        import watchdog  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class FolderWatcher:
+    """Parses images dropped into a folder until stopped."""
+
+    def __init__(
+        self,
+        input_dir: Path,
+        output_dir: Path,
+        template_path: Path,
+        options: ParseOptions,
+        state: Optional[WatchState] = None,
+        source: Optional[str] = None,
+        recursive: bool = False,
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        settle: float = 1.0,
+        use_events: bool = True,
+        on_result: Optional[Callable[[PageResult], None]] = None,
+        cache: Optional[ExtractionCache] = None,
+        usage: Optional[TokenUsage] = None,
+        metrics: Optional[MetricsStore] = None
+    ):
+        """
+        Args:
+            input_dir: Folder to watch
+            output_dir: Root directory for markdown notes (mirrors subdirectories)
+            template_path: Template used for every page
+            options: Extraction settings
+            state: State database (default: STATE_FILENAME in output_dir)
+            source: Optional custom source description for every page
+            recursive: Also watch subdirectories
+            workers: Pages processed at once (capped by the backend's max_concurrency)
+            poll_interval: Seconds between scans when polling
+            settle: Seconds a file must stay unchanged before it is processed
+            use_events: Use watchdog events when installed; False always polls
+            on_result: Optional callback invoked as each page finishes
+            cache: Optional extraction cache for the LLM backends
+            usage: Optional accumulator for Claude token counts
+            metrics: Optional store for each page's stage timings and token counts
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.input_dir = input_dir.resolve()
+        self.output_dir = output_dir
+        self.template_path = template_path
+        self.options = options
+        self.state = state if state is not None else WatchState(output_dir / STATE_FILENAME)
+        self.source = source
+        self.recursive = recursive
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.use_events = use_events and watchdog_available()
+        self.on_result = on_result
+        self.cache = cache
+        self.usage = usage
+        self.metrics = metrics
+
+        self._events = queue.Queue()
+        self._pending = {}  # path -> (size, mtime_ns, monotonic time first seen in that state)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        """'events' or 'polling'."""
+        return "events" if self.use_events else "polling"
+
+    def _output_path(self, image_path: Path) -> Path:
+        return self.output_dir / image_path.relative_to(self.input_dir).with_suffix(".md")
+
+    def _watched(self, path: Path) -> bool:
+        if path.suffix.lower() not in IMAGE_EXTENSIONS or not path.is_file():
+            return False
+        try:
+            relative = path.relative_to(self.input_dir)
+        except ValueError:
+            return False
+        return self.recursive or len(relative.parts) == 1
+
+    def _settled(self, now: float, settle: float) -> list[Path]:
+        """Pending paths whose size and mtime haven't changed for `settle` seconds."""
+        ready = []
+        for path, (size, mtime_ns, since) in list(self._pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= settle:
+                del self._pending[path]
+                ready.append(path)
+        return ready
+
+    def _drain(self, timeout: float) -> None:
+        """Move reported paths into the pending set, waiting up to timeout for the first."""
+        try:
+            path = self._events.get(timeout=timeout)
+            while True:
+                path = path.resolve()
+                if path not in self._pending and self._watched(path):
+                    try:
+                        stat = path.stat()
+                        self._pending[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+                    except FileNotFoundError:
+                        pass
+                path = self._events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _process(self, image_path: Path, engine: TemplateEngine, extractor, slots: threading.Semaphore) -> None:
+        output_path = self._output_path(image_path)
+        try:
+            # Stat before hashing, so the record never pairs new stats with old content
+            stat = image_path.stat()
+            digest = file_digest(image_path)
+            result = process_page(
+                image_path, output_path, engine=engine, options=self.options, source=self.source,
+                cache=self.cache, usage=self.usage, extractor=extractor, metrics=self.metrics
+            )
+            self.state.record(image_path, digest, stat, output_path, result.error)
+        except Exception as e:  # The file vanished or the state database failed
+            result = PageResult(image_path, output_path, error=str(e))
+        finally:
+            with self._lock:
+                self._in_flight.discard(image_path)
+            slots.release()
+
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def run(self, stop: Optional[threading.Event] = None, once: bool = False) -> None:
+        """
+        Process the backlog, then keep processing new and changed images.
+
+        Args:
+            stop: Event that ends the watch (default: run until interrupted)
+            once: Process images already in the folder and return
+        """
+        stop = stop if stop is not None else threading.Event()
+        engine = TemplateEngine(self.template_path)
+
+        with open_extractor(self.options) as extractor:
+            workers = self.workers
+            if extractor.max_concurrency is not None:
+                workers = min(workers, extractor.max_concurrency)
+            # Waiting pages beyond the workers stay as paths, not decoded images
+            slots = threading.BoundedSemaphore(workers)
+
+            watcher = None
+            if not once:
+                if self.use_events:
+                    watcher = EventSource(self.input_dir, self._events, recursive=self.recursive)
+                else:
+                    watcher = PollingSource(self.input_dir, self._events, self.recursive, self.poll_interval)
+                watcher.start()
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                try:
+                    # Catch up on images added while no watcher was running
+                    for path in find_images(self.input_dir, recursive=self.recursive):
+                        self._events.put(path)
+
+                    while not stop.is_set():
+                        self._drain(timeout=0.2)
+                        for path in self._settled(time.monotonic(), 0.0 if once else self.settle):
+                            with self._lock:
+                                if path in self._in_flight:
+                                    self._events.put(path)  # Changed while processing; look again later
+                                    continue
+                            try:
+                                if self.state.is_current(path):
+                                    continue
+                            except FileNotFoundError:
+                                continue
+                            slots.acquire()
+                            with self._lock:
+                                self._in_flight.add(path)
+                            pool.submit(self._process, path, engine, extractor, slots)
+
+                        if once and not self._pending and self._events.empty():
+                            break
+                finally:
+                    if watcher is not None:
+                        watcher.stop()
@@ -2,7 +2,10 @@
 Pytest fixtures for notebook-parser tests.
 """
 
+import json
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 # Add project root to Python path so we can import main
@@ -14,6 +17,24 @@ from PIL import Image
 import numpy as np
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep cache and state files written during tests out of the user's home."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("NOTEBOOK_PARSER_CACHE_DIR", str(cache_dir))
+    monkeypatch.setenv("NOTEBOOK_PARSER_STATE_DIR", str(tmp_path / "state"))
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Don't share pooled clients or cached health checks between tests."""
+    from notebook_parser.llm.clients import reset_clients
+    reset_clients()
+    yield
+    reset_clients()
+
+
 @pytest.fixture
 def test_image_path():
     """Path to existing test image."""
@@ -42,3 +63,120 @@ def corrupted_image(tmp_path):
     img_path = tmp_path / "corrupted.jpg"
     img_path.write_text("This is not an image")
     return img_path
+
+
+class AnthropicStub:
+    """Local stand-in for the Anthropic API that records request payloads."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []  # Queued message responses, default_message() when empty
+        self.routes = {}  # (method, path) -> callable(body) returning (status, payload)
+
+    @staticmethod
+    def message(text="- stub note", content=None, **usage):
+        """Build a Messages API response body."""
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": "claude-sonnet-4-5-20250929",
+            "content": content if content is not None else [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": usage.get("input_tokens", 100),
+                "output_tokens": usage.get("output_tokens", 20),
+                "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0),
+                "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+            },
+        }
+
+    @staticmethod
+    def sse(message, chunk_size=4, error=None):
+        """
+        Encode a Messages API response as a server-sent event stream.
+
+        Text and tool input are split into chunk_size deltas. With error,
+        the stream ends with an error event after the first delta.
+        """
+        events = [("message_start", {"type": "message_start", "message": {**message, "content": []}})]
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                start, data, delta = {**block, "text": ""}, block["text"], "text_delta"
+            else:
+                start, data, delta = {**block, "input": {}}, json.dumps(block["input"]), "input_json_delta"
+            events.append(("content_block_start", {"type": "content_block_start", "index": index, "content_block": start}))
+            for i in range(0, len(data), chunk_size):
+                key = "text" if delta == "text_delta" else "partial_json"
+                events.append(("content_block_delta", {
+                    "type": "content_block_delta", "index": index,
+                    "delta": {"type": delta, key: data[i:i + chunk_size]},
+                }))
+                if error:
+                    events.append(("error", {"type": "error", "error": {"type": "overloaded_error", "message": error}}))
+                    break
+            events.append(("content_block_stop", {"type": "content_block_stop", "index": index}))
+        events.append(("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+            "usage": {"output_tokens": message["usage"]["output_tokens"]},
+        }))
+        events.append(("message_stop", {"type": "message_stop"}))
+        return "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+
+    def handle(self, method, path, body, client=None):
+        self.requests.append({"method": method, "path": path, "body": body, "client": client})
+        route = self.routes.get((method, path.split("?")[0]))
+        if route is not None:
+            return route(body)
+        if method == "POST" and path.startswith("/v1/messages"):
+            message = self.responses.pop(0) if self.responses else self.message()
+            if body.get("stream"):
+                return 200, self.sse(message), "text/event-stream"
+            return 200, message
+        return 404, {"type": "error", "error": {"type": "not_found_error", "message": path}}
+
+
+@pytest.fixture
+def anthropic_stub(monkeypatch):
+    """Run a recording Anthropic API stub and point the SDK at it."""
+    stub = AnthropicStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep connections alive like the real API
+
+        def _respond(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            status, payload, *content_type = stub.handle(method, self.path, body, self.client_address)
+            if isinstance(payload, (dict, list)):
+                data, content_type = json.dumps(payload).encode(), "application/json"
+            else:
+                data, content_type = payload.encode(), (content_type or ["application/x-ndjson"])[0]
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    stub.url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", stub.url)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-test")
+    yield stub
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,206 @@
+"""
+Tests for batch processing.
+"""
+
+import asyncio
+import io
+import threading
+import time
+import pytest
+from pathlib import Path
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.batch import find_images, plan_outputs, run_batch, run_batch_async
+from notebook_parser.pipeline import ParseOptions
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """Directory with a few small test images."""
+    images = tmp_path / "scans"
+    images.mkdir()
+    for i in range(5):
+        Image.new('RGB', (2000, 1500), color='white').save(images / f"page-{i}.jpg")
+    (images / "notes.txt").write_text("not an image")
+    return images
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    """Minimal template file."""
+    path = tmp_path / "template.md"
+    path.write_text("# {{title}}\n{{tags}}\n\n{{key_points}}\n")
+    return path
+
+
+def test_find_images_filters_and_sorts(image_dir):
+    """Test that only image files are returned, in sorted order."""
+    images = find_images(image_dir)
+
+    assert [image.name for image in images] == [f"page-{i}.jpg" for i in range(5)]
+
+
+def test_find_images_recursive(image_dir):
+    """Test recursive search includes subdirectories."""
+    nested = image_dir / "week-2"
+    nested.mkdir()
+    Image.new('RGB', (10, 10)).save(nested / "extra.png")
+
+    assert len(find_images(image_dir)) == 5
+    assert len(find_images(image_dir, recursive=True)) == 6
+
+
+def test_plan_outputs_mirrors_subdirectories(tmp_path):
+    """Test output paths mirror the input layout."""
+    input_dir = tmp_path / "in"
+    pages = plan_outputs([input_dir / "a.jpg", input_dir / "sub" / "b.png"], input_dir, tmp_path / "out")
+
+    assert pages[0][1] == tmp_path / "out" / "a.md"
+    assert pages[1][1] == tmp_path / "out" / "sub" / "b.md"
+
+
+def test_run_batch_renders_all_pages(mocker, image_dir, template_path, tmp_path):
+    """Test that every page is optimized, extracted and rendered."""
+    extract = mocker.patch(
+        "notebook_parser.extractors.extract_with_ollama",
+        side_effect=lambda image_path, **kwargs: f"text of {image_path.stem}"
+    )
+    pages = plan_outputs(find_images(image_dir), image_dir, tmp_path / "out")
+
+    results = run_batch(pages, template_path, ParseOptions(model="ollama"), optimize_workers=2)
+
+    assert all(result.ok for result in results)
+    assert [result.image_path for result in results] == [image for image, _ in pages]
+    assert extract.call_count == 5
+    for call in extract.call_args_list:
+        # Optimized in the process pool before reaching the backend
+        with Image.open(io.BytesIO(call.kwargs["image_bytes"])) as img:
+            assert max(img.size) == 1024
+    note = (tmp_path / "out" / "page-3.md").read_text()
+    assert "# page-3" in note
+    assert "text of page-3" in note
+
+
+def test_run_batch_reports_errors_per_page(mocker, image_dir, template_path, tmp_path):
+    """Test that one failing page does not abort the batch."""
+    def extract(image_path, **kwargs):
+        if image_path.stem == "page-1":
+            raise ConnectionError("boom")
+        return "ok"
+
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", side_effect=extract)
+    pages = plan_outputs(find_images(image_dir), image_dir, tmp_path / "out")
+
+    results = run_batch(pages, template_path, ParseOptions(model="ollama", optimize=False))
+
+    failed = [result for result in results if not result.ok]
+    assert len(failed) == 1
+    assert failed[0].image_path.stem == "page-1"
+    assert "boom" in failed[0].error
+    assert not (tmp_path / "out" / "page-1.md").exists()
+
+
+def test_run_batch_caps_pages_in_flight(mocker, image_dir, template_path, tmp_path):
+    """Test that concurrency never exceeds max_in_flight."""
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def extract(image_path, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return "text"
+
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", side_effect=extract)
+    pages = plan_outputs(find_images(image_dir), image_dir, tmp_path / "out")
+
+    run_batch(pages, template_path, ParseOptions(model="ollama", optimize=False), workers=8, max_in_flight=2)
+
+    assert active["peak"] <= 2
+
+
+def test_run_batch_rejects_invalid_limits(template_path):
+    """Test that non-positive limits are rejected."""
+    with pytest.raises(ValueError):
+        run_batch([], template_path, ParseOptions(), max_in_flight=0)
+
+
+def test_run_batch_async_caps_pages_in_flight(mocker, image_dir, template_path, tmp_path):
+    """Test the async orchestrator respects its semaphore and keeps input order."""
+    active = {"now": 0, "peak": 0}
+
+    async def extract(image_path, **kwargs):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.02)
+        active["now"] -= 1
+        return f"text of {image_path.stem}"
+
+    mocker.patch("notebook_parser.extractors.extract_with_ollama_async", side_effect=extract)
+    pages = plan_outputs(find_images(image_dir), image_dir, tmp_path / "out")
+
+    results = asyncio.run(run_batch_async(pages, template_path, ParseOptions(model="ollama"), concurrency=3))
+
+    assert active["peak"] == 3
+    assert [result.image_path for result in results] == [image for image, _ in pages]
+    assert all(result.ok for result in results)
+    assert "text of page-4" in (tmp_path / "out" / "page-4.md").read_text()
+
+
+def test_run_batch_async_overlaps_two_step_tags(anthropic_stub, image_dir, template_path, tmp_path):
+    """Test two-step pages run concurrently, so tags requests of later pages start before earlier pages finish."""
+    pages = plan_outputs(find_images(image_dir), image_dir, tmp_path / "out")
+    options = ParseOptions(model="claude", tags=True, tags_mode="two-step")
+
+    results = asyncio.run(run_batch_async(pages, template_path, options, concurrency=5))
+
+    assert all(result.ok for result in results)
+    assert len(anthropic_stub.requests) == 10
+    first_content = next(
+        # Content requests add the page's tags after the cached system block
+        i for i, request in enumerate(anthropic_stub.requests) if len(request["body"]["system"]) > 1
+    )
+    assert first_content > 1
+
+
+def test_parse_dir_command_nonexistent_dir(tmp_path):
+    """Test parse-dir fails for a missing directory."""
+    result = runner.invoke(app, ["parse-dir", str(tmp_path / "missing")])
+
+    assert result.exit_code == 1
+    assert "not found" in result.stderr
+
+
+def test_parse_dir_command_writes_notes(mocker, image_dir, template_path, tmp_path):
+    """Test parse-dir end to end with a mocked backend."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    out = tmp_path / "notes"
+
+    result = runner.invoke(app, [
+        "parse-dir", str(image_dir), "-o", str(out), "-t", str(template_path),
+        "--model", "ollama", "--no-optimize",
+    ])
+
+    assert result.exit_code == 0
+    assert "5/5 notes written" in result.stderr
+    assert len(list(out.glob("*.md"))) == 5
+
+
+def test_parse_dir_command_async(mocker, image_dir, template_path, tmp_path):
+    """Test parse-dir --async writes every note."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama_async", return_value="- a point")
+    out = tmp_path / "notes"
+
+    result = runner.invoke(app, [
+        "parse-dir", str(image_dir), "-o", str(out), "-t", str(template_path),
+        "--model", "ollama", "--async", "-w", "16",
+    ])
+
+    assert result.exit_code == 0
+    assert "5/5 notes written" in result.stderr
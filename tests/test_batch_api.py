@@ -0,0 +1,226 @@
+"""
+Tests for Message Batches API mode, run against a fake batch server.
+"""
+
+import json
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.batch import plan_outputs, find_images
+from notebook_parser.batch_api import (
+    submit_batch, collect_batch, find_manifest, pending_manifests, load_manifest, _chunk_requests
+)
+from notebook_parser.pipeline import ParseOptions
+from notebook_parser.sidecar import read_sidecar, sidecar_path
+
+runner = CliRunner()
+
+
+class FakeBatches:
+    """Message Batches endpoints on top of the Anthropic stub."""
+
+    def __init__(self, stub):
+        self.stub = stub
+        self.submitted = {}
+        self.status = "in_progress"
+        self.outcomes = {}  # custom_id -> result dict, default: succeeded
+        stub.routes[("POST", "/v1/messages/batches")] = self.create
+
+    def batch(self, batch_id):
+        ended = self.status == "ended"
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": self.status,
+            "request_counts": {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": "2026-01-01T00:00:00Z",
+            "expires_at": "2026-01-02T00:00:00Z",
+            "ended_at": "2026-01-01T01:00:00Z" if ended else None,
+            "cancel_initiated_at": None,
+            "archived_at": None,
+            "results_url": f"{self.stub.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def create(self, body):
+        batch_id = f"msgbatch_{len(self.submitted) + 1}"
+        self.submitted[batch_id] = body["requests"]
+        path = f"/v1/messages/batches/{batch_id}"
+        self.stub.routes[("GET", path)] = lambda _: (200, self.batch(batch_id))
+        self.stub.routes[("GET", f"{path}/results")] = lambda _: (200, self.results(batch_id))
+        return 200, self.batch(batch_id)
+
+    def results(self, batch_id):
+        lines = []
+        for request in self.submitted[batch_id]:
+            custom_id = request["custom_id"]
+            default = {"type": "succeeded", "message": self.stub.message(f"- note for {custom_id}")}
+            lines.append(json.dumps({"custom_id": custom_id, "result": self.outcomes.get(custom_id, default)}))
+        return "\n".join(lines) + "\n"
+
+
+@pytest.fixture
+def batches(anthropic_stub):
+    return FakeBatches(anthropic_stub)
+
+
+@pytest.fixture
+def pages(tmp_path):
+    """Three small pages and their planned outputs."""
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    for i in range(3):
+        Image.new('RGB', (400, 300), color='white').save(scans / f"page-{i}.jpg")
+    return plan_outputs(find_images(scans), scans, tmp_path / "notes")
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = tmp_path / "template.md"
+    path.write_text("# {{title}}\n{{tags}}\n\n{{key_points}}\n")
+    return path
+
+
+def test_submit_batch_records_manifest(batches, pages, template_path):
+    """Test every page becomes one request and the mapping is persisted."""
+    [manifest_path] = submit_batch(pages, template_path, ParseOptions(model="claude"))
+
+    requests = batches.submitted["msgbatch_1"]
+    assert [r["custom_id"] for r in requests] == ["page-00000", "page-00001", "page-00002"]
+    assert requests[0]["params"]["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert requests[0]["params"]["messages"][0]["content"][0]["type"] == "image"
+
+    manifest = load_manifest(manifest_path)
+    assert manifest["batch_id"] == "msgbatch_1"
+    assert manifest["pages"]["page-00001"]["image"] == str(pages[1][0].resolve())
+    assert {page["status"] for page in manifest["pages"].values()} == {"pending"}
+    assert pending_manifests() == [manifest_path]
+
+
+def test_manifests_live_outside_the_cache(batches, pages, template_path, isolated_cache_dir, tmp_path):
+    """Test manifests survive clearing the cache, and ones saved there by older versions are still found."""
+    [manifest_path] = submit_batch(pages[:1], template_path, ParseOptions(model="claude"))
+    legacy = isolated_cache_dir / "batches" / "msgbatch_old.json"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_text(manifest_path.read_text())
+
+    assert manifest_path.parent == tmp_path / "state" / "batches"
+    assert find_manifest("msgbatch_1") == manifest_path
+    assert find_manifest("msgbatch_old") == legacy
+    assert find_manifest("msgbatch_missing") is None
+    assert set(pending_manifests()) == {manifest_path, legacy}
+
+
+def test_submit_batch_with_tags_uses_structured_tool(batches, pages, template_path):
+    """Test tags mode forces the record_note tool in each request."""
+    submit_batch(pages, template_path, ParseOptions(model="claude", tags=True))
+
+    params = batches.submitted["msgbatch_1"][0]["params"]
+    assert params["tool_choice"] == {"type": "tool", "name": "record_note"}
+
+
+def test_collect_waits_for_batch_to_end(batches, pages, template_path):
+    """Test collecting an unfinished batch writes nothing."""
+    [manifest_path] = submit_batch(pages, template_path, ParseOptions(model="claude"))
+
+    status, results = collect_batch(manifest_path)
+
+    assert status == "in_progress"
+    assert results == []
+    assert not pages[0][1].exists()
+
+
+def test_collect_renders_notes_and_resumes(batches, pages, template_path):
+    """Test results are rendered through the template and not written twice."""
+    [manifest_path] = submit_batch(pages, template_path, ParseOptions(model="claude"), source="Archive")
+    batches.status = "ended"
+    batches.outcomes["page-00002"] = {
+        "type": "errored",
+        "error": {"type": "error", "error": {"type": "invalid_request_error", "message": "bad image"}},
+    }
+
+    status, results = collect_batch(manifest_path)
+
+    assert status == "ended"
+    assert [result.ok for result in results] == [True, True, False]
+    assert "bad image" in results[2].error
+    assert "- note for page-00000" in pages[0][1].read_text()
+    manifest = load_manifest(manifest_path)
+    assert [page["status"] for page in manifest["pages"].values()] == ["done", "done", "errored"]
+    assert pending_manifests() == []
+
+    # A second collect skips pages that are already finished
+    _, results = collect_batch(manifest_path)
+    assert results == []
+
+
+def test_collect_structured_results(batches, pages, template_path):
+    """Test tag batches read tags and content from the tool call."""
+    [manifest_path] = submit_batch(pages[:1], template_path, ParseOptions(model="claude", tags=True))
+    batches.status = "ended"
+    batches.outcomes["page-00000"] = {"type": "succeeded", "message": batches.stub.message(content=[
+        {"type": "tool_use", "id": "toolu_1", "name": "record_note",
+         "input": {"tags": ["#physics"], "content": "- Energy is conserved"}},
+    ])}
+
+    _, [result] = collect_batch(manifest_path)
+
+    assert result.ok
+    note = pages[0][1].read_text()
+    assert "#physics" in note
+    assert "- Energy is conserved" in note
+
+    record = read_sidecar(sidecar_path(pages[0][1]))
+    assert (record.backend, record.generated_tags) == ("claude", ["#physics"])
+
+
+def test_chunk_requests_respects_size_limit(monkeypatch):
+    """Test oversized submissions are split into several batches."""
+    monkeypatch.setattr("notebook_parser.batch_api.MAX_BATCH_BYTES", 100)
+    requests = [{"custom_id": str(i), "params": {"data": "x" * 40}} for i in range(4)]
+
+    assert [len(chunk) for chunk in _chunk_requests(requests)] == [1, 1, 1, 1]
+
+
+def test_submit_batch_sends_each_batch_once_full(batches, pages, template_path, monkeypatch):
+    """Test full batches are submitted before later pages are encoded."""
+    monkeypatch.setattr("notebook_parser.batch_api.MAX_BATCH_BYTES", 100)
+    pages[2][0].write_bytes(b"not an image")
+
+    with pytest.raises(Exception):
+        submit_batch(pages, template_path, ParseOptions(model="claude"))
+
+    # The first page's batch filled up when the second page was encoded and was sent then
+    assert list(batches.submitted) == ["msgbatch_1"]
+    assert [path.stem for path in pending_manifests()] == ["msgbatch_1"]
+
+
+def test_cli_batch_api_then_collect(batches, pages, template_path):
+    """Test parse-dir --batch-api submits and collect writes the notes."""
+    scans = pages[0][0].parent
+    output_dir = pages[0][1].parent
+
+    result = runner.invoke(app, [
+        "parse-dir", str(scans), "-o", str(output_dir), "-t", str(template_path),
+        "--model", "claude", "--batch-api",
+    ])
+    assert result.exit_code == 0, result.output
+    assert "msgbatch_1" in result.output
+
+    result = runner.invoke(app, ["collect"])
+    assert result.exit_code == 0
+    assert "Still in progress" in result.output
+
+    batches.status = "ended"
+    result = runner.invoke(app, ["collect", "msgbatch_1"])
+    assert result.exit_code == 0
+    assert "3/3 notes written" in result.output
+    assert all(output.exists() for _, output in pages)
+
+
+def test_cli_batch_api_requires_claude(pages, template_path):
+    """Test the batch mode is rejected for other backends."""
+    result = runner.invoke(app, ["parse-dir", str(pages[0][0].parent), "--model", "ollama", "--batch-api"])
+
+    assert result.exit_code == 1
+    assert "requires --model claude" in result.output
@@ -0,0 +1,163 @@
+"""
+Tests for the extraction cache.
+"""
+
+import os
+import pytest
+from pathlib import Path
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import cache as cache_module
+from notebook_parser.cache import ExtractionCache, cache_key, file_digest, get_cache_dir
+from notebook_parser.llm.claude_vision import extract_with_claude
+from notebook_parser.llm.ollama_vision import extract_with_ollama
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Cache in a temporary directory."""
+    return ExtractionCache(tmp_path / "extractions.sqlite3")
+
+
+def test_get_cache_dir_uses_env_override(isolated_cache_dir):
+    """Test that NOTEBOOK_PARSER_CACHE_DIR overrides the default location."""
+    assert get_cache_dir() == isolated_cache_dir
+
+
+def test_file_digest_tracks_content(temp_test_image):
+    """Test that the digest changes when the image content changes."""
+    before = file_digest(temp_test_image)
+    Image.new('RGB', (100, 100), color='black').save(temp_test_image)
+    os.utime(temp_test_image, ns=(1, 1))
+
+    assert file_digest(temp_test_image) != before
+
+
+def test_file_digest_memo_is_bounded(tmp_path, monkeypatch):
+    """Test the digest memo keeps only the most recently used files."""
+    monkeypatch.setattr(cache_module, "_digest_memo", type(cache_module._digest_memo)())
+    monkeypatch.setattr(cache_module, "DIGEST_MEMO_SIZE", 2)
+    paths = []
+    for name in "abc":
+        paths.append(tmp_path / name)
+        paths[-1].write_text(name)
+
+    file_digest(paths[0])
+    file_digest(paths[1])
+    file_digest(paths[0])  # b is now the least recently used
+    file_digest(paths[2])
+
+    assert [Path(key[0]).name for key in cache_module._digest_memo] == ["a", "c"]
+
+
+def test_cache_key_depends_on_settings(temp_test_image):
+    """Test that every setting contributes to the key."""
+    base = dict(backend="claude", model="m", prompt="p", template="t", grayscale=False)
+    key = cache_key(temp_test_image, **base)
+
+    assert key == cache_key(temp_test_image, **base)
+    for field, value in [("backend", "ollama"), ("model", "m2"), ("prompt", "p2"), ("template", "t2"), ("grayscale", True)]:
+        assert key != cache_key(temp_test_image, **{**base, field: value})
+
+
+def test_cache_put_and_get(cache):
+    """Test round-tripping text and tags."""
+    assert cache.get("k") is None
+
+    cache.put("k", "- point", "#tag", backend="claude", model="m")
+
+    assert cache.get("k") == ("- point", "#tag")
+
+
+def test_cache_creates_its_schema_once(cache, mocker):
+    """Test the table is created on first use, not on every lookup."""
+    executed = []
+    connect = cache_module.sqlite3.connect
+
+    def traced(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(executed.append)
+        return conn
+
+    mocker.patch.object(cache_module.sqlite3, "connect", side_effect=traced)
+    cache.put("k", "- point")
+    for _ in range(3):
+        assert cache.get("k") == ("- point", None)
+
+    assert sum("CREATE TABLE" in statement for statement in executed) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test that the oldest untouched entries are evicted past max_bytes."""
+    cache = ExtractionCache(tmp_path / "c.sqlite3", max_bytes=25)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.get("a")  # a is now more recently used than b
+    cache.put("c", "z" * 10)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_stats_and_prune(cache):
+    """Test stats reporting and explicit pruning."""
+    cache.put("a", "one", backend="claude")
+    cache.put("b", "two", backend="ollama")
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["size_bytes"] == 6
+    assert stats["backends"] == {"claude": 1, "ollama": 1}
+
+    assert cache.prune(max_bytes=3) == 1
+    assert cache.prune(max_bytes=0) == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_extract_with_ollama_uses_cache(mocker, cache, temp_test_image):
+    """Test that a cache hit skips the network entirely."""
+    session = mocker.patch("requests.Session").return_value
+    get, post = session.get, session.post
+    post.return_value.json.return_value = {"response": " - from ollama "}
+
+    first = extract_with_ollama(temp_test_image, "{{key_points}}", cache=cache)
+    second = extract_with_ollama(temp_test_image, "{{key_points}}", cache=cache)
+
+    assert first == second == "- from ollama"
+    assert get.call_count == 1
+    assert post.call_count == 1
+
+    # A different template is a different extraction
+    extract_with_ollama(temp_test_image, "{{key_idea}}", cache=cache)
+    assert post.call_count == 2
+
+
+def test_extract_with_claude_cache_hit_needs_no_api_key(mocker, cache, temp_test_image, monkeypatch):
+    """Test that cached Claude results are served without credentials."""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    client = mocker.patch("anthropic.Anthropic")
+    client.return_value.messages.create.return_value.content = [mocker.Mock(text="cached text")]
+
+    extract_with_claude(temp_test_image, "{{key_points}}", api_key="sk-test", cache=cache)
+    result = extract_with_claude(temp_test_image, "{{key_points}}", cache=cache)
+
+    assert result == "cached text"
+    assert client.return_value.messages.create.call_count == 1
+
+
+def test_cache_cli_stats_and_prune(isolated_cache_dir):
+    """Test the cache stats and prune commands."""
+    ExtractionCache().put("a", "text", backend="claude")
+
+    result = runner.invoke(app, ["cache", "stats"])
+    assert result.exit_code == 0
+    assert "Entries: 1" in result.stdout
+    assert str(isolated_cache_dir) in result.stdout
+
+    result = runner.invoke(app, ["cache", "prune", "--all"])
+    assert result.exit_code == 0
+    assert "Removed 1" in result.stdout
@@ -0,0 +1,216 @@
+"""
+Tests for the Claude vision backend.
+"""
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.cache import ExtractionCache
+from notebook_parser.llm.claude_vision import (
+    NOTE_TOOL,
+    PAGE_INSTRUCTION,
+    extract_with_claude,
+    extract_with_claude_async,
+    extract_with_claude_structured,
+    extract_with_claude_structured_async,
+    extract_with_claude_tags,
+    extract_with_claude_tags_async,
+)
+from notebook_parser.llm.usage import TokenUsage
+
+
+def _tool_message(tags, content):
+    """Fake Messages API response with a single tool_use block."""
+    block = SimpleNamespace(type="tool_use", name=NOTE_TOOL["name"], input={"tags": tags, "content": content})
+    return SimpleNamespace(content=[block])
+
+
+@pytest.fixture
+def client(mocker):
+    """Mocked Anthropic client."""
+    anthropic = mocker.patch("anthropic.Anthropic")
+    return anthropic.return_value
+
+
+def test_structured_extraction_uses_one_request(client, temp_test_image):
+    """Test that tags and content come back from a single forced tool call."""
+    client.messages.create.return_value = _tool_message(["#python", "#testing"], "  - point one\n- point two ")
+
+    text, tags = extract_with_claude_structured(temp_test_image, "{{key_points}}", api_key="sk-test")
+
+    assert text == "- point one\n- point two"
+    assert tags == ["#python", "#testing"]
+    assert client.messages.create.call_count == 1
+    kwargs = client.messages.create.call_args.kwargs
+    assert kwargs["tools"] == [NOTE_TOOL]
+    assert kwargs["tool_choice"] == {"type": "tool", "name": "record_note"}
+    images = [block for block in kwargs["messages"][0]["content"] if block["type"] == "image"]
+    assert len(images) == 1
+
+
+def test_structured_extraction_without_tool_call_fails(client, temp_test_image):
+    """Test that a response without the tool call is an error."""
+    client.messages.create.return_value = SimpleNamespace(content=[SimpleNamespace(type="text", text="hi")])
+
+    with pytest.raises(ValueError, match="structured"):
+        extract_with_claude_structured(temp_test_image, "{{key_points}}", api_key="sk-test")
+
+
+def test_structured_extraction_is_cached(client, temp_test_image, tmp_path):
+    """Test that cached structured results restore the tag list."""
+    cache = ExtractionCache(tmp_path / "c.sqlite3")
+    client.messages.create.return_value = _tool_message(["#a", "#b"], "- x")
+
+    first = extract_with_claude_structured(temp_test_image, "t", api_key="sk-test", cache=cache)
+    second = extract_with_claude_structured(temp_test_image, "t", api_key="sk-test", cache=cache)
+
+    assert first == second == ("- x", ["#a", "#b"])
+    assert client.messages.create.call_count == 1
+
+
+def test_requests_mark_static_prefix_for_caching(anthropic_stub, temp_test_image):
+    """Test that the prompt and template go in a cached system block."""
+    extract_with_claude(temp_test_image, "**Title**: {{title}}", prompt_name="bullet-points")
+
+    body = anthropic_stub.requests[0]["body"]
+    assert body["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert "Transform it to bullet points" in body["system"][0]["text"]
+    assert "**Title**: {{title}}" in body["system"][0]["text"]
+    user_content = body["messages"][0]["content"]
+    assert user_content[0]["type"] == "image"
+    assert user_content[1]["text"] == PAGE_INSTRUCTION
+
+
+def test_static_prefix_is_identical_across_pages(anthropic_stub, tmp_path):
+    """Test that only the image changes between pages of a run."""
+    for name, color in [("a.jpg", "white"), ("b.jpg", "black")]:
+        Image.new("RGB", (50, 50), color=color).save(tmp_path / name)
+        extract_with_claude(tmp_path / name, "{{key_points}}")
+
+    first, second = (request["body"] for request in anthropic_stub.requests)
+    assert first["system"] == second["system"]
+    assert first["messages"][0]["content"][0] != second["messages"][0]["content"][0]
+
+
+def test_usage_reports_cache_tokens(anthropic_stub, temp_test_image):
+    """Test that cache read/write counts from message.usage are accumulated."""
+    anthropic_stub.responses = [
+        anthropic_stub.message(input_tokens=50, output_tokens=10, cache_creation_input_tokens=1200),
+        anthropic_stub.message(input_tokens=50, output_tokens=12, cache_read_input_tokens=1200),
+    ]
+    usage = TokenUsage()
+
+    extract_with_claude(temp_test_image, "{{key_points}}", usage=usage)
+    extract_with_claude(temp_test_image, "{{key_points}}", usage=usage)
+
+    assert usage.requests == 2
+    assert usage.input_tokens == 100
+    assert usage.output_tokens == 22
+    assert usage.cache_creation_input_tokens == 1200
+    assert usage.cache_read_input_tokens == 1200
+    assert "cache read 1200" in usage.summary()
+
+
+def test_usage_detects_prefix_too_short_to_cache(anthropic_stub, temp_test_image, tmp_path):
+    """Test a run whose requests never touch the prompt cache is reported."""
+    usage = TokenUsage()
+    assert not usage.cache_unused
+
+    # The stub reports no cache writes or reads, like Claude for a short prefix
+    extract_with_claude(temp_test_image, "{{key_points}}", usage=usage)
+    assert usage.cache_unused
+
+    usage.add(SimpleNamespace(input_tokens=5, output_tokens=1, cache_creation_input_tokens=1100))
+    assert not usage.cache_unused
+
+    result = CliRunner().invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(tmp_path / "note.md"), "--model", "claude", "--no-cache",
+    ])
+    assert result.exit_code == 0, result.output
+    assert "Prompt cache: not used" in result.stderr
+    assert "1024-token minimum" in result.stderr
+
+
+def test_two_step_tags_caches_only_static_prompt(anthropic_stub, temp_test_image):
+    """Test that the per-page tags are sent after the cached prompt, not marked for caching."""
+    anthropic_stub.responses = [anthropic_stub.message("#python #ai"), anthropic_stub.message("- x")]
+
+    text, tags = extract_with_claude_tags(temp_test_image, "{{key_points}}")
+
+    assert (text, tags) == ("- x", "#python #ai")
+    tags_request, content_request = (request["body"] for request in anthropic_stub.requests)
+    assert "cache_control" in tags_request["system"][0]
+    static, page = content_request["system"]
+    assert "cache_control" in static and "#python #ai" not in static["text"]
+    assert "cache_control" not in page
+    assert "#python #ai" in page["text"]
+
+
+def test_async_extraction_sends_same_request_as_sync(anthropic_stub, temp_test_image):
+    """Test the async backend builds the same request as the blocking one."""
+    usage = TokenUsage()
+
+    sync_text = extract_with_claude(temp_test_image, "{{key_points}}")
+    async_text = asyncio.run(extract_with_claude_async(temp_test_image, "{{key_points}}", usage=usage))
+
+    assert sync_text == async_text == "- stub note"
+    sync_body, async_body = (request["body"] for request in anthropic_stub.requests)
+    assert sync_body == async_body
+    assert usage.requests == 1
+
+
+def test_async_two_step_tags(anthropic_stub, temp_test_image):
+    """Test the async two-step flow feeds generated tags into the content request."""
+    anthropic_stub.responses = [anthropic_stub.message("#python"), anthropic_stub.message("- x")]
+
+    text, tags = asyncio.run(extract_with_claude_tags_async(temp_test_image, "{{key_points}}"))
+
+    assert (text, tags) == ("- x", "#python")
+    assert "#python" in anthropic_stub.requests[1]["body"]["system"][-1]["text"]
+
+
+def test_two_step_content_requests_share_a_cached_prefix(anthropic_stub, tmp_path):
+    """Test the content step caches the prompt and template and sends the page's tags after them."""
+    anthropic_stub.responses = [
+        anthropic_stub.message("#python"), anthropic_stub.message("- x"),
+        anthropic_stub.message("#rust"), anthropic_stub.message("- y"),
+    ]
+    for i in range(2):
+        image = tmp_path / f"page-{i}.jpg"
+        Image.new('RGB', (100 + i, 100), color='white').save(image)
+        extract_with_claude_tags(image, "{{key_points}}")
+
+    first, second = (anthropic_stub.requests[i]["body"]["system"] for i in (1, 3))
+    assert first[0] == second[0]
+    assert first[0]["cache_control"] == {"type": "ephemeral"}
+    assert "{tags}" not in first[0]["text"]
+    assert first[1] == {"type": "text", "text": "Context: The main topics of this note are: #python"}
+    assert second[1]["text"].endswith("#rust")
+
+
+def test_async_structured_extraction_is_cached(anthropic_stub, temp_test_image, tmp_path):
+    """Test async results share the extraction cache with the blocking backend."""
+    anthropic_stub.responses = [anthropic_stub.message(content=[
+        {"type": "tool_use", "id": "toolu_1", "name": "record_note",
+         "input": {"tags": ["#ai"], "content": "- y"}},
+    ])]
+    cache = ExtractionCache(tmp_path / "cache.sqlite3")
+
+    first = asyncio.run(extract_with_claude_structured_async(temp_test_image, "{{key_points}}", cache=cache))
+    second = extract_with_claude_structured(temp_test_image, "{{key_points}}", cache=cache)
+
+    assert first == second == ("- y", ["#ai"])
+    assert len(anthropic_stub.requests) == 1
+
+
+def test_pages_share_one_client_connection(anthropic_stub, tmp_path):
+    """Test consecutive pages reuse the pooled client and its open connection."""
+    for i in range(3):
+        image = tmp_path / f"page-{i}.jpg"
+        Image.new('RGB', (100 + i, 100), color='white').save(image)
+        extract_with_claude(image, "{{key_points}}")
+
+    assert len({request["client"] for request in anthropic_stub.requests}) == 1
@@ -89,3 +89,38 @@ def test_parse_command_nonexistent_input():
 
     assert result.exit_code == 1
     assert "not found" in result.stderr
+
+
+def test_parse_command_warns_about_unknown_placeholders(mocker, temp_test_image, tmp_path):
+    """Test placeholders no note fills are reported before extraction."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    template = tmp_path / "template.md"
+    template.write_text("# {{title}}\nBy {{author}}\n\n{{key_points}}")
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(tmp_path / "note.md"), "-t", str(template),
+        "--model", "ollama",
+    ])
+
+    assert result.exit_code == 0
+    assert "'{{author}}' is not a note variable" in result.stderr
+    assert "By {{author}}" in (tmp_path / "note.md").read_text()
+
+
+@pytest.mark.parametrize("command", ["parse", "parse-dir", "watch", "serve"])
+def test_extraction_options_reach_parse_options(mocker, tmp_path, command):
+    """Test every extraction command builds its settings from the shared options."""
+    build = mocker.patch("notebook_parser.cli._parse_options", side_effect=SystemExit(3))
+    image = tmp_path / "page.jpg"
+    image.write_bytes(b"")
+    target = {"parse": ["-i", str(image)], "parse-dir": [str(tmp_path)], "watch": [str(tmp_path)], "serve": []}
+
+    result = runner.invoke(app, [
+        command, *target[command], "--trocr-model", "custom/trocr", "--no-segment", "--batch-size", "3",
+        "--tags-mode", "two-step", "--max-image-kb", "200",
+    ])
+
+    assert result.exit_code == 3
+    settings = build.call_args.kwargs
+    assert (settings["trocr_model"], settings["segment"], settings["batch_size"]) == ("custom/trocr", False, 3)
+    assert (settings["tags_mode"], settings["max_image_kb"]) == ("two-step", 200)
@@ -0,0 +1,210 @@
+"""
+Tests for blank and near-duplicate page detection.
+"""
+
+import random
+import shutil
+import numpy as np
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.dedup import (
+    DEFAULT_MAX_DISTANCE,
+    INDEX_FILENAME,
+    BKTree,
+    Fingerprint,
+    PageIndex,
+    ShotMatcher,
+    fingerprint,
+    hamming,
+    ink_density,
+    screen_pages,
+)
+from notebook_parser.sidecar import read_sidecar
+
+runner = CliRunner()
+
+
+def _blank_page(path: Path) -> Path:
+    """Paper in uneven light: a brightness gradient with sensor noise."""
+    rng = np.random.default_rng(0)
+    paper = np.tile(np.linspace(140, 235, 600), (800, 1)) + rng.normal(0, 4, (800, 600))
+    Image.fromarray(np.clip(paper, 0, 255).astype(np.uint8)).convert("RGB").save(path)
+    return path
+
+
+def _reshoot(test_image_path: Path, path: Path) -> Path:
+    """The test page photographed again: slightly shifted, brighter and softer."""
+    img = Image.open(test_image_path)
+    width, height = img.size
+    img = img.crop((20, 30, width, height))
+    img = ImageEnhance.Brightness(img).enhance(1.15).filter(ImageFilter.GaussianBlur(1))
+    img.save(path)
+    return path
+
+
+def _ruled_page(path: Path, seed: int) -> Path:
+    """A ruled page: the same line lengths for every seed, with different scribbles on them."""
+    layout, writing = random.Random(0), random.Random(seed)
+    img = Image.new("RGB", (1200, 1600), (245, 242, 232))
+    draw = ImageDraw.Draw(img)
+    for line in range(14):
+        base = 200 + line * 95
+        draw.line([(80, base), (1120, base)], fill=(170, 180, 200), width=2)
+        x, end = 100 + layout.choice([0, 0, 80]), layout.randint(400, 1080)
+        while x < end:
+            for _ in range(writing.randint(2, 6)):
+                width, height = writing.randint(14, 24), writing.choice([20, 24, 44])
+                draw.arc(
+                    [x, base - height - 4, x + width, base - 4],
+                    writing.randint(0, 90), writing.randint(270, 360), fill=(40, 40, 60), width=3,
+                )
+                x += width - 3
+            x += writing.randint(20, 32)
+    img.save(path)
+    return path
+
+
+def test_reshots_match_and_pages_sharing_a_layout_dont(test_image_path, tmp_path):
+    """Test a re-shot is confirmed, while a different page with the same layout isn't, though its hash is as close."""
+    first = _ruled_page(tmp_path / "first.png", seed=1)
+    second = _ruled_page(tmp_path / "second.png", seed=3)
+    reshot = _reshoot(test_image_path, tmp_path / "again.jpeg")
+    page = fingerprint(test_image_path)
+    same_page = ShotMatcher()
+
+    assert hamming(page.dhash, fingerprint(reshot).dhash) <= DEFAULT_MAX_DISTANCE
+    assert hamming(fingerprint(first).dhash, fingerprint(second).dhash) <= DEFAULT_MAX_DISTANCE
+    assert same_page(test_image_path, reshot)
+    assert same_page(first, _reshoot(first, tmp_path / "first-again.png"))
+    assert not same_page(first, second)
+    assert not same_page(first, tmp_path / "missing.png")
+    assert page.dhash < 2 ** 64
+
+
+def test_ink_density_detects_blank_pages(test_image_path, tmp_path):
+    """Test a lighting gradient isn't ink but handwriting is."""
+    blank = fingerprint(_blank_page(tmp_path / "blank.png"))
+    page = fingerprint(test_image_path)
+
+    assert blank.blank
+    assert not page.blank
+    assert ink_density(Image.new("L", (64, 64), 255)) == 0.0
+
+
+def test_bk_tree_search_matches_brute_force():
+    """Test the tree finds exactly the hashes within the radius, nearest first."""
+    rng = random.Random(1)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    base = hashes[0]
+    # Some hashes a few bits away from the first
+    hashes += [base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for _ in range(20)]
+    tree = BKTree()
+    for i, value in enumerate(hashes):
+        tree.add(value, i)
+
+    found = tree.search(base, 12)
+
+    assert len(tree) == len(hashes)
+    assert sorted(i for _, i in found) == [i for i, value in enumerate(hashes) if hamming(base, value) <= 12]
+    assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_page_index_persists_and_ignores_own_entry(tmp_path):
+    """Test recorded pages are found by a new index, but never as a candidate for themselves."""
+    path = tmp_path / INDEX_FILENAME
+    page = Fingerprint(dhash=0xF0F0F0F0F0F0F0F0, ink=0.05)
+    PageIndex(path).record(tmp_path / "a.jpeg", page, tmp_path / "notes" / "a.md")
+
+    index = PageIndex(path)
+
+    assert len(index) == 1
+    assert index.matches(tmp_path / "b.jpeg", Fingerprint(page.dhash ^ 0b111, 0.05), 3) == [
+        (tmp_path / "a.jpeg", tmp_path / "notes" / "a.md")
+    ]
+    assert index.matches(tmp_path / "b.jpeg", Fingerprint(page.dhash ^ 0b1111, 0.05), 3) == []
+    assert index.matches(tmp_path / "a.jpeg", page, 3) == []
+
+
+def test_screen_pages(test_image_path, tmp_path):
+    """Test blank pages and later shots of a page are taken out of the extraction list."""
+    pages = [
+        (shutil.copy(test_image_path, tmp_path / "a.jpeg"), tmp_path / "a.md"),
+        (_blank_page(tmp_path / "b.png"), tmp_path / "b.md"),
+        (_reshoot(test_image_path, tmp_path / "c.jpeg"), tmp_path / "c.md"),
+        (tmp_path / "missing.jpeg", tmp_path / "missing.md"),
+        (_ruled_page(tmp_path / "d.png", seed=1), tmp_path / "d.md"),
+        (_ruled_page(tmp_path / "e.png", seed=3), tmp_path / "e.md"),
+    ]
+
+    screening = screen_pages(pages, PageIndex(tmp_path / INDEX_FILENAME))
+
+    assert screening.extract == [pages[0], pages[3], pages[4], pages[5]]
+    assert screening.blank == [pages[1]]
+    assert screening.duplicates == [(tmp_path / "c.jpeg", tmp_path / "c.md", tmp_path / "a.md")]
+    assert set(screening.fingerprints) == {
+        tmp_path / "a.jpeg", tmp_path / "b.png", tmp_path / "c.jpeg", tmp_path / "d.png", tmp_path / "e.png",
+    }
+
+
+def _scans(test_image_path, tmp_path) -> Path:
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    shutil.copy(test_image_path, scans / "a.jpeg")
+    _blank_page(scans / "b.png")
+    _reshoot(test_image_path, scans / "c.jpeg")
+    return scans
+
+
+def test_parse_dir_dedup_alias(mocker, test_image_path, tmp_path):
+    """Test duplicates reuse the original's extraction and blank pages cost nothing."""
+    extract = mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    scans = _scans(test_image_path, tmp_path)
+    notes = tmp_path / "notes"
+
+    result = runner.invoke(app, [
+        "parse-dir", str(scans), "-o", str(notes), "--model", "ollama", "--no-cache", "--dedup", "alias",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert extract.call_count == 1
+    assert "b.png: skipped (blank page)" in result.stderr
+    assert "2/3 notes written" in result.stderr
+    assert not (notes / "b.md").exists()
+    assert "**Title**: c" in (notes / "c.md").read_text()
+    assert "- a point" in (notes / "c.md").read_text()
+    aliased = read_sidecar(notes / "c.extraction.json")
+    assert aliased.image == str((scans / "c.jpeg").resolve())
+    assert aliased.template == read_sidecar(notes / "a.extraction.json").template
+    assert Path(aliased.template).is_absolute()
+
+
+def test_parse_dir_dedup_skip_across_runs(mocker, test_image_path, tmp_path):
+    """Test a shot of a page parsed in an earlier run is skipped."""
+    extract = mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    scans = _scans(test_image_path, tmp_path)
+    notes = tmp_path / "notes"
+    (scans / "c.jpeg").rename(tmp_path / "c.jpeg")
+    runner.invoke(app, ["parse-dir", str(scans), "-o", str(notes), "--model", "ollama", "--dedup", "skip"])
+    shutil.move(tmp_path / "c.jpeg", scans / "c.jpeg")
+
+    result = runner.invoke(app, [
+        "parse-dir", str(scans), "-o", str(notes), "--model", "ollama", "--no-cache", "--dedup", "skip",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert extract.call_count == 2  # a.jpeg in each run; a re-run doesn't match a page to itself
+    assert f"c.jpeg: skipped (duplicate of {notes / 'a.md'})" in result.stderr
+    assert not (notes / "c.md").exists()
+
+
+def test_parse_dir_dedup_invalid(tmp_path):
+    """Test unknown modes and --batch-api are rejected."""
+    result = runner.invoke(app, ["parse-dir", str(tmp_path), "--dedup", "merge"])
+    assert result.exit_code == 1
+    assert "Unknown dedup mode" in result.stderr
+
+    result = runner.invoke(app, ["parse-dir", str(tmp_path), "--model", "claude", "--batch-api", "--dedup", "skip"])
+    assert result.exit_code == 1
+    assert "--dedup can't be combined with --batch-api" in result.stderr
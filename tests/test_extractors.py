@@ -0,0 +1,218 @@
+"""
+Tests for the extractor registry and backend lifecycles.
+"""
+
+import asyncio
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import extractors
+from notebook_parser.batch import find_images, plan_outputs, run_batch, run_batch_async
+from notebook_parser.extractors import (
+    BaseExtractor,
+    ClaudeExtractor,
+    Extractor,
+    OllamaExtractor,
+    available_extractors,
+    create_extractor,
+    register_extractor,
+)
+from notebook_parser.pipeline import ParseOptions, extract_page, open_extractor
+
+runner = CliRunner()
+
+
+class EchoExtractor(BaseExtractor):
+    """Test backend that records its lifecycle."""
+
+    name = "echo"
+    instances = []
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.calls = []
+        EchoExtractor.instances.append(self)
+
+    def open(self):
+        self.calls.append("open")
+
+    def close(self):
+        self.calls.append("close")
+
+    def describe(self):
+        return ["Using the echo backend..."]
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        self.calls.append("extract")
+        return f"- text of {image_path.stem}", None
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    """Give every test its own copy of the registry, without installed plugins."""
+    monkeypatch.setattr(extractors, "_registry", dict(extractors._registry))
+    monkeypatch.setattr(extractors, "_entry_points_loaded", True)
+    EchoExtractor.instances = []
+
+
+@pytest.fixture
+def pages(tmp_path):
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    for i in range(3):
+        Image.new('RGB', (50, 50), color='white').save(scans / f"page-{i}.jpg")
+    return plan_outputs(find_images(scans), scans, tmp_path / "out")
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = tmp_path / "template.md"
+    path.write_text("# {{title}}\n\n{{key_points}}\n")
+    return path
+
+
+def test_builtin_extractors_are_registered():
+    """Test the built-in backends implement the Extractor protocol."""
+    assert available_extractors() == ["local", "claude", "ollama"]
+    for name in available_extractors():
+        assert isinstance(create_extractor(ParseOptions(model=name)), Extractor)
+
+
+def test_create_extractor_rejects_unknown_model():
+    """Test an unknown model name lists the valid ones."""
+    with pytest.raises(ValueError, match="Unknown model 'nope'.*'claude'"):
+        create_extractor(ParseOptions(model="nope"))
+
+
+def test_builtin_optimize_settings():
+    """Test each backend declares the image size it uploads."""
+    assert create_extractor(ParseOptions(model="local")).optimize_settings is None
+    assert ClaudeExtractor.optimize_settings == (1568, 85)
+    assert OllamaExtractor.optimize_settings == (1024, 75)
+
+
+def test_local_extractor_uses_the_selected_model_and_settings(mocker, temp_test_image):
+    """Test the local backend loads options.trocr_model and passes every TrOCR setting through."""
+    get = mocker.patch("notebook_parser.extractors.model_registry.get")
+    extract = mocker.patch("notebook_parser.extractors.extract_text_local", return_value="line")
+    options = ParseOptions(
+        model="local", trocr_model="microsoft/trocr-base-handwritten", device="cpu",
+        segment=False, batch_size=2, preprocess_profile="fast", cv_threads=1,
+    )
+
+    with open_extractor(options) as extractor:
+        assert extractor.extract(temp_test_image, "{{key_points}}") == ("line", None)
+
+    get.assert_called_once_with("microsoft/trocr-base-handwritten", device="cpu")
+    extract.assert_called_once_with(
+        temp_test_image, preprocess=True, model_name="microsoft/trocr-base-handwritten", device="cpu",
+        segment=False, batch_size=2, preprocess_profile="fast", cv_threads=1,
+    )
+
+
+def test_claude_open_fails_early_on_missing_prompt():
+    """Test a missing prompt is reported before any page is sent."""
+    extractor = create_extractor(ParseOptions(model="claude", prompt="does-not-exist"))
+
+    with pytest.raises(FileNotFoundError):
+        extractor.open()
+
+
+def test_entry_point_plugins_are_discovered(mocker, monkeypatch):
+    """Test backends advertised under the entry point group are registered."""
+    monkeypatch.setattr(extractors, "_entry_points_loaded", False)
+    plugin = mocker.Mock()
+    plugin.name = "echo"
+    plugin.load.return_value = EchoExtractor
+    shadow = mocker.Mock()
+    shadow.name = "claude"
+    discovered = mocker.Mock()
+    discovered.select.return_value = [plugin, shadow]
+    mocker.patch("notebook_parser.extractors.entry_points", return_value=discovered)
+
+    assert "echo" in available_extractors()
+    assert isinstance(create_extractor(ParseOptions(model="echo")), EchoExtractor)
+    discovered.select.assert_called_once_with(group="notebook_parser.extractors")
+    # Plugins can't replace a built-in backend
+    shadow.load.assert_not_called()
+    assert create_extractor(ParseOptions(model="claude")).__class__ is ClaudeExtractor
+
+
+def test_broken_plugin_is_skipped_with_a_warning(mocker, monkeypatch):
+    """Test a plugin that fails to import leaves the built-in backends usable."""
+    monkeypatch.setattr(extractors, "_entry_points_loaded", False)
+    broken = mocker.Mock()
+    broken.name = "broken"
+    broken.value = "broken_plugin:Extractor"
+    broken.load.side_effect = ImportError("No module named 'torchvision'")
+    discovered = mocker.Mock()
+    discovered.select.return_value = [broken]
+    mocker.patch("notebook_parser.extractors.entry_points", return_value=discovered)
+
+    with pytest.warns(RuntimeWarning, match="Skipping extractor plugin 'broken'.*torchvision"):
+        names = available_extractors()
+
+    assert "broken" not in names
+    assert create_extractor(ParseOptions(model="local")).name == "local"
+
+
+def test_extract_page_opens_and_closes_one_shot_extractor(temp_test_image):
+    """Test extract_page without an extractor runs the full lifecycle."""
+    register_extractor("echo", EchoExtractor)
+
+    text, tags = extract_page(temp_test_image, "{{key_points}}", ParseOptions(model="echo"))
+
+    assert text.startswith("- text of")
+    assert tags is None
+    assert EchoExtractor.instances[0].calls == ["open", "extract", "close"]
+
+
+def test_run_batch_keeps_one_extractor_open(pages, template_path):
+    """Test a batch opens its backend once and reuses it for every page."""
+    register_extractor("echo", EchoExtractor)
+
+    results = run_batch(pages, template_path, ParseOptions(model="echo"))
+
+    assert all(result.ok for result in results)
+    [extractor] = EchoExtractor.instances
+    assert extractor.calls == ["open", "extract", "extract", "extract", "close"]
+
+
+def test_run_batch_async_keeps_one_extractor_open(pages, template_path):
+    """Test the async batch shares one open backend across pages."""
+    register_extractor("echo", EchoExtractor)
+
+    results = asyncio.run(run_batch_async(pages, template_path, ParseOptions(model="echo")))
+
+    assert all(result.ok for result in results)
+    [extractor] = EchoExtractor.instances
+    assert extractor.calls[0] == "open"
+    assert extractor.calls[-1] == "close"
+    assert extractor.calls.count("extract") == 3
+
+
+def test_parse_with_plugin_backend(temp_test_image, template_path, tmp_path):
+    """Test the CLI accepts registered backends and prints their description."""
+    register_extractor("echo", EchoExtractor)
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(output), "-t", str(template_path), "--model", "echo",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "Using the echo backend..." in result.stderr
+    assert "- text of" in output.read_text()
+
+
+def test_parse_unknown_model_lists_registered_backends(temp_test_image, tmp_path):
+    """Test the CLI error lists every registered backend."""
+    register_extractor("echo", EchoExtractor)
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(tmp_path / "note.md"), "--model", "nope",
+    ])
+
+    assert result.exit_code == 1
+    assert "'echo'" in result.stderr
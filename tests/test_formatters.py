@@ -64,3 +64,24 @@ def test_format_for_template_whitespace_only(temp_test_image):
     result = format_for_template("   \n  \t  ", temp_test_image)
 
     assert result["key_idea"] == "*No text extracted*"
+
+
+def test_format_for_template_with_structured_tags(temp_test_image):
+    """Test that a tag list from structured output is normalized."""
+    result = format_for_template("Test content", temp_test_image, ["#python", "machine learning", "python", " #ai "])
+
+    assert result["tags"] == "#python #machine-learning #ai #notes #handwritten"
+
+
+def test_format_for_template_with_empty_tag_list(temp_test_image):
+    """Test that an empty tag list falls back to default tags."""
+    result = format_for_template("Test content", temp_test_image, [])
+
+    assert result["tags"] == "#notes #handwritten"
+
+
+def test_format_for_template_keeps_given_date(temp_test_image):
+    """Test a re-rendered note keeps the date it was first written."""
+    result = format_for_template("Test content", temp_test_image, date="2024-03-01")
+
+    assert result["date"] == "2024-03-01"
@@ -0,0 +1,274 @@
+"""
+Tests for image optimization and payload caching.
+"""
+
+import base64
+import io
+import time
+import numpy as np
+import pytest
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import image_optimizer
+from notebook_parser.image_optimizer import (
+    ImageBudget,
+    PayloadCache,
+    estimate_claude_tokens,
+    get_payload_cache,
+    load_for_llm,
+    optimize_for_budget,
+    optimize_for_llm,
+    optimized_payload,
+    read_image_choice,
+)
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def large_image(tmp_path):
+    """Image larger than the optimizer's max size."""
+    path = tmp_path / "page.jpg"
+    Image.new('RGB', (3000, 2000), color='white').save(path)
+    return path
+
+
+def _text_page(path, font_size):
+    """Page of black text on white at the optimizer's reference size."""
+    img = Image.new('RGB', (1568, 1176), color='white')
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=font_size)
+    for y in range(20, 1100, int(font_size * 1.5)):
+        draw.text((20, y), "The quick brown fox jumps over the lazy dog " * 3, fill='black', font=font)
+    img.save(path)
+    return path
+
+
+@pytest.fixture
+def dense_page(tmp_path):
+    """Full page of small handwriting-sized text."""
+    return _text_page(tmp_path / "dense.png", 16)
+
+
+@pytest.fixture
+def sparse_page(tmp_path):
+    """Few lines of large text, like a sticky note."""
+    return _text_page(tmp_path / "sparse.png", 90)
+
+
+@pytest.fixture
+def count_optimize(mocker):
+    """Spy on the expensive decode/resize/encode step."""
+    return mocker.patch.object(image_optimizer, "optimize_for_llm", wraps=optimize_for_llm)
+
+
+def test_optimize_for_llm_resizes_and_converts(large_image):
+    """Test that the longest side is clamped and grayscale is applied."""
+    with Image.open(io.BytesIO(optimize_for_llm(large_image, max_size=1000, grayscale=True))) as img:
+        assert img.size == (1000, 666)
+        assert img.mode == "L"
+
+
+def test_payload_cache_memoizes_in_memory(tmp_path, large_image, count_optimize):
+    """Test that repeated requests reuse the same payload."""
+    cache = PayloadCache(tmp_path / "payloads")
+
+    first = cache.get(large_image, max_size=1024, quality=75)
+    second = cache.get(large_image, max_size=1024, quality=75)
+
+    assert first is second
+    assert base64.b64decode(first[1]) == first[0]
+    assert count_optimize.call_count == 1
+
+
+def test_payload_cache_reads_from_disk(tmp_path, large_image, count_optimize):
+    """Test that a new process (fresh cache object) reuses payloads on disk."""
+    first = PayloadCache(tmp_path / "payloads").get(large_image)
+    second = PayloadCache(tmp_path / "payloads").get(large_image)
+
+    assert first == second
+    assert count_optimize.call_count == 1
+
+
+def test_payload_cache_keys_by_settings(tmp_path, large_image, count_optimize):
+    """Test that each optimization setting gets its own payload."""
+    cache = PayloadCache(tmp_path / "payloads")
+
+    cache.get(large_image, max_size=1568, quality=85)
+    cache.get(large_image, max_size=1024, quality=85)
+    cache.get(large_image, max_size=1024, quality=75)
+    cache.get(large_image, max_size=1024, quality=75, grayscale=True)
+
+    assert count_optimize.call_count == 4
+    assert cache.stats()["entries"] == 4
+
+
+def test_payload_cache_bounds_memory(tmp_path):
+    """Test that memory use stays within budget."""
+    noisy = tmp_path / "noisy.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (800, 800, 3), dtype=np.uint8)).save(noisy)
+    cache = PayloadCache(tmp_path / "payloads", max_memory_bytes=200_000)
+
+    for size in (200, 300, 400, 500, 600, 700):
+        cache.get(noisy, max_size=size)
+
+    stats = cache.stats()
+    assert stats["memory_bytes"] <= 200_000
+    assert stats["memory_entries"] < 6
+    assert stats["entries"] == 6
+
+
+def test_payload_cache_prune(tmp_path, large_image):
+    """Test disk pruning by size."""
+    cache = PayloadCache(tmp_path / "payloads")
+    for size in (200, 400, 600):
+        cache.get(large_image, max_size=size)
+
+    assert cache.prune(max_bytes=0) == 3
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_optimized_payload_uses_shared_cache(large_image, isolated_cache_dir, count_optimize):
+    """Test the module-level helper shares one cache per cache directory."""
+    optimized_payload(large_image)
+    optimized_payload(large_image)
+
+    assert count_optimize.call_count == 1
+    assert get_payload_cache().directory == isolated_cache_dir / "payloads"
+
+
+def test_estimate_claude_tokens():
+    """Test the width * height / 750 estimate and Claude's resize cap."""
+    assert estimate_claude_tokens(750, 1) == 1
+    assert estimate_claude_tokens(1000, 1000) == 1334
+    assert estimate_claude_tokens(1568, 1176) == 1600
+
+
+def test_optimize_for_budget_adapts_to_content(dense_page, sparse_page):
+    """Test large writing is sent smaller than a dense page."""
+    _, dense = optimize_for_budget(dense_page, ImageBudget())
+    _, sparse = optimize_for_budget(sparse_page, ImageBudget())
+
+    assert dense.legible and sparse.legible
+    assert sparse.tokens < dense.tokens
+    assert dense.tokens < estimate_claude_tokens(1568, 1176)
+
+
+def test_optimize_for_budget_respects_token_budget(dense_page):
+    """Test the image never exceeds the token budget, even below the threshold."""
+    data, choice = optimize_for_budget(dense_page, ImageBudget(max_tokens=300))
+
+    assert choice.tokens <= 300
+    assert not choice.legible
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (choice.width, choice.height)
+
+
+def test_optimize_for_budget_respects_byte_budget(dense_page):
+    """Test quality and size drop until the payload fits the byte budget."""
+    data, choice = optimize_for_budget(dense_page, ImageBudget(max_bytes=20_000))
+
+    assert len(data) <= 20_000
+    assert choice.size_bytes == len(data)
+
+
+def test_image_choice_round_trips_through_jpeg(sparse_page):
+    """Test the chosen parameters can be read back from the payload."""
+    data, choice = optimize_for_budget(sparse_page, ImageBudget(max_tokens=800))
+
+    assert read_image_choice(data) == choice
+    assert read_image_choice(optimize_for_llm(sparse_page)) is None
+    assert f"~{choice.tokens} tokens" in choice.summary()
+
+
+def test_payload_cache_keys_by_budget(tmp_path, sparse_page):
+    """Test budgeted payloads don't collide with fixed-setting payloads."""
+    cache = PayloadCache(tmp_path / "payloads")
+
+    fixed, _ = cache.get(sparse_page)
+    small, _ = cache.get(sparse_page, budget=ImageBudget(max_tokens=200))
+    larger, _ = cache.get(sparse_page, budget=ImageBudget(max_tokens=1000))
+
+    assert len({fixed, small, larger}) == 3
+    assert read_image_choice(small).tokens <= 200
+
+
+def test_parse_reports_image_budget_choice(mocker, sparse_page, tmp_path):
+    """Test parse prints the chosen size and hands the payload to the backend."""
+    extract = mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(sparse_page), "-o", str(tmp_path / "note.md"),
+        "--model", "ollama", "--max-image-tokens", "500",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "Image:" in result.stderr
+    assert "tokens" in result.stderr
+    image_bytes = extract.call_args.kwargs["image_bytes"]
+    assert read_image_choice(image_bytes).tokens <= 500
+    assert extract.call_args.kwargs["budget"] == ImageBudget(max_tokens=500)
+
+
+def _full_decode(image_path, max_size=1568):
+    """Optimizer behaviour before draft decoding: full decode, one LANCZOS pass."""
+    img = ImageOps.exif_transpose(Image.open(image_path)).convert('RGB')
+    scale = max_size / max(img.size)
+    if scale >= 1:
+        return img
+    size = (max_size, int(img.height * scale)) if img.width > img.height else (int(img.width * scale), max_size)
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+
+def _psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=float) - np.asarray(b, dtype=float)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def _best_time(fn, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize("name", ["test_image_1.jpeg", "test_image_2.JPG"])
+def test_draft_decode_matches_full_decode(name):
+    """Test draft-mode decoding of the sample photos is visually equivalent."""
+    path = Path("data") / name
+
+    expected = _full_decode(path)
+    actual = load_for_llm(path)
+
+    assert actual.size == expected.size
+    assert _psnr(actual, expected) > 40
+
+
+def test_draft_decode_is_faster_on_phone_photos():
+    """Benchmark: a 12 MP phone photo decodes at least 1.3x faster (about 2x on an idle machine)."""
+    path = Path("data/test_image_2.JPG")
+    with Image.open(path) as img:
+        assert img.width * img.height > 12_000_000
+
+    full = _best_time(lambda: _full_decode(path))
+    draft = _best_time(lambda: load_for_llm(path))
+
+    assert full / draft > 1.3, f"full decode {full * 1000:.0f} ms, draft {draft * 1000:.0f} ms"
+
+
+def test_load_for_llm_applies_exif_orientation(tmp_path):
+    """Test a photo stored sideways comes out upright with the right size."""
+    path = tmp_path / "sideways.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees clockwise
+    Image.new('RGB', (4000, 3000), color='white').save(path, exif=exif)
+
+    img = load_for_llm(path, max_size=1000, grayscale=True)
+
+    assert img.size == (750, 1000)
+    assert img.mode == "L"
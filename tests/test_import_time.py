@@ -0,0 +1,112 @@
+"""
+Cold-start guards: the CLI must not import heavy dependencies it doesn't use.
+
+Each check runs in a fresh interpreter, since this test process has
+already imported most of the package.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Modules that cost hundreds of milliseconds or more to import
+HEAVY_MODULES = ["torch", "transformers", "cv2", "numpy", "anthropic", "requests", "httpx"]
+
+# Cumulative import time allowed for notebook_parser.cli (microseconds).
+# Loading the ML and API stacks eagerly took several seconds.
+CLI_IMPORT_BUDGET_US = 1_000_000
+
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+
+
+def _loaded_heavy_modules(code: str) -> list[str]:
+    """Run code in a fresh interpreter and list the heavy modules it imported."""
+    script = code + f"""
+import json, sys
+print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+"""
+    return json.loads(_run(script).stdout.strip().splitlines()[-1])
+
+
+def test_cli_import_is_light():
+    """Test importing the CLI pulls in none of the heavy dependencies."""
+    assert _loaded_heavy_modules("import notebook_parser.cli") == []
+
+
+def test_cli_import_time_budget():
+    """Test the cumulative import time of the CLI stays within budget."""
+    result = _run("import notebook_parser.cli", "-X", "importtime")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = (part.strip() for part in line.split("|"))
+        if total.isdigit():
+            cumulative[name] = int(total)
+
+    assert cumulative["notebook_parser.cli"] < CLI_IMPORT_BUDGET_US
+
+
+@pytest.mark.parametrize("command", [
+    [], ["read"], ["parse"], ["parse-dir"], ["watch"], ["serve"], ["rerender"], ["collect"], ["stats"],
+    ["cache", "stats"], ["cache", "prune"],
+])
+def test_command_help_is_light(command):
+    """Test --help for every command loads no heavy dependency."""
+    code = f"""
+from typer.testing import CliRunner
+from notebook_parser.cli import app
+result = CliRunner().invoke(app, {command + ["--help"]!r})
+assert result.exit_code == 0, result.output
+"""
+    assert _loaded_heavy_modules(code) == []
+
+
+def test_cache_stats_is_light(tmp_path):
+    """Test a command that runs end to end without any backend stays light."""
+    code = f"""
+import os
+os.environ["NOTEBOOK_PARSER_CACHE_DIR"] = {str(tmp_path)!r}
+from typer.testing import CliRunner
+from notebook_parser.cli import app
+result = CliRunner().invoke(app, ["cache", "stats"])
+assert result.exit_code == 0, result.output
+"""
+    assert _loaded_heavy_modules(code) == []
+
+
+def test_claude_parse_skips_local_ocr_stack(tmp_path):
+    """Test a Claude parse never imports torch, transformers or OpenCV."""
+    image = tmp_path / "page.jpg"
+    code = f"""
+import os
+os.environ["NOTEBOOK_PARSER_CACHE_DIR"] = {str(tmp_path / "cache")!r}
+from PIL import Image
+Image.new("RGB", (64, 64), "white").save({str(image)!r})
+from typer.testing import CliRunner
+from notebook_parser import extractors
+from notebook_parser.cli import app
+extractors.extract_with_claude = lambda **kwargs: "- a point"
+result = CliRunner().invoke(app, [
+    "parse", "-i", {str(image)!r}, "-o", {str(tmp_path / "note.md")!r}, "--model", "claude",
+])
+assert result.exit_code == 0, result.output
+"""
+    loaded = _loaded_heavy_modules(code)
+
+    assert not {"torch", "transformers", "cv2"} & set(loaded)
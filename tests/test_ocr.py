@@ -0,0 +1,154 @@
+"""
+Tests for local OCR: model registry, line segmentation and batching.
+"""
+
+import pytest
+from unittest.mock import MagicMock
+from PIL import Image, ImageDraw
+from notebook_parser import ocr
+from notebook_parser.ocr import ModelRegistry, extract_text_local, recognize_lines, segment_lines
+
+
+@pytest.fixture
+def fake_loader(mocker):
+    """Replace model loading with cheap stand-ins."""
+    return mocker.patch(
+        "notebook_parser.ocr._load_trocr",
+        side_effect=lambda model_name, device, dtype: (MagicMock(name="processor"), MagicMock(name=model_name))
+    )
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fresh shared registry for each test."""
+    fresh = ModelRegistry()
+    monkeypatch.setattr(ocr, "model_registry", fresh)
+    return fresh
+
+
+def test_registry_loads_each_model_once(fake_loader, registry):
+    """Test that repeated lookups reuse the loaded model."""
+    first = registry.get("trocr-small", device="cpu")
+    second = registry.get("trocr-small", device="cpu")
+
+    assert first is second
+    assert fake_loader.call_count == 1
+
+
+def test_registry_keys_by_device_and_dtype(fake_loader, registry):
+    """Test that device and dtype are part of the cache key."""
+    registry.get("trocr-small", device="cpu")
+    registry.get("trocr-small", device="cuda")
+    registry.get("trocr-small", device="cpu", dtype="float16")
+
+    assert fake_loader.call_count == 3
+    assert len(registry.loaded()) == 2  # default max_models
+
+
+def test_registry_evicts_least_recently_used(fake_loader):
+    """Test LRU eviction once max_models is exceeded."""
+    registry = ModelRegistry(max_models=2)
+    registry.get("a", device="cpu")
+    registry.get("b", device="cpu")
+    registry.get("a", device="cpu")
+    registry.get("c", device="cpu")
+
+    assert registry.loaded() == [("a", "cpu", None), ("c", "cpu", None)]
+
+
+def test_registry_unload(fake_loader, registry):
+    """Test explicit unloading by model name and of everything."""
+    registry.get("a", device="cpu")
+    registry.get("b", device="cpu")
+
+    assert registry.unload("a") == 1
+    assert registry.loaded() == [("b", "cpu", None)]
+    assert registry.unload() == 1
+    assert registry.loaded() == []
+
+    registry.get("a", device="cpu")
+    assert fake_loader.call_count == 3
+
+
+def test_extract_text_local_reuses_model(fake_loader, registry, temp_test_image):
+    """Test that consecutive extractions load the model only once."""
+    for _ in range(3):
+        extract_text_local(temp_test_image, preprocess=False, model_name="trocr-small", device="cpu")
+
+    assert fake_loader.call_count == 1
+    processor, model = registry.get("trocr-small", device="cpu")
+    assert model.generate.call_count == 3
+
+
+def _draw_line(draw, top, left, right, height=14):
+    """Draw short vertical strokes standing in for handwriting."""
+    for x in range(left, right, 6):
+        draw.rectangle([x, top, x + 1, top + height], fill="black")
+
+
+def test_segment_lines_finds_lines_in_reading_order():
+    """Test that each text line becomes one crop, top to bottom."""
+    page = Image.new("RGB", (400, 300), color="white")
+    draw = ImageDraw.Draw(page)
+    _draw_line(draw, 200, 20, 380)
+    _draw_line(draw, 40, 50, 150)
+    _draw_line(draw, 120, 10, 300)
+
+    lines = segment_lines(page)
+
+    assert len(lines) == 3
+    assert lines[0].width < lines[1].width < lines[2].width
+    assert all(15 <= line.height <= 25 for line in lines)
+
+
+def test_segment_lines_ignores_ruling_and_specks():
+    """Test that ruled lines and thin bands are not treated as text."""
+    page = Image.new("RGB", (400, 300), color="white")
+    draw = ImageDraw.Draw(page)
+    for y in range(30, 300, 40):
+        draw.line([0, y, 399, y], fill="gray")
+    _draw_line(draw, 50, 20, 380)
+    _draw_line(draw, 150, 20, 380, height=3)
+
+    assert len(segment_lines(page)) == 1
+
+
+def test_segment_lines_blank_page_falls_back_to_whole_image(temp_test_image):
+    """Test that a page without ink is returned whole."""
+    page = Image.open(temp_test_image).convert("RGB")
+
+    lines = segment_lines(page)
+
+    assert len(lines) == 1
+    assert lines[0].size == page.size
+
+
+class _EchoProcessor:
+    """Processor stand-in whose decoded text is the image width."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images, return_tensors):
+        self.batches.append(len(images))
+        pixel_values = MagicMock()
+        pixel_values.to.return_value = list(images)
+        return MagicMock(pixel_values=pixel_values)
+
+    def batch_decode(self, generated_ids, skip_special_tokens):
+        return [f"w{image.width}" for image in generated_ids]
+
+
+def test_recognize_lines_batches_and_keeps_order():
+    """Test that lines are recognized in batches but returned in input order."""
+    widths = [50, 300, 120, 10, 220]
+    lines = [Image.new("RGB", (width, 20)) for width in widths]
+    processor = _EchoProcessor()
+    model = MagicMock()
+    model.generate.side_effect = lambda pixel_values: pixel_values
+
+    texts = recognize_lines(lines, processor, model, batch_size=2)
+
+    assert texts == [f"w{width}" for width in widths]
+    assert processor.batches == [2, 2, 1]
+    assert model.generate.call_count == 3
@@ -0,0 +1,85 @@
+"""
+Tests for the Ollama vision backend.
+"""
+
+import asyncio
+import pytest
+from notebook_parser.cache import ExtractionCache
+from notebook_parser.llm.clients import check_ollama
+from notebook_parser.llm.ollama_vision import extract_with_ollama, extract_with_ollama_async
+
+
+@pytest.fixture
+def ollama(anthropic_stub):
+    """Ollama endpoints served by the local API stub."""
+    anthropic_stub.routes[("GET", "/api/tags")] = lambda _: (200, {"models": []})
+    anthropic_stub.routes[("POST", "/api/generate")] = lambda _: (200, {"response": " - from ollama \n", "done": True})
+    return anthropic_stub
+
+
+def test_extract_with_ollama(ollama, temp_test_image):
+    """Test the blocking client checks health and returns the stripped response."""
+    text = extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url)
+
+    assert text == "- from ollama"
+    assert [request["path"] for request in ollama.requests] == ["/api/tags", "/api/generate"]
+    body = ollama.requests[1]["body"]
+    assert body["model"] == "llama3.2-vision"
+    assert body["stream"] is False
+    assert len(body["images"]) == 1
+
+
+def test_async_extraction_sends_same_request_as_sync(ollama, temp_test_image):
+    """Test the async client builds the same request as the blocking one."""
+    sync_text = extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url)
+    async_text = asyncio.run(extract_with_ollama_async(temp_test_image, "{{key_points}}", ollama_url=ollama.url))
+
+    assert sync_text == async_text
+    sync_body, async_body = (request["body"] for request in ollama.requests if request["path"] == "/api/generate")
+    assert sync_body == async_body
+
+
+def test_async_extraction_uses_cache(ollama, temp_test_image, tmp_path):
+    """Test cached results skip the Ollama server entirely."""
+    cache = ExtractionCache(tmp_path / "cache.sqlite3")
+
+    asyncio.run(extract_with_ollama_async(temp_test_image, "{{key_points}}", ollama_url=ollama.url, cache=cache))
+    asyncio.run(extract_with_ollama_async(temp_test_image, "{{key_points}}", ollama_url=ollama.url, cache=cache))
+
+    assert len(ollama.requests) == 2
+
+
+def test_async_extraction_reports_unreachable_server(temp_test_image):
+    """Test a helpful error when Ollama is not running."""
+    with pytest.raises(ConnectionError, match="Cannot connect to Ollama"):
+        asyncio.run(extract_with_ollama_async(temp_test_image, "{{key_points}}", ollama_url="http://127.0.0.1:9"))
+
+
+def test_health_check_is_cached_across_pages(ollama, temp_test_image, tmp_path):
+    """Test consecutive pages share one health check and one connection."""
+    other = tmp_path / "other.jpg"
+    other.write_bytes(temp_test_image.read_bytes())
+
+    extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url)
+    extract_with_ollama(other, "{{key_points}}", ollama_url=ollama.url)
+
+    assert [request["path"] for request in ollama.requests] == ["/api/tags", "/api/generate", "/api/generate"]
+    assert len({request["client"] for request in ollama.requests}) == 1
+
+
+def test_keep_alive_is_sent(ollama, temp_test_image):
+    """Test the model is asked to stay loaded between pages."""
+    extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url, keep_alive="-1")
+
+    assert ollama.requests[1]["body"]["keep_alive"] == "-1"
+
+
+def test_health_check_expires(ollama, mocker):
+    """Test a cached health check is repeated after its TTL."""
+    clock = mocker.patch("notebook_parser.llm.clients.time.monotonic", return_value=100.0)
+    check_ollama(ollama.url, ttl=30)
+    check_ollama(ollama.url, ttl=30)
+    clock.return_value = 131.0
+    check_ollama(ollama.url, ttl=30)
+
+    assert len(ollama.requests) == 2
@@ -0,0 +1,186 @@
+"""
+Tests for page detection, deskew and cropping.
+"""
+
+import io
+import os
+import time
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import page_crop
+from notebook_parser.image_optimizer import (
+    IN_USE_SECONDS,
+    PayloadCache,
+    estimate_claude_tokens,
+    get_payload_cache,
+    optimize_for_llm,
+)
+from notebook_parser.page_crop import (
+    PageCrop,
+    crop_page,
+    estimate_skew,
+    find_page,
+    ink_box,
+    read_page_crop,
+    warp_page,
+)
+
+runner = CliRunner()
+
+# Where the page corners land in the synthetic photo
+PAGE_CORNERS = np.float32([[350, 250], [1280, 330], [1350, 1700], [260, 1640]])
+
+
+def _page(skew=0.0, text=True):
+    """Ruled page with a block of writing in its upper half."""
+    page = np.full((1400, 1000), 235, np.uint8)
+    for y in range(150, 1300, 60):
+        cv2.line(page, (0, y), (999, y), 200, 1)
+    if text:
+        for row, y in enumerate(range(200, 800, 60)):
+            words = ["note", "page", "stack", "queue", "ram"]
+            line = " ".join(words[(row + i) % len(words)] for i in range(5))
+            cv2.putText(page, line, (250, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 40, 2)
+    if skew:
+        matrix = cv2.getRotationMatrix2D((500, 700), skew, 1.0)
+        page = cv2.warpAffine(page, matrix, (1000, 1400), borderValue=235)
+    return page
+
+
+def _photo(page):
+    """The page photographed at an angle on a dark, noisy desk."""
+    rng = np.random.default_rng(0)
+    photo = (60 + rng.integers(0, 25, (2000, 1600))).astype(np.uint8)
+    source = np.float32([[0, 0], [999, 0], [999, 1399], [0, 1399]])
+    matrix = cv2.getPerspectiveTransform(source, PAGE_CORNERS)
+    warped = cv2.warpPerspective(page, matrix, (1600, 2000))
+    inside = cv2.warpPerspective(np.full_like(page, 255), matrix, (1600, 2000)) > 0
+    photo[inside] = warped[inside]
+    return photo
+
+
+@pytest.fixture
+def desk_photo(tmp_path):
+    """Tilted, skewed photo of a page on a desk."""
+    path = tmp_path / "desk.jpg"
+    Image.fromarray(_photo(_page(skew=3.0))).convert("RGB").save(path, quality=92)
+    return path
+
+
+def test_find_page_locates_corners():
+    """Test the page quadrilateral is found on a busy background."""
+    corners = find_page(_photo(_page()))
+
+    assert corners is not None
+    assert np.abs(corners - PAGE_CORNERS).max() < 15
+
+
+def test_find_page_ignores_frame_filling_scan():
+    """Test a flat scan with no page edge is left alone."""
+    assert find_page(_page()) is None
+
+
+def test_warp_page_flattens_perspective():
+    """Test the lines of a photographed page are level after the warp."""
+    photo = _photo(_page())
+    tilted = cv2.resize(photo, (800, 1000), interpolation=cv2.INTER_AREA)
+
+    flat = warp_page(photo, find_page(photo))
+    small = cv2.resize(flat, (flat.shape[1] // 2, flat.shape[0] // 2), interpolation=cv2.INTER_AREA)
+
+    assert abs(estimate_skew(tilted)) > 2
+    assert estimate_skew(small) == pytest.approx(0.0, abs=0.3)
+
+
+@pytest.mark.parametrize("skew", [-4.0, 0.0, 2.5])
+def test_estimate_skew_levels_lines(skew):
+    """Test the deskew angle undoes the page rotation."""
+    angle = estimate_skew(cv2.resize(_page(skew=skew), (500, 700), interpolation=cv2.INTER_AREA))
+
+    assert angle == pytest.approx(-skew, abs=0.3)
+
+
+def test_ink_box_ignores_ruled_lines():
+    """Test the crop hugs the writing, not the rules that run down the page."""
+    left, top, right, bottom = ink_box(_page())
+
+    assert 150 < left < 250 and 100 < top < 180
+    assert 550 < right < 750 and 780 < bottom < 900
+
+
+def test_ink_box_blank_page():
+    """Test a ruled page without writing has no ink box."""
+    assert ink_box(_page(text=False)) is None
+
+
+def test_crop_page_reduces_pixels(desk_photo):
+    """Test the crop keeps only the written area, straightened."""
+    image, crop = crop_page(desk_photo)
+
+    assert crop.page_found
+    assert crop.angle == pytest.approx(-3.0, abs=0.5)
+    assert crop.area_ratio < 0.25
+    assert image.size == (crop.width, crop.height)
+
+
+def test_crop_page_saves_image_tokens(desk_photo):
+    """Test the cropped page costs far fewer tokens and keeps the writing at full resolution."""
+    cropped_path = get_payload_cache().cropped_page(desk_photo)
+
+    full = Image.open(io.BytesIO(optimize_for_llm(desk_photo)))
+    cropped = Image.open(io.BytesIO(optimize_for_llm(cropped_path)))
+
+    assert estimate_claude_tokens(*cropped.size) * 2 < estimate_claude_tokens(*full.size)
+    # The whole photo is downscaled to fit max_size, the crop is not
+    assert full.height < Image.open(desk_photo).height
+    assert cropped.size == Image.open(cropped_path).size
+
+
+def test_cropped_page_is_cached(desk_photo, mocker):
+    """Test the crop runs once per image and stores what it did."""
+    cache = get_payload_cache()
+    spy = mocker.spy(page_crop, "crop_page")
+
+    first = cache.cropped_page(desk_photo)
+    second = cache.cropped_page(desk_photo)
+
+    assert first == second
+    assert spy.call_count == 1
+    assert isinstance(read_page_crop(first), PageCrop)
+    assert cache.stats()["entries"] == 1
+
+
+def test_cropped_page_survives_pruning(desk_photo, tmp_path):
+    """Test a crop handed out to a backend isn't pruned before it is read."""
+    cache = PayloadCache(tmp_path / "payloads", max_disk_bytes=1)
+    cache.get(desk_photo, max_size=300)
+    cropped_path = cache.cropped_page(desk_photo)
+    stale_path = next(path for path in cache.directory.glob("*/*.jpg") if path != cropped_path)
+    long_ago = time.time() - IN_USE_SECONDS - 60
+    os.utime(stale_path, (long_ago, long_ago))
+
+    # Another page's payload takes the cache over budget
+    cache.get(desk_photo, max_size=200)
+
+    assert not stale_path.exists()
+    assert Image.open(cropped_path).size == crop_page(desk_photo)[0].size
+
+
+def test_parse_crop_page_sends_cropped_image(mocker, desk_photo, tmp_path):
+    """Test --crop-page reports the crop and extracts from the cropped page."""
+    extract = mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(desk_photo), "-o", str(output), "--model", "ollama", "--crop-page",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert "Page: page found" in result.stderr
+    assert extract.call_args.kwargs["image_path"] == get_payload_cache().cropped_page(desk_photo)
+    # The note still points at the original photo
+    assert desk_photo.name in output.read_text()
@@ -7,6 +7,7 @@ from pathlib import Path
 from PIL import Image
 import numpy as np
 from notebook_parser.ocr import preprocess_image
+from notebook_parser.preprocess import PROFILES, WORKING_SIZE, preprocess_page, set_cv_threads
 
 
 def test_preprocess_image_returns_pil_image(test_image_path):
@@ -47,3 +48,74 @@ def test_preprocess_image_output_dimensions(test_image_path):
 
     # Dimensions should be the same
     assert processed.size == original.size
+
+
+# Preprocessing profiles and benchmark
+
+PHONE_PHOTO = Path("data/test_image_2.JPG")  # 12 MP, stored sideways (EXIF orientation 6)
+
+
+def _psnr(a, b):
+    a = np.asarray(a.convert("L"), dtype=float)
+    b = np.asarray(b.convert("L"), dtype=float)
+    return 10 * np.log10(255 ** 2 / np.mean((a - b) ** 2))
+
+
+@pytest.mark.parametrize("profile", ["fast", "balanced", "smooth"])
+def test_profiles_downscale_to_working_resolution(profile):
+    """Test phone photos are reduced to the OCR working size, upright."""
+    result = preprocess_page(PHONE_PHOTO, profile=profile)
+
+    assert result.image.mode == "RGB"
+    assert result.image.size == (WORKING_SIZE * 3 // 4, WORKING_SIZE)
+    assert list(result.timings)[:2] == ["decode", "resize"]
+    assert ("denoise" in result.timings) == (PROFILES[profile].denoise != "none")
+
+
+def test_full_profile_keeps_resolution(test_image_path):
+    """Test the full profile skips the downscale."""
+    original = Image.open(test_image_path)
+
+    result = preprocess_page(test_image_path, profile="full")
+
+    assert result.image.size == original.size
+
+
+def test_unknown_profile_is_rejected(test_image_path):
+    """Test an unknown profile name lists the valid ones."""
+    with pytest.raises(ValueError, match="Unknown preprocessing profile 'sharp'.*'balanced'"):
+        preprocess_page(test_image_path, profile="sharp")
+
+
+def test_set_cv_threads(mocker):
+    """Test the OpenCV thread count is only changed when given."""
+    import cv2
+    set_threads = mocker.patch.object(cv2, "setNumThreads")
+
+    set_cv_threads(None)
+    set_cv_threads(2)
+
+    set_threads.assert_called_once_with(2)
+
+
+def test_cheap_profiles_match_non_local_means():
+    """Test the cheap denoisers at working resolution stay close to the non-local means result."""
+    quality = preprocess_page(PHONE_PHOTO, profile="quality")
+
+    for profile in ("fast", "balanced", "smooth"):
+        assert _psnr(preprocess_page(PHONE_PHOTO, profile=profile).image, quality.image) > 30
+
+
+@pytest.mark.benchmark
+def test_benchmark_profiles():
+    """
+    Benchmark: cheap denoisers at working resolution vs non-local means.
+
+    On the 12 MP sample, 'balanced' takes ~130 ms against ~3 s for
+    'quality' and ~19 s for 'full' (not run here).
+    """
+    balanced = preprocess_page(PHONE_PHOTO, profile="balanced")
+    quality = preprocess_page(PHONE_PHOTO, profile="quality")
+
+    assert balanced.total * 5 < quality.total
+    assert balanced.timings["denoise"] * 50 < quality.timings["denoise"]
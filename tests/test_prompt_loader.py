@@ -2,9 +2,10 @@
 Tests for prompt loader module.
 """
 
+import os
 import pytest
 from pathlib import Path
-from src.notebook_parser.prompt_loader import PromptLoader
+from src.notebook_parser.prompt_loader import PromptLoader, compose_prompt, compose_prompt_with_tags, split_tags_prompt
 
 
 def test_get_prompts_dir():
@@ -61,3 +62,84 @@ def test_get_default_prompt():
     assert len(prompt) > 0
     assert "handwritten" in prompt.lower()
     assert "extract" in prompt.lower()
+
+
+def test_load_prompt_tags_and_bullet_points():
+    """Test loading the single-request tags-and-bullet-points prompt."""
+    prompt = PromptLoader.load_prompt("tags-and-bullet-points")
+
+    assert "tag" in prompt.lower()
+    assert "record_note" in prompt
+    assert "{tags}" not in prompt
+
+
+@pytest.fixture
+def prompts_dir(tmp_path, monkeypatch):
+    """Point the loader at an empty prompts directory."""
+    monkeypatch.setattr(PromptLoader, "get_prompts_dir", staticmethod(lambda: tmp_path))
+    return tmp_path
+
+
+def test_load_prompt_cached_until_modified(prompts_dir):
+    """Test a prompt is read once and again only after the file changes."""
+    path = prompts_dir / "notes.txt"
+    path.write_text("Read the notes.\n")
+    assert PromptLoader.load_prompt("notes") == "Read the notes."
+
+    # Same size and mtime: served from memory
+    stat = path.stat()
+    path.write_text("Skim the notes.\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert PromptLoader.load_prompt("notes") == "Read the notes."
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert PromptLoader.load_prompt("notes") == "Skim the notes."
+
+
+def test_load_all_validates_prompts(prompts_dir):
+    """Test every prompt is loaded, and unusable ones are rejected."""
+    (prompts_dir / "bullet-points.txt").write_text("Bullets.")
+    (prompts_dir / "bullet-points-with-tags.txt").write_text("Topics: {tags}")
+    assert PromptLoader.load_all() == {"bullet-points": "Bullets.", "bullet-points-with-tags": "Topics: {tags}"}
+
+    (prompts_dir / "bullet-points-with-tags.txt").write_text("No topics here")
+    with pytest.raises(ValueError, match="must contain"):
+        PromptLoader.load_all()
+
+    (prompts_dir / "bullet-points-with-tags.txt").write_text("   \n")
+    with pytest.raises(ValueError, match="empty"):
+        PromptLoader.load_all()
+
+
+def test_load_all_repo_prompts():
+    """Test the shipped prompts all pass validation."""
+    prompts = PromptLoader.load_all()
+
+    assert {"bullet-points", "generate-tags", "bullet-points-with-tags", "tags-and-bullet-points"} <= set(prompts)
+
+
+def test_compose_prompt_reused():
+    """Test the prompt and template prefix is built once per pair."""
+    first = compose_prompt("Extract the notes.", "# {{title}}")
+
+    assert first == "Extract the notes.\n\nThe extracted text will be used to fill this template:\n\n# {{title}}"
+    assert compose_prompt("Extract the notes.", "# {{title}}") is first
+
+
+def test_compose_prompt_with_tags_only_fills_prompt():
+    """Test tags go into the prompt's {tags}, not the template's {{tags}}."""
+    prompt = PromptLoader.load_prompt("bullet-points-with-tags")
+    template = "**Tags**: {{tags}}\n{{key_points}}"
+
+    composed = compose_prompt_with_tags(prompt, template, "#rust #memory")
+
+    assert composed == compose_prompt(prompt.replace("{tags}", "#rust #memory"), template)
+    assert composed.endswith("**Tags**: {{tags}}\n{{key_points}}")
+
+
+def test_split_tags_prompt_moves_tags_lines_out():
+    """Test the shared part has no {tags} line and no doubled blank lines left behind."""
+    shared, tags_lines = split_tags_prompt("Read the page.\n\nTopics: {tags}\n\nUse bullet points.")
+
+    assert shared == "Read the page.\n\nUse bullet points."
+    assert tags_lines == "Topics: {tags}"
@@ -0,0 +1,286 @@
+"""
+Tests for the local HTTP service and local OCR request coalescing.
+"""
+
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from PIL import Image
+from notebook_parser import extractors, server as server_module
+from notebook_parser.extractors import BaseExtractor, register_extractor
+from notebook_parser.ocr import LineBatcher
+from notebook_parser.pipeline import ParseOptions
+from notebook_parser.server import NoteService, QueueFull, make_server
+from notebook_parser.template_engine import TemplateEngine
+
+
+class GateExtractor(BaseExtractor):
+    """Test backend that blocks until released, to hold requests in flight."""
+
+    name = "gate"
+    opened = 0
+    gate = None
+
+    def open(self):
+        GateExtractor.opened += 1
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        if GateExtractor.gate is not None:
+            assert GateExtractor.gate.wait(timeout=10)
+        if image_path.name.startswith("bad"):
+            raise RuntimeError("unreadable page")
+        return f"- read {image_path.name}", ["#served"]
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(extractors, "_registry", dict(extractors._registry))
+    monkeypatch.setattr(extractors, "_entry_points_loaded", True)
+    monkeypatch.setattr(GateExtractor, "opened", 0)
+    monkeypatch.setattr(GateExtractor, "gate", None)
+    register_extractor("gate", GateExtractor)
+
+
+def _service(**kwargs):
+    return NoteService(TemplateEngine.get_default_template(), ParseOptions(model="gate"), **kwargs)
+
+
+@pytest.fixture
+def running(request):
+    """Service behind a live HTTP server on a free port."""
+    service = _service(**getattr(request, "param", {}))
+    service.open()
+    httpd = make_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield service, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def _post(url, body, query=""):
+    request = urllib.request.Request(f"{url}/parse{query}", data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read()), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read()), e.headers
+
+
+def _get(url, path):
+    with urllib.request.urlopen(f"{url}{path}", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_parse_returns_markdown(running, test_image_path):
+    """Test an uploaded image comes back as a rendered note."""
+    _, url = running
+
+    status, note, _ = _post(url, test_image_path.read_bytes(), "?filename=lecture-3.jpeg&source=Physics")
+
+    assert status == 200
+    assert note["title"] == "lecture-3"
+    assert "- read lecture-3.jpeg" in note["markdown"]
+    assert "Physics" in note["markdown"]
+    assert "#served" in note["tags"]
+    assert note["model"] == "gate"
+
+
+def test_backend_stays_warm(running, test_image_path):
+    """Test the backend is opened once at startup, not per request."""
+    _, url = running
+
+    for _ in range(3):
+        assert _post(url, test_image_path.read_bytes())[0] == 200
+
+    assert GateExtractor.opened == 1
+    assert _get(url, "/health") == {"status": "ok", "models": ["gate"]}
+
+
+def test_parse_rejects_bad_requests(running):
+    """Test unknown models, empty bodies and unknown paths are client errors."""
+    _, url = running
+
+    assert _post(url, b"\xff\xd8", "?model=nope")[0] == 400
+    assert _post(url, b"")[0] == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _get(url, "/nope")
+    assert error.value.code == 404
+
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_parse_rejects_invalid_content_length(running, length):
+    """Test a malformed Content-Length is answered with 400 instead of dropping the connection."""
+    _, url = running
+    connection = http.client.HTTPConnection(url.removeprefix("http://"), timeout=10)
+    connection.putrequest("POST", "/parse")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+
+    response = connection.getresponse()
+
+    assert response.status == 400
+    assert json.loads(response.read()) == {"error": "Invalid Content-Length"}
+    connection.close()
+
+
+class MisconfiguredExtractor(BaseExtractor):
+    """Test backend whose settings are wrong on the server side."""
+
+    name = "misconfigured"
+
+    def open(self):
+        raise ValueError("ANTHROPIC_API_KEY not found")
+
+
+def test_undecodable_images_are_400(running):
+    """Test bytes that aren't an image are the client's error and never reach the backend."""
+    service, url = running
+
+    status, body, _ = _post(url, b"not an image", "?filename=page.jpg")
+
+    assert status == 400
+    assert body["error"].startswith("Can't decode the image")
+    assert service.metrics()["failed"] == 0
+
+
+def test_backend_errors_are_500(running, test_image_path):
+    """Test an image the backend can't handle is reported, not fatal."""
+    service, url = running
+
+    status, body, _ = _post(url, test_image_path.read_bytes(), "?filename=bad.jpg")
+
+    assert status == 500
+    assert body["error"] == "unreadable page"
+    assert service.metrics()["failed"] == 1
+
+
+def test_backend_configuration_errors_are_500(running, test_image_path):
+    """Test a ValueError from opening a backend is a server error, not a bad request."""
+    _, url = running
+    register_extractor("misconfigured", MisconfiguredExtractor)
+
+    status, body, _ = _post(url, test_image_path.read_bytes(), "?model=misconfigured")
+
+    assert status == 500
+    assert body["error"] == "ANTHROPIC_API_KEY not found"
+
+
+@pytest.mark.parametrize("running", [{"workers": 1, "max_queue": 1}], indirect=True)
+def test_full_queue_returns_429(running, test_image_path):
+    """Test requests beyond workers + max_queue are rejected with Retry-After."""
+    service, url = running
+    GateExtractor.gate = threading.Event()
+    image = test_image_path.read_bytes()
+
+    held = [threading.Thread(target=_post, args=(url, image)) for _ in range(2)]
+    for thread in held:
+        thread.start()
+    for _ in range(100):
+        metrics = service.metrics()
+        if metrics["in_flight"] == 1 and metrics["queue_depth"] == 1:
+            break
+        threading.Event().wait(0.05)
+    else:
+        pytest.fail(f"requests never queued: {metrics}")
+
+    status, body, headers = _post(url, image)
+    assert status == 429
+    assert headers["Retry-After"] == "1"
+
+    GateExtractor.gate.set()
+    for thread in held:
+        thread.join(timeout=10)
+    metrics = _get(url, "/metrics")
+    assert (metrics["completed"], metrics["rejected"], metrics["queue_depth"]) == (2, 1, 0)
+    assert metrics["latency_seconds"]["p50"] >= metrics["queue_seconds"]["p50"]
+
+
+def test_service_rejects_when_full(test_image_path):
+    """Test admission without HTTP in front."""
+    service = _service(workers=1, max_queue=0)
+    service._running = 1
+
+    with pytest.raises(QueueFull):
+        service.parse(test_image_path.read_bytes())
+
+
+def test_line_batcher_coalesces_concurrent_pages():
+    """Test pages submitted together share one recognition call and get their own lines back."""
+    calls = []
+
+    def recognize(lines):
+        calls.append(len(lines))
+        return [f"line {line.width}" for line in lines]
+
+    batcher = LineBatcher(recognize, max_lines=64, max_wait=0.5)
+    batcher.start()
+    pages = [[Image.new("RGB", (width, 10)) for width in range(page * 10 + 1, page * 10 + 4)] for page in range(4)]
+    results = [None] * len(pages)
+    start = threading.Barrier(len(pages))
+
+    def submit(index):
+        start.wait()
+        results[index] = batcher.recognize(pages[index])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(pages))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    batcher.close()
+
+    assert results == [[f"line {line.width}" for line in page] for page in pages]
+    assert sum(calls) == 12 and len(calls) < len(pages)
+    assert batcher.stats()["pages_per_batch"] > 1
+
+
+def test_line_batcher_reports_errors_to_every_page():
+    """Test a failed batch raises in each waiting caller."""
+    def recognize(lines):
+        raise RuntimeError("out of memory")
+
+    batcher = LineBatcher(recognize)
+    batcher.start()
+    try:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            batcher.recognize([Image.new("RGB", (5, 5))])
+    finally:
+        batcher.close()
+
+
+def test_local_requests_use_the_batcher(mocker, test_image_path):
+    """Test local OCR requests run preparation per request and recognition through the batcher."""
+    mocker.patch("notebook_parser.extractors.model_registry.get", return_value=("processor", "model"))
+    mocker.patch.object(server_module, "read_lines", return_value=[Image.new("RGB", (5, 5))] * 2)
+    recognize = mocker.patch.object(server_module, "recognize_lines", side_effect=lambda lines, **_: ["ab", "cd"])
+
+    service = _service()
+    try:
+        note = service.parse(test_image_path.read_bytes(), filename="page.jpeg", model="local")
+    finally:
+        service.close()
+
+    assert "ab" in note["markdown"] and "cd" in note["markdown"]
+    assert recognize.call_args.kwargs == {"processor": "processor", "ocr_model": "model", "batch_size": 8}
+
+
+def test_batched_local_ocr_keeps_segment_and_batch_size(mocker, test_image_path):
+    """Test serve's --no-segment and --batch-size reach the OCR calls."""
+    mocker.patch("notebook_parser.extractors.model_registry.get", return_value=("processor", "model"))
+    read = mocker.patch.object(server_module, "read_lines", return_value=[Image.new("RGB", (5, 5))])
+    recognize = mocker.patch.object(server_module, "recognize_lines", side_effect=lambda lines, **_: ["ab"])
+
+    options = ParseOptions(model="local", segment=False, batch_size=3)
+    service = NoteService(TemplateEngine.get_default_template(), options)
+    try:
+        service.parse(test_image_path.read_bytes(), filename="page.jpeg")
+    finally:
+        service.close()
+
+    assert read.call_args.kwargs["segment"] is False
+    assert recognize.call_args.kwargs["batch_size"] == 3
@@ -0,0 +1,164 @@
+"""
+Tests for extraction sidecars and re-rendering.
+"""
+
+import json
+import shutil
+import pytest
+from pathlib import Path
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.batch import rerender_notes
+from notebook_parser.sidecar import (
+    SIDECAR_VERSION,
+    NoteRecord,
+    find_sidecars,
+    note_path,
+    read_sidecar,
+    sidecar_path,
+    write_sidecar,
+)
+
+runner = CliRunner()
+
+NOTE_TEMPLATE = Path(__file__).parent.parent / "templates" / "note-template.md"
+
+
+def _record(image="/scans/lecture-1.jpeg", **kwargs):
+    values = dict(
+        image=image,
+        extracted_text="- stacks grow down\n- heaps grow up",
+        generated_tags=["memory", "systems"],
+        source="CS 101",
+        date="2024-03-01",
+        backend="ollama",
+        model="llama3.2-vision",
+    )
+    values.update(kwargs)
+    return NoteRecord(**values)
+
+
+def test_sidecar_paths():
+    """Test notes and sidecars map to each other."""
+    assert sidecar_path(Path("notes/week-1.md")) == Path("notes/week-1.extraction.json")
+    assert note_path(Path("notes/week-1.extraction.json")) == Path("notes/week-1.md")
+
+
+def test_sidecar_round_trip(tmp_path):
+    """Test a written sidecar reads back as the same record."""
+    record = _record(timings={"extract": 1.5})
+
+    path = write_sidecar(tmp_path / "lecture-1.md", record)
+
+    assert path == tmp_path / "lecture-1.extraction.json"
+    assert json.loads(path.read_text())["version"] == SIDECAR_VERSION
+    assert read_sidecar(path) == record
+    assert list(tmp_path.iterdir()) == [path]  # No temp files left behind
+
+
+def test_read_sidecar_rejects_other_files(tmp_path):
+    """Test files that aren't readable sidecars raise ValueError."""
+    path = tmp_path / "x.extraction.json"
+    for content in ["not json", json.dumps({"version": 99}), json.dumps({"version": SIDECAR_VERSION})]:
+        path.write_text(content)
+        with pytest.raises(ValueError):
+            read_sidecar(path)
+
+
+def test_parse_saves_sidecar(mocker, test_image_path, tmp_path):
+    """Test parse saves the raw extraction, backend, model and timings next to the note."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(test_image_path), "-o", str(output), "--model", "ollama", "--source", "Lab",
+    ])
+
+    assert result.exit_code == 0, result.output
+    record = read_sidecar(tmp_path / "note.extraction.json")
+    assert record.extracted_text == "- a point"
+    assert (record.backend, record.model, record.source) == ("ollama", "llama3.2-vision", "Lab")
+    assert record.image == str(test_image_path.resolve())
+    assert record.template.endswith("bullet-points-template.md")
+    assert record.timings["extract"] >= 0
+
+
+def test_parse_no_sidecar(mocker, test_image_path, tmp_path):
+    """Test --no-sidecar writes only the note."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(test_image_path), "-o", str(output), "--model", "ollama", "--no-sidecar",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert list(tmp_path.glob("note*")) == [output]
+
+
+def test_parse_dir_saves_sidecars(mocker, test_image_path, tmp_path):
+    """Test every page of a batch gets a sidecar beside its note."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    input_dir = tmp_path / "scans"
+    (input_dir / "week-2").mkdir(parents=True)
+    shutil.copy(test_image_path, input_dir / "a.jpeg")
+    shutil.copy(test_image_path, input_dir / "week-2" / "b.jpeg")
+
+    result = runner.invoke(app, [
+        "parse-dir", str(input_dir), "-o", str(tmp_path / "notes"), "--model", "ollama", "-r", "--no-cache",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert find_sidecars(tmp_path / "notes", recursive=True) == [
+        tmp_path / "notes" / "a.extraction.json", tmp_path / "notes" / "week-2" / "b.extraction.json",
+    ]
+
+
+def test_rerender_notes_uses_new_template(tmp_path):
+    """Test notes are rebuilt from sidecars with the new template, keeping date, tags and source."""
+    for name in ["lecture-1", "lecture-2"]:
+        write_sidecar(tmp_path / f"{name}.md", _record(image=f"/scans/{name}.jpeg"))
+
+    results = rerender_notes(find_sidecars(tmp_path), NOTE_TEMPLATE, workers=2)
+
+    assert [result.title for result in results] == ["lecture-1", "lecture-2"]
+    note = (tmp_path / "lecture-2.md").read_text()
+    assert "**Title**: lecture-2" in note
+    assert "**Date**: 2024-03-01" in note
+    assert "**Source**: CS 101" in note
+    assert "#memory #systems #notes #handwritten" in note
+    assert "- heaps grow up" in note
+
+
+def test_rerender_notes_reports_bad_sidecars(tmp_path):
+    """Test an unreadable sidecar fails on its own without stopping the rest."""
+    write_sidecar(tmp_path / "good.md", _record())
+    (tmp_path / "bad.extraction.json").write_text("{")
+
+    results = rerender_notes(find_sidecars(tmp_path), NOTE_TEMPLATE)
+
+    assert [(result.output_path.name, result.ok) for result in results] == [("bad.md", False), ("good.md", True)]
+
+
+def test_rerender_command_makes_no_model_calls(mocker, test_image_path, tmp_path):
+    """Test a parsed note can be re-rendered with another template offline."""
+    extract = mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+    output = tmp_path / "note.md"
+    runner.invoke(app, ["parse", "-i", str(test_image_path), "-o", str(output), "--model", "ollama"])
+    assert extract.call_count == 1
+
+    result = runner.invoke(app, ["rerender", str(tmp_path), "-t", str(NOTE_TEMPLATE)])
+
+    assert result.exit_code == 0, result.output
+    assert "1/1 notes re-rendered" in result.stderr
+    assert extract.call_count == 1
+    assert "## Why It Matters" in output.read_text()
+    assert "- a point" in output.read_text()
+
+
+def test_rerender_command_missing_path(tmp_path):
+    """Test a missing path fails cleanly."""
+    result = runner.invoke(app, ["rerender", str(tmp_path / "missing")])
+
+    assert result.exit_code == 1
+    assert "not found" in result.stderr
@@ -0,0 +1,181 @@
+"""
+Tests for streamed extraction and progressive note writes.
+"""
+
+import json
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.batch import find_images, plan_outputs, run_batch
+from notebook_parser.llm.claude_vision import extract_with_claude, extract_with_claude_structured
+from notebook_parser.llm.ollama_vision import extract_with_ollama
+from notebook_parser.llm.streaming import StreamInterrupted, TextStream
+from notebook_parser.llm.usage import TokenUsage
+from notebook_parser.pipeline import NoteWriter, ParseOptions
+from notebook_parser.template_engine import TemplateEngine
+
+runner = CliRunner()
+
+
+def _ndjson(words, error=None):
+    """Ollama /api/generate stream body."""
+    chunks = [{"response": word, "done": False} for word in words]
+    chunks.append({"error": error} if error else {"response": "", "done": True, "eval_count": len(words)})
+    return "\n".join(json.dumps(chunk) for chunk in chunks) + "\n"
+
+
+@pytest.fixture
+def ollama(anthropic_stub):
+    """Ollama endpoints served by the local API stub, streaming by default."""
+    anthropic_stub.ollama_words = ["- first", " point\n", "- second", " point"]
+    anthropic_stub.routes[("GET", "/api/tags")] = lambda _: (200, {"models": []})
+    anthropic_stub.routes[("POST", "/api/generate")] = lambda body: (
+        (200, _ndjson(anthropic_stub.ollama_words)) if body["stream"] else (200, {"response": "- whole"})
+    )
+    return anthropic_stub
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = tmp_path / "template.md"
+    path.write_text("# {{title}}\n\n{{key_points}}\n")
+    return path
+
+
+def test_text_stream_records_time_to_first_token():
+    """Test TTFT is measured from start() to the first non-empty update."""
+    seen = []
+    stream = TextStream(seen.append)
+
+    assert stream.ttft is None
+    stream.start()
+    stream.update("")
+    stream.update("- a")
+    stream.update("- ab")
+
+    assert seen == ["- a", "- ab"]
+    assert stream.text == "- ab"
+    assert stream.ttft >= 0
+
+
+def test_ollama_stream_reports_growing_text(ollama, temp_test_image):
+    """Test Ollama's NDJSON chunks are accumulated as they arrive."""
+    seen = []
+    stream = TextStream(seen.append)
+
+    text = extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url, stream=stream)
+
+    assert text == "- first point\n- second point"
+    assert seen[0] == "- first"
+    assert seen[-1] == "- first point\n- second point"
+    assert ollama.requests[-1]["body"]["stream"] is True
+    assert stream.ttft is not None
+
+
+def test_ollama_stream_error_keeps_partial_text(ollama, temp_test_image):
+    """Test a failure mid-stream raises with the text received so far."""
+    ollama.routes[("POST", "/api/generate")] = lambda _: (200, _ndjson(["- kept"], error="model crashed"))
+
+    with pytest.raises(StreamInterrupted) as excinfo:
+        extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=ollama.url, stream=TextStream())
+
+    assert excinfo.value.text == "- kept"
+    assert "model crashed" in str(excinfo.value)
+
+
+def test_claude_stream_matches_blocking_result(anthropic_stub, temp_test_image):
+    """Test messages.stream yields the same text and usage as messages.create."""
+    anthropic_stub.responses = [anthropic_stub.message("- streamed note", cache_read_input_tokens=1200)]
+    seen = []
+    usage = TokenUsage()
+
+    text = extract_with_claude(temp_test_image, "{{key_points}}", usage=usage, stream=TextStream(seen.append))
+
+    assert text == "- streamed note"
+    assert seen[0] == "- st"
+    assert seen[-1] == "- streamed note"
+    assert anthropic_stub.requests[0]["body"]["stream"] is True
+    assert usage.cache_read_input_tokens == 1200
+
+
+def test_claude_structured_stream_reports_partial_content(anthropic_stub, temp_test_image):
+    """Test structured requests stream the tool's content field as it is parsed."""
+    anthropic_stub.responses = [anthropic_stub.message(content=[
+        {"type": "tool_use", "id": "toolu_1", "name": "record_note",
+         "input": {"tags": ["#ai"], "content": "- one\n- two"}},
+    ])]
+    seen = []
+
+    text, tags = extract_with_claude_structured(temp_test_image, "{{key_points}}", stream=TextStream(seen.append))
+
+    assert (text, tags) == ("- one\n- two", ["#ai"])
+    assert seen[-1] == "- one\n- two"
+    assert len(seen) > 1
+
+
+def test_claude_stream_error_keeps_partial_text(anthropic_stub, temp_test_image):
+    """Test an error event after some text raises with the partial text."""
+    anthropic_stub.routes[("POST", "/v1/messages")] = lambda _: (
+        200, anthropic_stub.sse(anthropic_stub.message("- partial note"), error="Overloaded"), "text/event-stream"
+    )
+
+    with pytest.raises(StreamInterrupted) as excinfo:
+        extract_with_claude(temp_test_image, "{{key_points}}", stream=TextStream())
+
+    assert excinfo.value.text == "- pa"
+
+
+def test_note_writer_throttles_rewrites(template_path, temp_test_image, tmp_path):
+    """Test partial notes are rendered to disk, at most once per interval."""
+    output = tmp_path / "note.md"
+    writer = NoteWriter(TemplateEngine(template_path), temp_test_image, output, min_interval=60)
+
+    writer("- first")
+    writer("- first\n- second")
+
+    assert "- first" in output.read_text()
+    assert "second" not in output.read_text()
+
+
+def test_run_batch_stream_records_ttft(ollama, template_path, tmp_path):
+    """Test streamed batch pages report their time to first token."""
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    Image.new('RGB', (100, 100), color='white').save(scans / "page.jpg")
+    pages = plan_outputs(find_images(scans), scans, tmp_path / "out")
+
+    [result] = run_batch(pages, template_path, ParseOptions(model="ollama", ollama_url=ollama.url), stream=True)
+
+    assert result.ok
+    assert result.ttft is not None
+    assert "- second point" in (tmp_path / "out" / "page.md").read_text()
+
+
+def test_parse_stream_keeps_partial_note_on_failure(ollama, temp_test_image, template_path, tmp_path):
+    """Test parse --stream leaves the text received so far in the output file."""
+    ollama.routes[("POST", "/api/generate")] = lambda _: (200, _ndjson(["- kept text"], error="timed out"))
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(output), "-t", str(template_path),
+        "--model", "ollama", "--ollama-url", ollama.url, "--stream", "--no-cache",
+    ])
+
+    assert result.exit_code == 1
+    assert "Partial note kept" in result.stderr
+    assert "- kept text" in output.read_text()
+
+
+def test_parse_stream_prints_first_token_time(ollama, temp_test_image, template_path, tmp_path):
+    """Test parse --stream reports time to first token."""
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(temp_test_image), "-o", str(output), "-t", str(template_path),
+        "--model", "ollama", "--ollama-url", ollama.url, "--stream",
+    ])
+
+    assert result.exit_code == 0
+    assert "First token:" in result.stderr
+    assert "- second point" in output.read_text()
@@ -0,0 +1,193 @@
+"""
+Tests for timing spans, usage counters, the metrics store and the stats command.
+"""
+
+import asyncio
+import pstats
+import shutil
+import time
+from types import SimpleNamespace
+from typer.testing import CliRunner
+from main import app
+from notebook_parser.image_optimizer import image_to_base64, optimize_for_llm
+from notebook_parser.llm.ollama_vision import extract_with_ollama, extract_with_ollama_async
+from notebook_parser.llm.usage import TokenUsage
+from notebook_parser.pipeline import ParseOptions
+from notebook_parser.telemetry import MetricsStore, Trace, count, percentile, span, trace
+
+runner = CliRunner()
+
+OLLAMA_RESPONSE = {
+    "response": "- from ollama",
+    "done": True,
+    "prompt_eval_count": 600,
+    "eval_count": 40,
+    "prompt_eval_duration": 1_500_000_000,
+    "eval_duration": 2_000_000_000,
+}
+
+
+def test_spans_only_recorded_inside_a_trace():
+    """Test spans and counters accumulate in the current trace and are ignored outside one."""
+    with span("decode"):
+        count(eval_count=5)
+
+    with trace() as page:
+        for _ in range(2):
+            with span("encode"):
+                time.sleep(0.01)
+        count(eval_count=5)
+        count(eval_count=7)
+
+    assert set(page.spans) == {"encode"}
+    assert page.spans["encode"] >= 0.02
+    assert page.counters == {"eval_count": 12}
+    assert page.seconds >= page.spans["encode"]
+
+
+def test_token_usage_is_counted_per_page():
+    """Test Claude usage blocks reach both the run total and the page trace."""
+    usage = TokenUsage()
+    with trace() as page:
+        usage.add(SimpleNamespace(input_tokens=100, output_tokens=20, cache_read_input_tokens=900))
+
+    assert usage.input_tokens == 100
+    assert page.counters == {
+        "requests": 1, "input_tokens": 100, "output_tokens": 20,
+        "cache_creation_input_tokens": 0, "cache_read_input_tokens": 900,
+    }
+
+
+def test_ollama_eval_counters(anthropic_stub, temp_test_image):
+    """Test Ollama's eval counts and durations are recorded, durations in seconds."""
+    anthropic_stub.routes[("GET", "/api/tags")] = lambda _: (200, {"models": []})
+    anthropic_stub.routes[("POST", "/api/generate")] = lambda _: (200, OLLAMA_RESPONSE)
+
+    with trace() as page:
+        extract_with_ollama(temp_test_image, "{{key_points}}", ollama_url=anthropic_stub.url)
+
+    async def run_async():
+        with trace() as async_page:
+            await extract_with_ollama_async(temp_test_image, "{{key_points}}", ollama_url=anthropic_stub.url)
+        return async_page
+
+    for traced in [page, asyncio.run(run_async())]:
+        assert traced.counters == {
+            "prompt_eval_count": 600, "eval_count": 40, "prompt_eval_duration": 1.5, "eval_duration": 2.0,
+        }
+        assert "request" in traced.spans
+
+
+def test_image_stages(test_image_path):
+    """Test decoding, encoding and base64 are timed separately."""
+    with trace() as page:
+        image_to_base64(optimize_for_llm(test_image_path))
+
+    assert set(page.spans) == {"decode", "encode", "base64"}
+
+
+def _page(started: float, seconds: float, **counters) -> Trace:
+    page = Trace()
+    page.started = started
+    page._seconds = seconds
+    page.spans = {"request": seconds * 0.9}
+    page.counters = counters
+    return page
+
+
+def test_metrics_summary(tmp_path):
+    """Test percentiles, throughput over run wall time, stage medians and counter totals."""
+    store = MetricsStore(tmp_path / "metrics.sqlite3")
+    claude, ollama = ParseOptions(model="claude"), ParseOptions(model="ollama")
+    # Two pages in parallel, then one more: 3 pages in 20 seconds of wall time
+    store.record(_page(1000.0, 10.0, input_tokens=100), claude, tmp_path / "a.jpeg")
+    store.record(_page(1000.0, 10.0, input_tokens=100), claude, tmp_path / "b.jpeg")
+    store.record(_page(1010.0, 10.0, input_tokens=100), claude, tmp_path / "c.jpeg")
+    store.record(_page(1010.0, 1.0), claude, tmp_path / "d.jpeg", error="overloaded")
+    store.record(_page(2000.0, 30.0), ollama, tmp_path / "e.jpeg")
+
+    claude_stats, ollama_stats = store.summary()
+
+    assert (claude_stats.backend, claude_stats.pages, claude_stats.failed) == ("claude", 4, 1)
+    assert (claude_stats.p50, claude_stats.p99) == (10.0, 10.0)
+    assert claude_stats.pages_per_minute == 9.0
+    assert claude_stats.stages == {"request": 9.0}
+    assert claude_stats.counters == {"input_tokens": 300}
+    assert ollama_stats.pages_per_minute == 2.0
+    assert [stats.backend for stats in store.summary("ollama")] == ["ollama"]
+    assert store.clear() == 5
+
+
+def test_metrics_keep_the_latest_pages(tmp_path):
+    """Test the store drops its oldest pages once over max_pages."""
+    store = MetricsStore(tmp_path / "metrics.sqlite3", max_pages=3)
+    options = ParseOptions(model="ollama")
+    for started in range(5):
+        store.record(_page(float(started), 1.0), options, tmp_path / f"{started}.jpeg")
+
+    with store._connect() as conn:
+        images = [row[0] for row in conn.execute("SELECT image FROM pages ORDER BY started")]
+    assert images == [str(tmp_path / f"{started}.jpeg") for started in (2, 3, 4)]
+
+
+def test_percentile():
+    """Test nearest-rank percentiles."""
+    values = list(range(1, 101))
+
+    assert [percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert percentile([], 50) is None
+
+
+def test_parse_dir_records_metrics_and_profile(anthropic_stub, test_image_path, tmp_path):
+    """Test every page of a run is recorded with its stages and tokens, and stats reports them."""
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    for name in ["a.jpeg", "b.jpeg"]:
+        shutil.copy(test_image_path, scans / name)
+    profile = tmp_path / "run.prof"
+
+    result = runner.invoke(app, [
+        "parse-dir", str(scans), "-o", str(tmp_path / "notes"), "--model", "claude", "--no-cache",
+        "--profile", str(profile),
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+    (summary,) = MetricsStore().summary()
+    assert (summary.backend, summary.pages, summary.failed) == ("claude", 2, 0)
+    assert {"optimize", "request", "render", "write"} <= set(summary.stages)
+    assert summary.counters["input_tokens"] == 200
+
+    result = runner.invoke(app, ["stats"])
+
+    assert result.exit_code == 0
+    assert "claude: 2 pages (0 failed)" in result.stdout
+    assert "Latency: p50" in result.stdout
+    assert "Tokens: 2 requests, input 200, output 40" in result.stdout
+
+
+def test_parse_no_metrics(mocker, test_image_path, tmp_path):
+    """Test --no-metrics records nothing, and stats says so."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", return_value="- a point")
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(test_image_path), "-o", str(tmp_path / "note.md"), "--model", "ollama", "--no-metrics",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert MetricsStore().summary() == []
+    assert "No pages recorded yet" in runner.invoke(app, ["stats"]).stdout
+
+
+def test_parse_records_failed_page(mocker, test_image_path, tmp_path):
+    """Test a page that fails is recorded with its error."""
+    mocker.patch("notebook_parser.extractors.extract_with_ollama", side_effect=RuntimeError("model not found"))
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(test_image_path), "-o", str(tmp_path / "note.md"), "--model", "ollama",
+    ])
+
+    assert result.exit_code == 1
+    (summary,) = MetricsStore().summary("ollama")
+    assert (summary.pages, summary.failed) == (1, 1)
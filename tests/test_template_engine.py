@@ -2,9 +2,13 @@
 Tests for template engine module.
 """
 
+import os
+import time
 import pytest
 from pathlib import Path
-from src.notebook_parser.template_engine import TemplateEngine
+from src.notebook_parser import template_engine
+from src.notebook_parser.formatters import TEMPLATE_VARIABLES, format_for_template
+from src.notebook_parser.template_engine import TemplateEngine, compile_template
 
 
 def test_template_engine_init_with_valid_template(tmp_path):
@@ -86,3 +90,110 @@ def test_template_engine_get_default_template():
 
     assert default_path.name == "bullet-points-template.md"
     assert "templates" in str(default_path)
+
+
+def test_compile_template_splits_at_placeholders():
+    """Test templates compile to literals around placeholder names."""
+    compiled = compile_template("# {{title}}\n{ not a placeholder }\n{{key_points}}")
+
+    assert compiled.literals == ("# ", "\n{ not a placeholder }\n", "")
+    assert compiled.names == ("title", "key_points")
+
+
+def test_template_engine_render_is_single_pass(tmp_path):
+    """Test placeholders inside inserted values are not substituted again."""
+    template_path = tmp_path / "test_template.md"
+    template_path.write_text("{{key_points}}\n{{date}}")
+
+    engine = TemplateEngine(template_path)
+    result = engine.render(key_points="Write {{date}} at the top", date="2026-01-29")
+
+    assert result == "Write {{date}} at the top\n2026-01-29"
+
+
+def test_template_engine_render_keeps_missing_placeholders(tmp_path):
+    """Test placeholders without a value are left in the output."""
+    template_path = tmp_path / "test_template.md"
+    template_path.write_text("**Title**: {{title}}\n**Author**: {{author}}")
+
+    engine = TemplateEngine(template_path)
+
+    assert engine.render(title="Test") == "**Title**: Test\n**Author**: {{author}}"
+
+
+def test_template_engine_reports_unknown_placeholders(tmp_path):
+    """Test placeholders outside the known variables are reported when the template loads."""
+    template_path = tmp_path / "test_template.md"
+    template_path.write_text("{{title}} {{author}} {{key_points}} {{mood}}")
+
+    engine = TemplateEngine(template_path, variables=TEMPLATE_VARIABLES)
+
+    assert engine.placeholders == {"title", "author", "key_points", "mood"}
+    assert engine.unknown_placeholders == ["author", "mood"]
+    assert TemplateEngine(template_path).unknown_placeholders == []
+
+
+def test_template_engine_caches_compiled_template(tmp_path, mocker):
+    """Test an unchanged template is compiled once, and an edited one again."""
+    template_path = tmp_path / "test_template.md"
+    template_path.write_text("**Title**: {{title}}")
+    spy = mocker.spy(template_engine, "compile_template")
+
+    first = TemplateEngine(template_path)
+    engine = TemplateEngine(template_path)
+    assert spy.call_count == 1
+    assert engine._compiled is first._compiled
+    assert engine.render(title="A") == "**Title**: A"
+
+    template_path.write_text("**Name**: {{title}}")
+    os.utime(template_path, ns=(0, 0))  # Differs from the first write's mtime
+    assert TemplateEngine(template_path).render(title="A") == "**Name**: A"
+    assert spy.call_count == 2
+
+
+def _render_by_replace(content, **kwargs):
+    """The previous renderer: one str.replace over the whole note per variable."""
+    result = content
+    for key, value in kwargs.items():
+        result = result.replace(f"{{{{{key}}}}}", str(value))
+    return result
+
+
+def _best_of(repeat, number, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) / number
+
+
+def test_render_matches_replace_on_long_notes(temp_test_image):
+    """Test single-pass rendering gives the same note as one replace per variable."""
+    template_path = Path(__file__).parent.parent / "templates" / "note-template.md"
+    engine = TemplateEngine(template_path)
+    text = "\n".join(f"- point {i} about stacks, heaps and garbage collection" for i in range(500))
+    variables = format_for_template(text, temp_test_image, ["memory", "systems"], "CS 101")
+
+    assert engine.render(**variables) == _render_by_replace(engine.template_content, **variables)
+
+
+@pytest.mark.benchmark
+def test_render_and_load_benchmark(temp_test_image):
+    """Micro-benchmark: rendering and loading stay negligible for large vaults."""
+    template_path = Path(__file__).parent.parent / "templates" / "note-template.md"
+    engine = TemplateEngine(template_path)
+    text = "\n".join(f"- point {i} about stacks, heaps and garbage collection" for i in range(500))
+    variables = format_for_template(text, temp_test_image, ["memory", "systems"], "CS 101")
+
+    compiled = _best_of(5, 500, lambda: engine.render(**variables))
+    replaced = _best_of(5, 500, lambda: _render_by_replace(engine.template_content, **variables))
+    # The long note is copied once instead of once per variable after the first insert
+    assert compiled * 2 < replaced
+    # Thousands of notes render in well under a second
+    assert compiled * 5000 < 0.5
+
+    cached = _best_of(5, 500, lambda: TemplateEngine(template_path))
+    uncached = _best_of(5, 500, lambda: compile_template(template_path.read_text()))
+    assert cached < uncached
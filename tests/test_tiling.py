@@ -0,0 +1,221 @@
+"""
+Tests for spread splitting, tiling and stitching.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import extractors
+from notebook_parser.extractors import BaseExtractor, register_extractor
+from notebook_parser.image_optimizer import IN_USE_SECONDS, PayloadCache, get_payload_cache
+from notebook_parser.pipeline import ParseOptions, extract_page, extract_page_async, page_pieces
+from notebook_parser.tiling import find_gutter, merge_tags, merge_texts, split_page, tile_bands
+
+runner = CliRunner()
+
+
+def _spread(shadow=True):
+    """Two ruled pages side by side; the left page is a little darker."""
+    spread = np.full((1000, 1500), 235, np.uint8)
+    spread[:, 750:] = 245
+    spread[100:900:40, 60:700] = 40
+    spread[100:900:40, 800:1440] = 40
+    if shadow:
+        for offset in range(-30, 31):
+            spread[:, 750 + offset] = np.uint8(235 - 120 * (1 - abs(offset) / 30))
+    return spread
+
+
+class ToneExtractor(BaseExtractor):
+    """Test backend that 'reads' each piece as its page tint and brightness."""
+
+    name = "tone"
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        self.barrier.wait()  # Fails unless two pieces are in flight at once
+        pixels = np.asarray(Image.open(image_path).convert("RGB"), dtype=float)
+        red, _, blue = pixels.reshape(-1, 3).mean(axis=0)
+        page = "left" if red > blue else "right"
+        return f"- {page} {pixels.mean():.0f}", [f"#{page}"]
+
+
+@pytest.fixture
+def spread_photo(tmp_path):
+    """Spread with a shaded gutter, a warm left and a cool right page that darken downwards."""
+    brightness = np.linspace(250, 150, 1000)[:, None, None]
+    spread = np.tile(brightness, (1, 1200, 3))
+    spread[:, :600] *= (1.0, 0.95, 0.9)
+    spread[:, 600:] *= (0.9, 0.95, 1.0)
+    for offset in range(-25, 26):
+        spread[:, 600 + offset] *= 0.5 + abs(offset) / 50
+    path = tmp_path / "spread.png"
+    Image.fromarray(spread.astype(np.uint8)).save(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(extractors, "_registry", dict(extractors._registry))
+    monkeypatch.setattr(extractors, "_entry_points_loaded", True)
+    register_extractor("tone", ToneExtractor)
+
+
+def test_find_gutter_shadow():
+    """Test the shadow along the fold marks the gutter."""
+    assert abs(find_gutter(_spread()) - 750) <= 3
+
+
+def test_find_gutter_flat_scan():
+    """Test a flat scan is split at the blank gap between the pages."""
+    assert 700 <= find_gutter(_spread(shadow=False)) <= 800
+
+
+def test_find_gutter_single_page():
+    """Test portrait pages are never split."""
+    assert find_gutter(_spread()[:, :700]) is None
+
+
+def test_find_gutter_ignores_uneven_lighting():
+    """Test a darker left page without a fold isn't mistaken for a gutter."""
+    spread = _spread(shadow=False)
+    spread[:, :750] = np.minimum(spread[:, :750], 200)
+    spread[100:900:40, 640:860] = 40  # Writing across the middle, so no blank gap either
+
+    assert find_gutter(spread) is None
+
+
+@pytest.mark.parametrize("tiles", [2, 3, 5])
+def test_tile_bands_cover_page_with_overlap(tiles):
+    """Test bands cover the page top to bottom and overlap their neighbours."""
+    bands = tile_bands(1000, tiles)
+
+    assert len(bands) == tiles
+    assert bands[0][0] == 0 and bands[-1][1] == 1000
+    for (_, bottom), (top, _) in zip(bands, bands[1:]):
+        assert bottom - top >= 0.1 * (bands[0][1] - bands[0][0])
+
+
+def test_split_page_in_reading_order(tmp_path):
+    """Test a spread is cut into left page bands, then right page bands."""
+    path = tmp_path / "spread.png"
+    Image.fromarray(_spread()).save(path)
+
+    pages = split_page(path, spread=True, tiles=2)
+
+    assert [len(bands) for bands in pages] == [2, 2]
+    assert all(band.width < 800 for bands in pages for band in bands)
+
+
+def test_merge_texts_drops_overlap():
+    """Test lines read twice across a band overlap are kept once."""
+    # The line on the band edge is cut in half and comes out garbled in both bands
+    top = "- stacks grow down\n- the heap is large\n- garbage collection runs\n- ~rn cnll;"
+    bottom = "- ,,a oo1l\n- The heap is large\n- garbage collection runs.\n- memory is freed\n- done"
+
+    merged = merge_texts([[top, bottom]])
+
+    assert merged.splitlines() == [
+        "- stacks grow down", "- the heap is large", "- garbage collection runs", "- memory is freed", "- done",
+    ]
+
+
+def test_merge_texts_keeps_pages_apart():
+    """Test identical lines on two pages are not deduplicated."""
+    assert merge_texts([["- same line"], ["- same line"]]) == "- same line\n\n- same line"
+
+
+def test_merge_tags():
+    """Test tags from every piece are combined once each."""
+    assert merge_tags([["#a", "#b"], None, "#b #c"]) == ["#a", "#b", "#c"]
+    assert merge_tags([None, None]) is None
+
+
+def test_page_pieces_are_stable(spread_photo):
+    """Test re-splitting an unchanged page reuses the same piece files."""
+    options = ParseOptions(model="tone", split_spread=True, tiles=2)
+
+    first = page_pieces(spread_photo, options)
+    second = page_pieces(spread_photo, options)
+
+    assert first == second
+    assert get_payload_cache().stats()["entries"] == 4
+    assert page_pieces(spread_photo, ParseOptions()) == [[spread_photo]]
+
+
+def test_pieces_survive_pruning(spread_photo, tmp_path):
+    """Test pieces handed out for extraction aren't pruned before they are read."""
+    cache = PayloadCache(tmp_path / "payloads", max_disk_bytes=1)
+    cache.get(spread_photo, max_size=300)
+    stale_path = next(cache.directory.glob("*/*.jpg"))
+    long_ago = time.time() - IN_USE_SECONDS - 60
+    os.utime(stale_path, (long_ago, long_ago))
+
+    pieces = [path for bands in cache.split_page(spread_photo, spread=True, tiles=2) for path in bands]
+    # Another page's payload takes the cache over budget
+    cache.get(spread_photo, max_size=200)
+
+    assert not stale_path.exists()
+    assert len(pieces) == 4
+    assert all(Image.open(path).size for path in pieces)
+
+
+def _lines(text):
+    return [line.split() for line in text.splitlines() if line]
+
+
+def test_extract_page_stitches_pieces_in_order(spread_photo):
+    """Test pieces are extracted concurrently and stitched left to right, top to bottom."""
+    options = ParseOptions(model="tone", split_spread=True, tiles=2)
+
+    text, tags = extract_page(spread_photo, "{{key_points}}", options)
+
+    lines = _lines(text)
+    assert [page for _, page, _ in lines] == ["left", "left", "right", "right"]
+    assert int(lines[0][2]) > int(lines[1][2]) and int(lines[2][2]) > int(lines[3][2])
+    assert tags == ["#left", "#right"]
+
+
+def test_extract_page_async_stitches_pieces(spread_photo):
+    """Test the async path stitches the same way."""
+    options = ParseOptions(model="tone", split_spread=True)
+
+    text, _ = asyncio.run(extract_page_async(spread_photo, "{{key_points}}", options))
+
+    assert [page for _, page, _ in _lines(text)] == ["left", "right"]
+
+
+def test_parse_with_tiles(mocker, spread_photo, tmp_path):
+    """Test --tiles extracts each band with the backend and writes one note."""
+    extract = mocker.patch(
+        "notebook_parser.extractors.extract_with_ollama",
+        side_effect=lambda **kwargs: f"- band {Image.open(kwargs['image_path']).height}",
+    )
+    output = tmp_path / "note.md"
+
+    result = runner.invoke(app, [
+        "parse", "-i", str(spread_photo), "-o", str(output), "--model", "ollama", "--tiles", "3",
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert extract.call_count == 3
+    # Each band is optimized by the backend itself
+    assert all(call.kwargs["image_bytes"] is None for call in extract.call_args_list)
+    assert "- band" in output.read_text()
+
+
+def test_parse_dir_rejects_tiles_with_batch_api(tmp_path):
+    """Test split pages can't go through the Message Batches API."""
+    result = runner.invoke(app, ["parse-dir", str(tmp_path), "--model", "claude", "--batch-api", "--tiles", "2"])
+
+    assert result.exit_code == 1
+    assert "--batch-api" in result.stderr
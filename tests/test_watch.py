@@ -0,0 +1,236 @@
+"""
+Tests for the watch-folder daemon.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+import pytest
+from typer.testing import CliRunner
+from main import app
+from notebook_parser import extractors
+from notebook_parser.extractors import BaseExtractor, register_extractor
+from notebook_parser.pipeline import ParseOptions
+from notebook_parser.template_engine import TemplateEngine
+from notebook_parser.watch import STATE_FILENAME, FolderWatcher, PollingSource, WatchState
+
+runner = CliRunner()
+
+
+class CountingExtractor(BaseExtractor):
+    """Test backend that records the pages it reads and how often it was opened."""
+
+    name = "counting"
+    opened = 0
+    pages = []
+
+    def __init__(self, options):
+        super().__init__(options)
+        CountingExtractor.opened += 1
+
+    def extract(self, image_path, template_content, image_bytes=None, cache=None, usage=None, stream=None):
+        CountingExtractor.pages.append(image_path.name)
+        if image_path.name.startswith("bad"):
+            raise RuntimeError("unreadable page")
+        if image_path.name.startswith("syncing"):
+            # A sync client replaces the file while it is being parsed
+            with open(image_path, "ab") as f:
+                f.write(b"\0")
+        return f"- read {image_path.name}", None
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(extractors, "_registry", dict(extractors._registry))
+    monkeypatch.setattr(extractors, "_entry_points_loaded", True)
+    monkeypatch.setattr(CountingExtractor, "opened", 0)
+    monkeypatch.setattr(CountingExtractor, "pages", [])
+    register_extractor("counting", CountingExtractor)
+
+
+@pytest.fixture
+def inbox(tmp_path, test_image_path):
+    """Folder with two notebook photos."""
+    directory = tmp_path / "inbox"
+    directory.mkdir()
+    shutil.copy(test_image_path, directory / "a.jpeg")
+    shutil.copy(test_image_path, directory / "b.jpeg")
+    return directory
+
+
+def _watcher(inbox, tmp_path, **kwargs):
+    return FolderWatcher(
+        inbox,
+        tmp_path / "notes",
+        TemplateEngine.get_default_template(),
+        ParseOptions(model="counting"),
+        **kwargs
+    )
+
+
+def test_state_skips_unchanged_files(tmp_path, test_image_path):
+    """Test a recorded image is current until its content changes."""
+    image = tmp_path / "page.jpeg"
+    shutil.copy(test_image_path, image)
+    state = WatchState(tmp_path / "state.sqlite3")
+
+    assert not state.is_current(image)
+    state.record(image, "digest-is-ignored-until-the-stat-changes", image.stat(), tmp_path / "page.md")
+    assert state.is_current(image)
+
+    # Touched but identical: the stat changed, so the digest decides
+    os.utime(image, ns=(0, 0))
+    assert not state.is_current(image)
+
+
+def test_state_touched_identical_file_is_current(tmp_path, test_image_path):
+    """Test an image rewritten with the same bytes isn't parsed again."""
+    from notebook_parser.cache import file_digest
+
+    image = tmp_path / "page.jpeg"
+    shutil.copy(test_image_path, image)
+    state = WatchState(tmp_path / "state.sqlite3")
+    state.record(image, file_digest(image), image.stat(), tmp_path / "page.md")
+
+    os.utime(image, ns=(0, 0))
+
+    assert state.is_current(image)
+    assert state.get(image).mtime_ns == 0
+
+
+def test_state_retries_failed_files(tmp_path, test_image_path):
+    """Test an image that failed is not treated as processed."""
+    image = tmp_path / "page.jpeg"
+    shutil.copy(test_image_path, image)
+    state = WatchState(tmp_path / "state.sqlite3")
+
+    state.record(image, "x", image.stat(), tmp_path / "page.md", error="timeout")
+
+    assert not state.is_current(image)
+    assert state.counts() == {"processed": 0, "failed": 1}
+
+
+def test_run_once_processes_only_new_work(inbox, tmp_path):
+    """Test a restart skips processed images and parses only new or changed ones."""
+    results = []
+    _watcher(inbox, tmp_path, on_result=results.append).run(once=True)
+
+    assert sorted(CountingExtractor.pages) == ["a.jpeg", "b.jpeg"]
+    assert all(result.ok for result in results)
+    assert (tmp_path / "notes" / "a.md").exists()
+    assert (tmp_path / "notes" / STATE_FILENAME).exists()
+
+    CountingExtractor.pages.clear()
+    _watcher(inbox, tmp_path).run(once=True)
+    assert CountingExtractor.pages == []
+
+    # A new image, and a changed one
+    shutil.copy(inbox / "a.jpeg", inbox / "c.jpeg")
+    with open(inbox / "b.jpeg", "ab") as f:
+        f.write(b"\0")
+    _watcher(inbox, tmp_path).run(once=True)
+    assert sorted(CountingExtractor.pages) == ["b.jpeg", "c.jpeg"]
+
+
+def test_run_once_retries_failures(inbox, tmp_path):
+    """Test failed images are recorded and tried again on the next run."""
+    shutil.copy(inbox / "a.jpeg", inbox / "bad.jpeg")
+
+    results = []
+    _watcher(inbox, tmp_path, on_result=results.append).run(once=True)
+    assert [result.image_path.name for result in results if not result.ok] == ["bad.jpeg"]
+
+    CountingExtractor.pages.clear()
+    _watcher(inbox, tmp_path).run(once=True)
+    assert CountingExtractor.pages == ["bad.jpeg"]
+
+
+def test_run_once_reparses_files_rewritten_during_parsing(inbox, tmp_path):
+    """Test an image that changed while it was parsed isn't recorded as current."""
+    shutil.copy(inbox / "a.jpeg", inbox / "syncing.jpeg")
+    _watcher(inbox, tmp_path).run(once=True)
+
+    CountingExtractor.pages.clear()
+    _watcher(inbox, tmp_path).run(once=True)
+    assert CountingExtractor.pages == ["syncing.jpeg"]
+
+
+def test_run_opens_backend_once(inbox, tmp_path):
+    """Test the backend is opened once and reused for every page."""
+    _watcher(inbox, tmp_path, workers=2).run(once=True)
+
+    assert CountingExtractor.opened == 1
+    assert len(CountingExtractor.pages) == 2
+
+
+def test_polling_source_reports_new_and_changed_files(inbox):
+    """Test the poller reports existing images, then only new or changed ones."""
+    events = queue.Queue()
+    source = PollingSource(inbox, events, interval=0.05)
+    source.start()
+    try:
+        assert {events.get(timeout=1).name for _ in range(2)} == {"a.jpeg", "b.jpeg"}
+
+        shutil.copy(inbox / "a.jpeg", inbox / "c.jpeg")
+        assert events.get(timeout=2).name == "c.jpeg"
+    finally:
+        source.stop()
+    assert events.empty()
+
+
+def test_watch_picks_up_new_images(inbox, tmp_path):
+    """Test images dropped into the folder while watching are parsed."""
+    done = queue.Queue()
+    watcher = _watcher(inbox, tmp_path, use_events=False, poll_interval=0.05, settle=0.1, on_result=done.put)
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        assert {done.get(timeout=10).image_path.name for _ in range(2)} == {"a.jpeg", "b.jpeg"}
+
+        shutil.copy(inbox / "a.jpeg", inbox / "new.jpeg")
+        assert done.get(timeout=10).image_path.name == "new.jpeg"
+        assert (tmp_path / "notes" / "new.md").exists()
+    finally:
+        stop.set()
+        thread.join(timeout=10)
+    assert not thread.is_alive()
+
+
+def test_watch_waits_for_files_to_settle(inbox, tmp_path):
+    """Test an image still being written isn't parsed until it stops changing."""
+    watcher = _watcher(inbox, tmp_path, settle=0.3)
+    growing = inbox / "growing.jpeg"
+    growing.write_bytes(b"partial")
+    watcher._events.put(growing)
+
+    watcher._drain(timeout=0)
+    assert watcher._settled(time.monotonic(), watcher.settle) == []
+
+    growing.write_bytes(b"partial, then more")
+    assert watcher._settled(time.monotonic() + 1, watcher.settle) == []
+    assert watcher._settled(time.monotonic() + 2, watcher.settle) == [growing.resolve()]
+
+
+def test_watch_command_once(inbox, tmp_path):
+    """Test 'watch --once' parses the folder and reports each note."""
+    output_dir = tmp_path / "notes"
+
+    result = runner.invoke(app, ["watch", str(inbox), "-o", str(output_dir), "--model", "counting", "--once"])
+
+    assert result.exit_code == 0, result.output
+    assert "✓ a.jpeg" in result.stderr
+    assert "2 notes written" in result.stderr
+
+    result = runner.invoke(app, ["watch", str(inbox), "-o", str(output_dir), "--model", "counting", "--once"])
+    assert "0 notes written" in result.stderr
+
+
+def test_watch_command_missing_directory(tmp_path):
+    """Test watching a directory that doesn't exist fails cleanly."""
+    result = runner.invoke(app, ["watch", str(tmp_path / "missing"), "--once"])
+
+    assert result.exit_code == 1
+    assert "not found" in result.stderr